@@ -0,0 +1,107 @@
+"""
+Measure the resident size of the in-memory catalog with tracemalloc.
+
+Builds N synthetic medicines shaped like the Jan Aushadhi catalog (1-3
+ingredients, a handful of categories, groups, pack labels and units) and
+reports the traced bytes they hold. Field values are fresh str objects per
+row, as they arrive from pandas or sqlite.
+
+    --layout dict    plain dataclasses with list compositions (the layout before slots)
+    --layout slots   src/core/etl.py Medicine / CompositionItem, one item per row
+    --layout shared  as slots, plus one CompositionItem per (drug, amount, unit) like load_data
+
+Usage:
+    python scripts/bench/memory_footprint.py --layout shared -n 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from src.core.etl import CompositionItem, Medicine
+
+CATEGORIES = ['tablet', 'capsule', 'syrup', 'injection', 'cream', 'drops', 'gel']
+GROUPS = ['%s %d' % (g, i) for i, g in enumerate(['Analgesic', 'Antibiotic', 'Anti-diabetic', 'Cardiac',
+                                                   'Vitamin', 'Antacid'] * 5)]
+PACK_SIZES = ["10's", "15's", '100 ml Bottle', '30 g Tube', "1's", '200 MDI']
+UNITS = ['mg', 'mcg', 'ml', '%w/w', 'iu']
+AMOUNTS = [2.5, 5, 10, 20, 40, 50, 100, 250, 325, 500, 650, 1000]
+
+
+@dataclass
+class DictCompositionItem:
+    drug_id: int
+    amount: float
+    unit: str
+    canonical_id: Optional[int] = None
+
+
+@dataclass
+class DictMedicine:
+    medicine_id: int
+    name: str
+    price: float
+    unit_size: str
+    group_name: str
+    category: str
+    composition: List[DictCompositionItem]
+    pack_quantity: Optional[float] = None
+    pack_unit: str = ''
+
+
+def _fresh(value: str) -> str:
+    """A new str object equal to value (what a CSV or sqlite row hands back)"""
+    return (value + ' ')[:-1]
+
+
+def build(n: int, layout: str, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    item_cls, med_cls = (DictCompositionItem, DictMedicine) if layout == 'dict' else (CompositionItem, Medicine)
+    items = {}
+
+    def item(drug_id, amount, unit):
+        if layout != 'shared':
+            return item_cls(drug_id, amount, unit, drug_id)
+        key = (drug_id, amount, unit)
+        found = items.get(key)
+        if found is None:
+            found = items[key] = item_cls(drug_id, amount, unit, drug_id)
+        return found
+
+    medicines = {}
+    for mid in range(n):
+        composition = [item(did, float(rng.choice(AMOUNTS)), _fresh(rng.choice(UNITS)))
+                       for did in rng.sample(range(1, 1500), rng.choice((1, 1, 1, 2, 2, 3)))]
+        medicines[mid] = med_cls(mid, 'Medicine %d Tablets IP' % mid, rng.uniform(5, 500),
+                                 _fresh(rng.choice(PACK_SIZES)), _fresh(rng.choice(GROUPS)),
+                                 _fresh(rng.choice(CATEGORIES)), composition, 10.0, _fresh('unit'))
+    return medicines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', type=int, default=100_000, help='number of medicines (default 100000)')
+    parser.add_argument('--layout', choices=['dict', 'slots', 'shared'], default='shared')
+    args = parser.parse_args()
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    medicines = build(args.n, args.layout)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{args.layout}: {len(medicines)} medicines, {current / 2**20:.0f} MiB live '
+          f'({current / len(medicines):.0f} B/medicine), {peak / 2**20:.0f} MiB peak, built in {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
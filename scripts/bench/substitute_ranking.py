@@ -0,0 +1,62 @@
+"""
+Time substitute scoring with and without the catalog's dose index.
+
+For every medicine in the refined catalog, scores its ingredient-sharing
+candidates twice: with the pairwise composition_similarity loop, and with
+the reference's dose matches looked up once in the DoseIndex. Times the
+composition scores alone and the whole rank_candidates call, and checks
+that both paths give identical scores.
+
+Usage:
+    python scripts/bench/substitute_ranking.py --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from src.core.dose_index import build_dose_index
+from src.core.etl import load_data, load_drugs
+from src.core.matching import composition_scorer, find_candidates_by_ingredients, rank_candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the catalog (default 5)')
+    args = parser.parse_args()
+
+    refined = os.path.join(PROJECT_ROOT, 'data', 'refined')
+    drugs = load_drugs(os.path.join(refined, 'drugs.csv'), os.path.join(refined, 'drug_canonical.csv'))
+    medicines, drug_index = load_data(os.path.join(refined, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(refined, 'jan_aushadhi_composition.csv'), drugs)
+    dose_index = build_dose_index(medicines)
+    work = [(ref, [c for c in find_candidates_by_ingredients(drug_index, ref.composition)
+                   if c.medicine_id != ref.medicine_id]) for ref in medicines.values()]
+    pairs = sum(len(candidates) for _, candidates in work)
+
+    print(f'{len(work)} references, {pairs} candidate pairs, x{args.repeat}')
+    results = {}
+    for label, index in (('pairwise loop', None), ('dose index', dose_index)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            scores = []
+            for ref, candidates in work:
+                score = composition_scorer(ref, index)
+                scores.append([score(c) for c in candidates])
+        scoring = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for ref, candidates in work:
+                rank_candidates(ref, candidates, top_k=10, dose_index=index)
+        ranking = time.perf_counter() - start
+        results[label] = scores
+        print(f'  {label:14s} composition scores {scoring:.3f}s ({scoring / args.repeat / pairs * 1e6:.2f} us/pair), '
+              f'rank_candidates {ranking:.3f}s')
+    assert results['pairwise loop'] == results['dose index'], 'composition scores differ'
+
+
+if __name__ == '__main__':
+    main()
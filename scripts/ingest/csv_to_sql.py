@@ -1,72 +1,196 @@
+import argparse
 import csv
+import re
+import sqlite3
 import sys
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+INT_RE = re.compile(r"-?\d+")
+REAL_RE = re.compile(r"-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+
+SQLITE_TYPES = {"int": "INTEGER", "real": "REAL", "text": "TEXT"}
+
 
 def esc(value: str) -> str:
     return value.replace("'", "''")
 
-def is_number(val: str) -> bool:
-    try:
-        float(val)
-        return True
-    except ValueError:
-        return False
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python csv_to_sql.py <path/to/file.csv>")
-        sys.exit(1)
+def esc_tsv(value: str) -> str:
+    """Escape a field for MySQL LOAD DATA (default FIELDS ESCAPED BY '\\\\')"""
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
 
-    csv_path = Path(sys.argv[1])
 
-    if not csv_path.exists():
-        print(f"File not found: {csv_path}")
-        sys.exit(1)
+def infer_column_types(csv_path: Path, columns: List[str]) -> Dict[str, str]:
+    """Decide 'int', 'real' or 'text' once per column from every non-empty value.
 
-    table_name = csv_path.stem
+    A column drops to 'text' at its first non-numeric value and is not looked
+    at again; the scan stops early once every column is text.
+    """
+    types = {col: "int" for col in columns}
+    pending = list(columns)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for col in pending:
+                val = row[col]
+                if not val:
+                    continue
+                if types[col] == "int" and not INT_RE.fullmatch(val):
+                    types[col] = "real"
+                if types[col] == "real" and not REAL_RE.fullmatch(val):
+                    types[col] = "text"
+            pending = [col for col in pending if types[col] != "text"]
+            if not pending:
+                break
+    return types
+
+
+def iter_rows(csv_path: Path, columns: List[str]) -> Iterator[List[Optional[str]]]:
+    """Raw values per row in column order, empty strings as None"""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield [row[col] if row[col] not in (None, "") else None for col in columns]
+
+
+def sql_values(values: List[Optional[str]], quoted: List[bool]) -> str:
+    return "(" + ", ".join(
+        "NULL" if val is None else (f"'{esc(val)}'" if q else val)
+        for val, q in zip(values, quoted)
+    ) + ")"
+
+
+def write_sql(csv_path: Path, table_name: str, columns: List[str], types: Dict[str, str],
+              output_sql: Path, batch_size: int = 1000) -> int:
+    """Write multi-row INSERT IGNORE statements of up to batch_size rows; returns the row count"""
+    quoted = [types[col] == "text" for col in columns]
+    col_list = ", ".join(columns)
+    count = 0
+    with open(output_sql, "w", encoding="utf-8") as out:
+        out.write("START TRANSACTION;\n")
+        out.write("USE rxlens;\n\n")
+
+        batch = []
+        for values in iter_rows(csv_path, columns):
+            batch.append(sql_values(values, quoted))
+            if len(batch) >= batch_size:
+                out.write(f"INSERT IGNORE INTO {table_name} ({col_list}) VALUES\n" + ",\n".join(batch) + ";\n")
+                count += len(batch)
+                batch = []
+        if batch:
+            out.write(f"INSERT IGNORE INTO {table_name} ({col_list}) VALUES\n" + ",\n".join(batch) + ";\n")
+            count += len(batch)
+
+        out.write("\nCOMMIT;\n")
+    return count
 
-    output_dir = Path("database")
-    output_dir.mkdir(exist_ok=True)
 
-    output_sql = output_dir / f"{table_name}.sql"
+def write_tsv(csv_path: Path, table_name: str, columns: List[str], output_dir: Path) -> Tuple[Path, Path]:
+    """Write <table>.tsv plus a <table>.load.sql that bulk-loads it with LOAD DATA LOCAL INFILE"""
+    tsv_path = output_dir / f"{table_name}.tsv"
+    load_sql = output_dir / f"{table_name}.load.sql"
+    with open(tsv_path, "w", encoding="utf-8", newline="") as out:
+        for values in iter_rows(csv_path, columns):
+            out.write("\t".join("\\N" if val is None else esc_tsv(val) for val in values) + "\n")
+    with open(load_sql, "w", encoding="utf-8") as out:
+        out.write("USE rxlens;\n\n")
+        out.write(
+            f"LOAD DATA LOCAL INFILE '{tsv_path.name}' IGNORE INTO TABLE {table_name}\n"
+            f"    CHARACTER SET utf8mb4\n"
+            f"    FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'\n"
+            f"    LINES TERMINATED BY '\\n'\n"
+            f"    ({', '.join(columns)});\n"
+        )
+    return tsv_path, load_sql
+
+
+def load_sqlite(csv_path: Path, table_name: str, columns: List[str], types: Dict[str, str],
+                db_path: Path, batch_size: int = 1000, key: Optional[List[str]] = None) -> int:
+    """Create the table if needed and insert every row with executemany in one transaction; returns rows inserted.
+
+    `key` columns become the table's PRIMARY KEY so reloads skip existing rows
+    (INSERT OR IGNORE), like INSERT IGNORE against the MySQL schema.
+    """
+    converters = [int if types[col] == "int" else float if types[col] == "real" else str for col in columns]
+
+    def typed_rows():
+        for values in iter_rows(csv_path, columns):
+            yield [None if val is None else conv(val) for val, conv in zip(values, converters)]
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        col_defs = ", ".join(f"{col} {SQLITE_TYPES[types[col]]}" for col in columns)
+        if key:
+            col_defs += f", PRIMARY KEY ({', '.join(key)})"
+        placeholders = ", ".join("?" for _ in columns)
+        insert = f"INSERT OR IGNORE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({col_defs})")
+            before = conn.total_changes
+            batch = []
+            for row in typed_rows():
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    conn.executemany(insert, batch)
+                    batch = []
+            if batch:
+                conn.executemany(insert, batch)
+        # rows actually inserted (ignored duplicates are not counted)
+        return conn.total_changes - before
+    finally:
+        conn.close()
 
-    with open(csv_path, newline="", encoding="utf-8") as f, \
-         open(output_sql, "w", encoding="utf-8") as out:
 
-        reader = csv.DictReader(f)
-        columns = reader.fieldnames
+def main():
+    parser = argparse.ArgumentParser(description="Convert a refined CSV into SQL ready for ingestion")
+    parser.add_argument("csv_path", help="path/to/file.csv; the table name is the file stem")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT statement / executemany call")
+    parser.add_argument("--output-dir", default="database", help="where .sql/.tsv files are written")
+    parser.add_argument("--tsv", action="store_true", help="also write a LOAD DATA TSV companion and its .load.sql")
+    parser.add_argument("--sqlite", metavar="DB", help="also load the rows directly into this SQLite database")
+    parser.add_argument("--key", help="comma-separated primary key columns for the SQLite table (e.g. medicine_id,drug_id)")
+    parser.add_argument("--no-sql", action="store_true", help="skip the INSERT .sql file")
+    args = parser.parse_args()
+
+    csv_path = Path(args.csv_path)
 
-        if not columns:
-            print("CSV has no headers")
-            sys.exit(1)
+    if not csv_path.exists():
+        print(f"File not found: {csv_path}")
+        sys.exit(1)
 
-        out.write("START TRANSACTION;\n")
-        out.write("USE rxlens;\n\n")
+    if args.batch_size < 1:
+        print("--batch-size must be at least 1")
+        sys.exit(1)
 
-        col_list = ", ".join(columns)
+    table_name = csv_path.stem
 
-        for row in reader:
-            values = []
-            for col in columns:
-                val = row[col]
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(exist_ok=True)
 
-                if val is None or val == "":
-                    values.append("NULL")
-                elif is_number(val):
-                    values.append(val)
-                else:
-                    values.append(f"'{esc(val)}'")
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        columns = csv.DictReader(f).fieldnames
 
-            values_sql = ", ".join(values)
+    if not columns:
+        print("CSV has no headers")
+        sys.exit(1)
 
-            out.write(
-                f"INSERT IGNORE INTO {table_name} ({col_list}) "
-                f"VALUES ({values_sql});\n"
-            )
+    types = infer_column_types(csv_path, columns)
 
-        out.write("\nCOMMIT;\n")
+    if not args.no_sql:
+        output_sql = output_dir / f"{table_name}.sql"
+        count = write_sql(csv_path, table_name, columns, types, output_sql, args.batch_size)
+        print(f"✅ Generated {output_sql} ({count} rows)")
 
-    print(f"✅ Generated {output_sql}")
+    if args.tsv:
+        tsv_path, load_sql = write_tsv(csv_path, table_name, columns, output_dir)
+        print(f"✅ Generated {tsv_path} and {load_sql}")
+
+    if args.sqlite:
+        key = [col.strip() for col in args.key.split(",")] if args.key else None
+        if key and not set(key) <= set(columns):
+            print(f"--key columns must be among: {', '.join(columns)}")
+            sys.exit(1)
+        count = load_sqlite(csv_path, table_name, columns, types, Path(args.sqlite), args.batch_size, key)
+        print(f"✅ Loaded {count} rows into {args.sqlite}:{table_name}")
 
 if __name__ == "__main__":
     main()
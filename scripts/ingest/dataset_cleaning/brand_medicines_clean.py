@@ -1,7 +1,21 @@
+"""
+Cleans the raw brand medicine dataset into the refined brand CSVs.
+
+Streaming: rows are read, parsed (optionally across a process pool) and
+written in fixed-size batches, so peak memory depends on the batch size and
+the drug vocabulary, not on the size of the input. Batches are written in
+input order, so output and ids are identical for any worker count.
+"""
+
+import argparse
 import csv
-import re
 import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 
 # ---------------------------------------------------
 # PATH SETUP
@@ -15,42 +29,45 @@ drugs_file = ROOT_DIR / "data/refined/drugs.csv"
 brand_file = ROOT_DIR / "data/refined/brand_medicines.csv"
 composition_file = ROOT_DIR / "data/refined/brand_medicine_composition.csv"
 
-drugs_file.parent.mkdir(parents=True, exist_ok=True)
-
-
-drug_map = {}
-drug_counter = 1
+BATCH_SIZE = 10000
 
-medicine_counter = 1
-composition_counter = 1
-
-brand_rows = []
-composition_rows = []
-new_drugs = []
+# raw columns used, in this order
+RAW_FIELDS = ("name", "manufacturer_name", "pack_size_label", "price", "salt_composition")
 
 
 # ---------------------------------------------------
 # LOAD EXISTING DRUGS IF FILE EXISTS
 # ---------------------------------------------------
 
-if os.path.exists(drugs_file):
+def load_drug_map(path: Path) -> Tuple[Dict[str, int], int]:
+    """Existing drug name -> id, plus the next free id"""
+    drug_map = {}
+    drug_counter = 1
+
+    if os.path.exists(path):
+
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
 
-    with open(drugs_file, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader, None)
+            for row in reader:
+                drug_id = int(row[0])
+                drug_name = row[1]
 
-        for row in reader:
-            drug_id = int(row[0])
-            drug_name = row[1]
+                drug_map[drug_name] = drug_id
+                drug_counter = max(drug_counter, drug_id + 1)
 
-            drug_map[drug_name] = drug_id
-            drug_counter = max(drug_counter, drug_id + 1)
+    return drug_map, drug_counter
 
 
 # ---------------------------------------------------
 # SALT PARSER
 # ---------------------------------------------------
 
+SALT_PART_RE = re.compile(r"([A-Za-z\s]+)\((.*?)\)")
+AMOUNT_RE = re.compile(r'(\d+)([a-zA-Z]+)(?:/(\d+)([a-zA-Z]+))?')
+
+
 def parse_salt_composition(salt_string):
 
     results = []
@@ -59,7 +76,7 @@ def parse_salt_composition(salt_string):
     for part in parts:
         part = part.strip()
 
-        match = re.match(r"([A-Za-z\s]+)\((.*?)\)", part)
+        match = SALT_PART_RE.match(part)
 
         if match:
             drug = match.group(1).strip()
@@ -68,7 +85,7 @@ def parse_salt_composition(salt_string):
             amount = None
             unit = None
 
-            match_amount = re.match(r'(\d+)([a-zA-Z]+)(?:/(\d+)([a-zA-Z]+))?', value)
+            match_amount = AMOUNT_RE.match(value)
 
             if match_amount:
 
@@ -90,102 +107,113 @@ def parse_salt_composition(salt_string):
     return results
 
 
-# ---------------------------------------------------
-# READ MAIN DATASET
-# ---------------------------------------------------
-
-with open(input_file, newline='', encoding='utf-8') as csvfile:
-
-    reader = csv.DictReader(csvfile)
-
-    for row in reader:
-
-        medicine_id = medicine_counter
-        medicine_counter += 1
-
-        brand_rows.append([
-            medicine_id,
-            row["name"],
-            row["manufacturer_name"],
-            row["pack_size_label"],
-            row["price"]
-        ])
-
-        compositions = parse_salt_composition(row["salt_composition"])
-
-        for drug, amount, unit in compositions:
-
-            if drug not in drug_map:
-                drug_map[drug] = drug_counter
-                new_drugs.append((drug_counter, drug))
-                drug_counter += 1
-
-            drug_id = drug_map[drug]
-
-            composition_rows.append([
-                composition_counter,
-                medicine_id,
-                drug_id,
-                amount,
-                unit
-            ])
-
-            composition_counter += 1
-
-
-# ---------------------------------------------------
-# WRITE / APPEND drugs.csv
-# ---------------------------------------------------
-
-mode = "a" if os.path.exists(drugs_file) else "w"
-
-with open(drugs_file, mode, newline='', encoding='utf-8') as f:
-
-    writer = csv.writer(f)
-
-    if mode == "w":
-        writer.writerow(["drug_id", "drug_name"])
-
-    for drug_id, drug_name in new_drugs:
-        writer.writerow([drug_id, drug_name])
+def parse_batch(rows: List[Tuple[str, ...]]) -> List[Tuple[Tuple[str, ...], list]]:
+    """(brand fields, parsed composition) for each raw row tuple (see RAW_FIELDS)"""
+    return [(row[:4], parse_salt_composition(row[4])) for row in rows]
 
 
 # ---------------------------------------------------
-# WRITE brand_medicines.csv
+# STREAMING PIPELINE
 # ---------------------------------------------------
 
-with open(brand_file, "w", newline='', encoding='utf-8') as f:
-
-    writer = csv.writer(f)
-
-    writer.writerow([
-        "medicine_id",
-        "medicine_name",
-        "manufacturer_name",
-        "pack_size",
-        "price"
-    ])
-
-    writer.writerows(brand_rows)
-
-
-# ---------------------------------------------------
-# WRITE brand_medicine_composition.csv
-# ---------------------------------------------------
-
-with open(composition_file, "w", newline='', encoding='utf-8') as f:
-
-    writer = csv.writer(f)
-
-    writer.writerow([
-        "id",
-       "medicine_id",
-        "drug_id",
-        "amount",
-        "unit"
-    ])
-
-    writer.writerows(composition_rows)
-
-
-print("CSV files generated successfully.") 
+def iter_raw_batches(path: Path, batch_size: int = BATCH_SIZE) -> Iterator[List[Tuple[str, ...]]]:
+    """Raw rows as tuples of RAW_FIELDS, batch_size at a time"""
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        rows = (tuple(row[k] for k in RAW_FIELDS) for row in csv.DictReader(csvfile))
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def iter_parsed_batches(batches: Iterator[list], workers: int = 1) -> Iterator[list]:
+    """Parse batches in input order; with workers > 1 at most 2 * workers batches are in flight"""
+    if workers <= 1:
+        for batch in batches:
+            yield parse_batch(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(parse_batch, batch))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def refine_brand_medicines(input_path: Path = input_file, drugs_path: Path = drugs_file,
+                           brand_path: Path = brand_file, composition_path: Path = composition_file,
+                           batch_size: int = BATCH_SIZE, workers: Optional[int] = None) -> dict:
+    """Stream the raw brand dataset into the refined CSVs; new drugs are appended to drugs.csv"""
+    workers = workers or os.cpu_count() or 1
+    drugs_path.parent.mkdir(parents=True, exist_ok=True)
+
+    drug_map, drug_counter = load_drug_map(drugs_path)
+    drugs_mode = "a" if os.path.exists(drugs_path) else "w"
+
+    medicine_counter = 1
+    composition_counter = 1
+    new_drug_count = 0
+
+    with open(drugs_path, drugs_mode, newline='', encoding='utf-8') as df, \
+         open(brand_path, "w", newline='', encoding='utf-8') as bf, \
+         open(composition_path, "w", newline='', encoding='utf-8') as cf:
+
+        drugs_writer = csv.writer(df)
+        brand_writer = csv.writer(bf)
+        comp_writer = csv.writer(cf)
+
+        if drugs_mode == "w":
+            drugs_writer.writerow(["drug_id", "drug_name"])
+        brand_writer.writerow(["medicine_id", "medicine_name", "manufacturer_name", "pack_size", "price"])
+        comp_writer.writerow(["id", "medicine_id", "drug_id", "amount", "unit"])
+
+        for parsed in iter_parsed_batches(iter_raw_batches(input_path, batch_size), workers):
+            brand_rows = []
+            composition_rows = []
+            new_drugs = []
+
+            for fields, compositions in parsed:
+                medicine_id = medicine_counter
+                medicine_counter += 1
+                brand_rows.append([medicine_id, *fields])
+
+                for drug, amount, unit in compositions:
+
+                    if drug not in drug_map:
+                        drug_map[drug] = drug_counter
+                        new_drugs.append((drug_counter, drug))
+                        drug_counter += 1
+
+                    composition_rows.append([composition_counter, medicine_id, drug_map[drug], amount, unit])
+                    composition_counter += 1
+
+            drugs_writer.writerows(new_drugs)
+            brand_writer.writerows(brand_rows)
+            comp_writer.writerows(composition_rows)
+            new_drug_count += len(new_drugs)
+
+    return {
+        "medicines": medicine_counter - 1,
+        "compositions": composition_counter - 1,
+        "new_drugs": new_drug_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the raw brand medicine dataset into data/refined/")
+    parser.add_argument("--input", type=Path, default=input_file, help="raw brand medicine CSV")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows read, parsed and written per batch")
+    parser.add_argument("--workers", type=int, default=None, help="parsing processes (default: CPU count)")
+    args = parser.parse_args()
+
+    stats = refine_brand_medicines(args.input, batch_size=args.batch_size, workers=args.workers)
+    print(f"CSV files generated successfully: {stats['medicines']} medicines, "
+          f"{stats['compositions']} composition rows, {stats['new_drugs']} new drugs.")
+
+
+if __name__ == "__main__":
+    main()
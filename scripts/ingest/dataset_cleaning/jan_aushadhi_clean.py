@@ -1,214 +1,215 @@
+"""
+Cleans the raw Jan Aushadhi price list into the refined CSVs.
+
+The parsing helpers (category, dosage endpoints, composition) live in
+src/core/dosage.py, shared with the runtime query parser. Running the file
+as a script refines data/raw/jan_aushadhi.csv incrementally: a manifest next to the refined CSVs remembers each generic
+name's cleaned composition (keyed by a content hash), the medicine id of each
+Drug Code and the id of each drug name. Only new or changed names are
+re-cleaned, in a process pool, and ids never move between runs.
+"""
+
+import argparse
 import csv
-import re
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 # ==================================================
 # Paths
 # ==================================================
-BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent()
+BASE_DIR = Path(__file__).resolve().parents[3]
+
+# the dosage grammar lives in src/core/dosage.py so the runtime query parser does not import this script
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+from src.core.dosage import extract_category, normalize_dosage_text, parse_composition
 
 RAW_CSV = BASE_DIR / "data/raw/jan_aushadhi.csv"
 REFINED_DIR = BASE_DIR / "data/refined"
 
-REFINED_DIR.mkdir(parents=True, exist_ok=True)
-
 DRUGS_CSV = REFINED_DIR / "drugs.csv"
 MEDICINES_CSV = REFINED_DIR / "jan_aushadhi_medicines.csv"
 COMPOSITION_CSV = REFINED_DIR / "jan_aushadhi_composition.csv"
+MANIFEST_JSON = REFINED_DIR / "jan_aushadhi_manifest.json"
+
+# Bump when the cleaning rules change so every name is re-cleaned once
+CLEANER_VERSION = 1
 
-# ==================================================
-# Category keywords
-# ==================================================
-CATEGORY_KEYWORDS = {
-    "tablet": "tablet",
-    "tablets": "tablet",
-    "capsule": "capsule",
-    "capsules": "capsule",
-    "injection": "injection",
-    "syrup": "syrup",
-    "spray": "spray",
-    "gel": "gel",
-    "cream": "cream",
-    "ointment": "ointment",
-    "solution": "solution",
-    "drop": "drops",
-    "drops": "drops"
-}
-
-CATEGORY_WORDS = set(CATEGORY_KEYWORDS.keys())
-
-REDUNDANT_WORDS = {
-    "and", "for", "with",
-    "suspension", "resistant",
-    "oral", "orally",
-    "disintegrating",
-    "paediatric", "pediatric"
-}
 
 # ==================================================
-# Helpers (UNCHANGED)
+# Cleaning
 # ==================================================
-def remove_brackets(text: str) -> str:
-    return re.sub(r'\([^)]*\)', '', text)
-
-
-def normalize_percent_units(text: str) -> str:
-    text = re.sub(r'%\s*w\s*/\s*w', '%w/w', text, flags=re.IGNORECASE)
-    text = re.sub(r'%\s*w\s*/\s*v', '%w/v', text, flags=re.IGNORECASE)
-    return text
-
-
-def protect_percent_units(text: str) -> str:
-    return (
-        text.replace("%w/w", "__PERCENT_W_W__")
-            .replace("%w/v", "__PERCENT_W_V__")
-    )
-
-
-def restore_percent_units(text: str) -> str:
-    return (
-        text.replace("__PERCENT_W_W__", "%w/w")
-            .replace("__PERCENT_W_V__", "%w/v")
-    )
-
-
-def normalize_per_expressions(text: str) -> str:
-    pattern = r'''
-        (\d+(?:\.\d+)?)\s*
-        (mg|mcg|g|gm|kg)\s*
-        (?:per|/)\s*
-        (\d+(?:\.\d+)?)?\s*
-        (ml|l)
-    '''
+def clean_generic_name(raw_name: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+    """(category, [(drug, amount, unit), ...]) for one raw generic name"""
+    return extract_category(raw_name), parse_composition(normalize_dosage_text(raw_name))
 
-    def repl(m):
-        a, au = m.group(1), m.group(2)
-        b, bu = m.group(3) or "1", m.group(4)
-        return f"{a}/{b} {au}/{bu}"
 
-    return re.sub(pattern, repl, text, flags=re.IGNORECASE | re.VERBOSE)
-
-
-def remove_noise_words(text: str) -> str:
-    return " ".join(
-        w for w in text.split()
-        if w.lower() not in REDUNDANT_WORDS
-        and w.lower() not in CATEGORY_WORDS
-    )
+def _clean_chunk(names: List[str]) -> List[Tuple[str, List[Tuple[str, str, str]]]]:
+    return [clean_generic_name(name) for name in names]
 
 
-def extract_category(text: str) -> str:
-    t = text.lower()
-    for k, v in CATEGORY_KEYWORDS.items():
-        if k in t:
-            return v
-    return "unknown"
-
-
-def extract_dosage_endpoints(text: str):
-    pattern = r'''
-        (\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?)\s*
-        (
-            mg/ml |
-            g/l |
-            mg |
-            mcg |
-            g |
-            gm |
-            kg |
-            ml |
-            l |
-            iu |
-            billion |
-            %w/w |
-            %w/v |
-            %
-        )
-    '''
-    return [
-        (m.end(), m.group(1), m.group(2).lower())
-        for m in re.finditer(pattern, text, flags=re.IGNORECASE | re.VERBOSE)
-    ]
-
-
-def normalize_drug_name(component: str) -> str:
-    component = re.sub(
-        r'\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?\s*\S+',
-        '',
-        component
-    )
-    words = [w for w in component.split() if w.lower() not in REDUNDANT_WORDS]
-    return " ".join(words).strip(" ,+-")
+def clean_names(names: List[str], workers: Optional[int] = None,
+                chunk_size: int = 256) -> Dict[str, Tuple[str, List[Tuple[str, str, str]]]]:
+    """Clean many generic names, in chunks across a process pool when there is enough work"""
+    workers = workers or os.cpu_count() or 1
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        cleaned = [_clean_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            cleaned = list(pool.map(_clean_chunk, chunks))
+    return {name: result for chunk, results in zip(chunks, cleaned) for name, result in zip(chunk, results)}
 
 
-def parse_composition(text: str):
-    endpoints = extract_dosage_endpoints(text)
-    results = []
-    prev = 0
+def name_hash(raw_name: str) -> str:
+    return hashlib.sha1(f"{CLEANER_VERSION}\0{raw_name}".encode("utf-8")).hexdigest()
 
-    for end, amount, unit in endpoints:
-        part = text[prev:end]
-        prev = end
-        drug = normalize_drug_name(part)
-        if drug:
-            results.append((drug, amount, unit))
-    return results
+# ==================================================
+# Manifest (incremental state and stable ids)
+# ==================================================
+def load_manifest(path: Path) -> dict:
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": CLEANER_VERSION, "cleaned": {}, "medicine_ids": {}, "drug_ids": {}}
+
+
+def seed_ids_from_refined(manifest: dict, rows: List[dict], drugs_csv: Path, medicines_csv: Path):
+    """Adopt ids from refined CSVs written before the manifest existed, so they stay stable.
+
+    Drugs other scripts appended to drugs.csv (brand_medicines_clean.py) are
+    adopted on every run so rewriting drugs.csv never drops them.
+    """
+    if drugs_csv.exists():
+        with open(drugs_csv, newline="", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                manifest["drug_ids"].setdefault(r["drug_name"], int(r["drug_id"]))
+    if not manifest["medicine_ids"] and medicines_csv.exists():
+        with open(medicines_csv, newline="", encoding="utf-8") as f:
+            by_name = {}
+            for r in csv.DictReader(f):
+                by_name.setdefault((r["medicine_name"], r["unit_size"]), []).append(int(r["medicine_id"]))
+        # repeated name + pack size rows take their ids in file order
+        for row in rows:
+            ids = by_name.get((row["Generic Name"], row["Unit Size"]))
+            if ids:
+                manifest["medicine_ids"][row["Drug Code"]] = ids.pop(0)
 
 # ==================================================
 # Write refined CSVs
 # ==================================================
-drug_id_map = {}
-drug_id = 1
-medicine_id = 1
-
-with open(DRUGS_CSV, "w", newline="", encoding="utf-8") as df, \
-     open(MEDICINES_CSV, "w", newline="", encoding="utf-8") as mf, \
-     open(COMPOSITION_CSV, "w", newline="", encoding="utf-8") as cf:
-
-    drugs_writer = csv.writer(df)
-    meds_writer = csv.writer(mf)
-    comp_writer = csv.writer(cf)
-
-    drugs_writer.writerow(["drug_id", "drug_name"])
-    meds_writer.writerow(["medicine_id", "medicine_name", "unit_size", "mrp", "group_name", "category"])
-    comp_writer.writerow(["medicine_id", "drug_id", "amount", "unit"])
-
-    with open(RAW_CSV, newline="", encoding="utf-8") as raw:
-        reader = csv.DictReader(raw)
-
-        for row in reader:
-            raw_name = row["Generic Name"]
-            category = extract_category(raw_name)
-
-            t = remove_brackets(raw_name)
-            t = normalize_percent_units(t)
-            t = protect_percent_units(t)
-            t = normalize_per_expressions(t)
-            t = remove_noise_words(t)
-            t = restore_percent_units(t)
-
-            meds_writer.writerow([
-                medicine_id,
-                raw_name,
-                row["Unit Size"],
-                row["MRP"],
-                row["Group Name"],
-                category
-            ])
-
-            for drug, amount, unit in parse_composition(t):
-                if drug not in drug_id_map:
-                    drug_id_map[drug] = drug_id
-                    drugs_writer.writerow([drug_id, drug])
-                    drug_id += 1
-
-                comp_writer.writerow([
-                    medicine_id,
-                    drug_id_map[drug],
-                    amount,
-                    unit
-                ])
-
-            medicine_id += 1
-
-print("✅ Generated refined CSVs with amount + unit preserved (READY FOR REVIEW)")
+def refine(raw_csv: Path = RAW_CSV, refined_dir: Path = REFINED_DIR,
+           manifest_path: Optional[Path] = None, workers: Optional[int] = None) -> dict:
+    """Regenerate the refined CSVs from raw_csv, re-cleaning only names the manifest has not seen"""
+    refined_dir.mkdir(parents=True, exist_ok=True)
+    drugs_csv = refined_dir / DRUGS_CSV.name
+    medicines_csv = refined_dir / MEDICINES_CSV.name
+    composition_csv = refined_dir / COMPOSITION_CSV.name
+    manifest_path = manifest_path or refined_dir / MANIFEST_JSON.name
+
+    with open(raw_csv, newline="", encoding="utf-8-sig") as raw:
+        rows = list(csv.DictReader(raw))
+
+    manifest = load_manifest(manifest_path)
+    seed_ids_from_refined(manifest, rows, drugs_csv, medicines_csv)
+
+    cached = manifest["cleaned"]
+    hashes = [name_hash(row["Generic Name"]) for row in rows]
+    to_clean = list(dict.fromkeys(
+        row["Generic Name"] for row, h in zip(rows, hashes) if h not in cached
+    ))
+    for name, (category, composition) in clean_names(to_clean, workers).items():
+        cached[name_hash(name)] = [category, [list(c) for c in composition]]
+    # forget names no longer in the raw file
+    manifest["cleaned"] = cached = {h: cached[h] for h in hashes}
+
+    medicine_ids = manifest["medicine_ids"]
+    drug_ids = manifest["drug_ids"]
+    next_medicine_id = max(medicine_ids.values(), default=0) + 1
+    next_drug_id = max(drug_ids.values(), default=0) + 1
+    new_drugs = 0
+
+    medicines = []
+    composition_rows = []
+    for row, h in zip(rows, hashes):
+        code = row["Drug Code"]
+        if code not in medicine_ids:
+            medicine_ids[code] = next_medicine_id
+            next_medicine_id += 1
+        medicine_id = medicine_ids[code]
+
+        category, composition = cached[h]
+        medicines.append([
+            medicine_id,
+            row["Generic Name"],
+            row["Unit Size"],
+            row["MRP"],
+            row["Group Name"],
+            category
+        ])
+        for drug, amount, unit in composition:
+            if drug not in drug_ids:
+                drug_ids[drug] = next_drug_id
+                next_drug_id += 1
+                new_drugs += 1
+            composition_rows.append([medicine_id, drug_ids[drug], amount, unit])
+
+    with open(drugs_csv, "w", newline="", encoding="utf-8") as df, \
+         open(medicines_csv, "w", newline="", encoding="utf-8") as mf, \
+         open(composition_csv, "w", newline="", encoding="utf-8") as cf:
+
+        drugs_writer = csv.writer(df)
+        meds_writer = csv.writer(mf)
+        comp_writer = csv.writer(cf)
+
+        drugs_writer.writerow(["drug_id", "drug_name"])
+        meds_writer.writerow(["medicine_id", "medicine_name", "unit_size", "mrp", "group_name", "category"])
+        comp_writer.writerow(["medicine_id", "drug_id", "amount", "unit"])
+
+        # every drug ever assigned keeps its row so ids referenced elsewhere stay valid
+        drugs_writer.writerows(sorted(([i, name] for name, i in drug_ids.items())))
+        meds_writer.writerows(medicines)
+        comp_writer.writerows(composition_rows)
+
+    manifest["version"] = CLEANER_VERSION
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    cleaned_names = set(to_clean)
+    return {
+        "rows": len(rows),
+        "cleaned": len(to_clean),
+        "reused": sum(1 for row in rows if row["Generic Name"] not in cleaned_names),
+        "new_drugs": new_drugs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the raw Jan Aushadhi price list into data/refined/")
+    parser.add_argument("--raw", type=Path, default=RAW_CSV, help="raw price list CSV")
+    parser.add_argument("--out", type=Path, default=REFINED_DIR, help="refined CSV directory")
+    parser.add_argument("--workers", type=int, default=None, help="cleaning processes (default: CPU count)")
+    parser.add_argument("--full", action="store_true", help="ignore cached cleaning results (ids are still kept)")
+    args = parser.parse_args()
+
+    manifest_path = args.out / MANIFEST_JSON.name
+    if args.full and manifest_path.exists():
+        manifest = load_manifest(manifest_path)
+        manifest["cleaned"] = {}
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+    stats = refine(args.raw, args.out, manifest_path, args.workers)
+    print(
+        f"✅ Generated refined CSVs with amount + unit preserved (READY FOR REVIEW): "
+        f"{stats['rows']} rows, {stats['cleaned']} names cleaned, {stats['reused']} reused, {stats['new_drugs']} new drugs"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class Deadline:
+    """A per-request time limit checked cooperatively by long loops.
+
+    `expired()` is cheap enough to call inside scan loops. Once a check sees
+    the deadline has passed, `hit` stays True so the handler can flag its
+    response as partial.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.perf_counter() + seconds
+        self.hit = False
+
+    def expired(self) -> bool:
+        if self.expires_at is None:
+            return False
+        if self.hit or time.perf_counter() >= self.expires_at:
+            self.hit = True
+        return self.hit
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.perf_counter())
+
+
+class AdmissionController:
+    """Bounded work queue: at most `max_concurrent` requests run, `max_queue` wait.
+
+    A request arriving when the queue is full, or that waits longer than
+    `queue_timeout` seconds, is shed so the caller can answer 503 quickly
+    instead of letting threads pile up.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32, queue_timeout: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._stats: Dict[str, int] = {'admitted': 0, 'shed_queue_full': 0, 'shed_timeout': 0}
+
+    def acquire(self) -> bool:
+        """Take a worker slot; False means the request was shed."""
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['admitted'] += 1
+            return True
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._stats['shed_queue_full'] += 1
+                return False
+            self._waiting += 1
+        admitted = False
+        try:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self._stats['admitted' if admitted else 'shed_timeout'] += 1
+        return admitted
+
+    def release(self):
+        self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, waiting=self._waiting, max_concurrent=self.max_concurrent, max_queue=self.max_queue)
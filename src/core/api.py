@@ -4,135 +4,225 @@ Provides RESTful endpoints for medicine search and alternative recommendations
 Includes both composition-based and ML-based recommendation engines
 """
 
+import hmac
+import io
+import json
 import os
-import sys
-from flask import Flask, request, jsonify
+import time
+from functools import wraps
+from flask import Flask, request, jsonify, g, stream_with_context, send_file
 from flask_cors import CORS
-from typing import Dict, List, Tuple
-from rapidfuzz import fuzz
+from typing import List, Tuple
 
-from etl import load_data, Medicine, CompositionItem
-from matching import find_substitutes, CandidateScore
-
-# Import ML module
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ml.model import MedicineMatcher
+from engine import RxLensEngine
+from singleflight import SingleFlight
+from admission import AdmissionController, Deadline
+from http_cache import EncodedResponseCache, make_etag, encoded_etag, choose_encoding
+from price_feed import parse_price_feed
+from price_index import PriceFilter
+from facets import FACET_FIELDS, parse_facets, facets_key
+from profiling import PROFILING_ENABLED, PROFILE_SAMPLE_RATE, ProfileStore, ProfilingMiddleware
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Data paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DATA_DIR = os.path.join(BASE_DIR, 'data', 'refined')
-MEDICINES_CSV = os.path.join(DATA_DIR, 'jan_aushadhi_medicines.csv')
-COMPOSITION_CSV = os.path.join(DATA_DIR, 'jan_aushadhi_composition.csv')
+# Catalog, indexes and ML matcher; the endpoints below are an HTTP adapter over it.
+# RXLENS_STORAGE=sqlite serves the catalog from an indexed SQLite file (RXLENS_SQLITE_PATH) instead of memory
+_engine = RxLensEngine(storage=os.getenv('RXLENS_STORAGE', 'memory'), sqlite_path=os.getenv('RXLENS_SQLITE_PATH') or None)
+
+# Startup: the catalog loads on a background thread (then the ML matcher), so the process
+# binds at once. Requests wait up to RXLENS_STARTUP_WAIT_S for the catalog; /api/ready reports progress.
+AUTOSTART = os.getenv('RXLENS_AUTOSTART', '1').lower() in ('1', 'true', 'yes')
+STARTUP_WAIT_S = float(os.getenv('RXLENS_STARTUP_WAIT_S', '30'))
+
+# Concurrent identical requests share one in-flight computation
+_singleflight = SingleFlight()
+
+# Admission control: bounded worker slots and wait queue, per-request deadlines
+REQUEST_DEADLINE_MS = int(os.getenv('RXLENS_REQUEST_DEADLINE_MS', '5000'))
+_admission = AdmissionController(
+    max_concurrent=int(os.getenv('RXLENS_MAX_CONCURRENT', '8')),
+    max_queue=int(os.getenv('RXLENS_MAX_QUEUE', '32')),
+    queue_timeout=int(os.getenv('RXLENS_QUEUE_TIMEOUT_MS', '1000')) / 1000.0
+)
+
+
+# Opt-in profiling (RXLENS_PROFILE=1): X-Profile: 1 with a valid X-Admin-Token, or RXLENS_PROFILE_SAMPLE.
+# Disabled, the middleware is not installed at all.
+_profile_store = ProfileStore()
+if PROFILING_ENABLED:
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app, _profile_store, PROFILE_SAMPLE_RATE,
+        allow_header=lambda environ: _admin_token_ok(environ.get('HTTP_X_ADMIN_TOKEN', ''))
+    )
 
-# Global cache for medicines and drug index
-_medicines_cache: Dict[int, Medicine] = {}
-_drug_index_cache: Dict[int, List[Medicine]] = {}
-_cache_loaded = False
+# Encoded (and compressed) bodies of cacheable GET responses, per catalog generation
+_response_cache = EncodedResponseCache()
 
-# ML Model cache
-_ml_matcher: MedicineMatcher = None
-_ml_medicines_df = None
-_ml_model_loaded = False
 
+def _cached_json_response(etag: str, build_payload, medicine_ids=()):
+    """Serve a catalog-derived JSON payload with a strong ETag per content coding.
 
-def _load_cache():
-    """Load data into cache"""
-    global _medicines_cache, _drug_index_cache, _cache_loaded, _ml_matcher, _ml_medicines_df, _ml_model_loaded
-    if not _cache_loaded:
-        try:
-            _medicines_cache, _drug_index_cache = load_data(MEDICINES_CSV, COMPOSITION_CSV)
-            _cache_loaded = True
-            print(f"Loaded {len(_medicines_cache)} medicines from database")
-        except Exception as e:
-            print(f"Error loading medicines: {e}")
-            raise
-    
-    # Load ML model
-    if not _ml_model_loaded:
+    If-None-Match hits return 304 without building anything; otherwise the
+    encoded bytes (gzip/brotli when accepted) come from _response_cache,
+    tagged with the medicine ids in the body so a price update can evict them.
+    The identity, gzip and brotli bodies carry different ETags (see encoded_etag).
+    """
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if request.if_none_match.contains(encoded_etag(etag, encoding)):
+        response = app.response_class(status=304)
+        etag = encoded_etag(etag, encoding)
+    else:
+        body, used = _response_cache.get_or_build(
+            _engine.generation, etag, encoding, lambda: jsonify(build_payload()).get_data(),
+            tags=[('medicine', mid) for mid in medicine_ids]
+        )
+        etag = encoded_etag(etag, used)
+        if request.if_none_match.contains(etag):
+            # small bodies are sent as identity even when compression was accepted
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(body, mimetype='application/json')
+            if used != 'identity':
+                response.headers['Content-Encoding'] = used
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _admitted(handler):
+    """Run handler only if a worker slot is free, with a deadline in g.deadline.
+
+    Clients may shorten (never extend) the deadline with an
+    X-Request-Deadline-Ms header. Shed requests get a fast 503 with Retry-After.
+    Streamed responses keep their slot until the stream is closed.
+    """
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _admission.acquire():
+            return jsonify({
+                'success': False,
+                'error': 'Server busy, please retry shortly'
+            }), 503, {'Retry-After': '1'}
+        release_now = True
         try:
-            ml_model_path = os.path.join(os.path.dirname(__file__), '..', 'ml', 'medicine_matcher.pkl')
-            if os.path.exists(ml_model_path):
-                _ml_matcher = MedicineMatcher.load(ml_model_path)
-                _ml_model_loaded = True
-                print(f"Loaded ML model from {ml_model_path}")
-            else:
-                print(f"⚠️  ML model not found at {ml_model_path}. ML endpoints will not be available.")
-                _ml_model_loaded = True  # Mark as attempted to avoid repeated tries
-        except Exception as e:
-            print(f"Warning: Could not load ML model: {e}")
-            _ml_model_loaded = True
-
-
-def _serialize_composition(composition):
-    """Convert CompositionItem objects to serializable dict"""
-    return [
-        {
-            'drug_id': c.drug_id,
-            'amount': c.amount,
-            'unit': c.unit
-        }
-        for c in composition
-    ]
-
-
-def _serialize_medicine(medicine: Medicine) -> dict:
-    """Convert Medicine object to JSON-serializable dict"""
-    return {
-        'medicine_id': medicine.medicine_id,
-        'name': medicine.name,
-        'price': medicine.price,
-        'unit_size': medicine.unit_size,
-        'group_name': medicine.group_name,
-        'category': medicine.category,
-        'composition': _serialize_composition(medicine.composition)
-    }
+            deadline_ms = REQUEST_DEADLINE_MS
+            requested = request.headers.get('X-Request-Deadline-Ms', type=int)
+            if requested is not None and requested > 0:
+                deadline_ms = min(deadline_ms, requested)
+            g.deadline = Deadline(deadline_ms / 1000.0)
+            response = handler(*args, **kwargs)
+            if getattr(response, 'is_streamed', False):
+                response.call_on_close(_admission.release)
+                release_now = False
+            return response
+        finally:
+            if release_now:
+                _admission.release()
+    return wrapper
+
+
+def _admin_token_ok(value: str) -> bool:
+    token = os.getenv('RXLENS_ADMIN_TOKEN', '')
+    return bool(token) and hmac.compare_digest(value or '', token)
+
+
+def _admin_only(handler):
+    """Require the X-Admin-Token header to match RXLENS_ADMIN_TOKEN; disabled (403) when that is unset"""
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not os.getenv('RXLENS_ADMIN_TOKEN', ''):
+            return jsonify({
+                'success': False,
+                'error': 'Admin endpoints are disabled (set RXLENS_ADMIN_TOKEN)'
+            }), 403
+        if not _admin_token_ok(request.headers.get('X-Admin-Token', '')):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid or missing X-Admin-Token'
+            }), 401
+        return handler(*args, **kwargs)
+    return wrapper
 
 
-def _serialize_candidate_score(candidate: CandidateScore) -> dict:
-    """Convert CandidateScore object to JSON-serializable dict"""
-    return {
-        'medicine': _serialize_medicine(candidate.medicine),
-        'score': candidate.score,
-        'comp_similarity': candidate.comp_similarity,
-        'price_score': candidate.price_score
-    }
+def _normalize_query(query: str) -> str:
+    """Coalescing key for free-text queries: case and whitespace insensitive"""
+    return ' '.join(query.lower().split())
+
+
+def _load_cache():
+    """Start loading data into cache (catalog, then ML model) in the background"""
+    _engine.start()
+
+
+@app.before_request
+def _require_catalog():
+    """Hold requests until the catalog is loaded; 503 with Retry-After if it takes longer than STARTUP_WAIT_S"""
+    if request.path in ('/api/health', '/api/ready') or _engine.loaded:
+        return None
+    _engine.start()
+    if _engine.wait_core(STARTUP_WAIT_S):
+        return None
+    return jsonify({
+        'success': False,
+        'error': _engine.startup_error or 'Service is starting, please retry shortly'
+    }), 503, {'Retry-After': '5'}
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness: answers while the catalog is still loading)"""
     return jsonify({'status': 'healthy', 'service': 'RxLens API'})
 
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe: 200 once the catalog is loaded, 503 before
+    (?component=ml: once the ML matcher is loaded too)
+
+    Returns:
+        JSON with core/ML state and per-phase startup timings (ms)
+    """
+    status = _engine.readiness()
+    if request.args.get('component') == 'ml':
+        status['ready'] = status['ready'] and status['ml']['ready']
+    return jsonify(dict(status, success=True)), 200 if status['ready'] else 503
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime counters: request coalescing per endpoint"""
+    return jsonify({
+        'success': True,
+        'coalescing': _singleflight.stats(),
+        'admission': _admission.stats(),
+        'response_cache': _response_cache.stats()
+    })
+
+
 @app.route('/api/medicines', methods=['GET'])
 def get_all_medicines():
     """
     GET endpoint to retrieve all medicines
     Optional query params:
-    - limit: number of medicines to return (default: 100)
-    - offset: pagination offset (default: 0)
+    - limit: number of medicines to return (default: 100; negative = all remaining)
+    - offset: pagination offset (default: 0; clamped to 0..total)
     """
     try:
+        total = len(_engine.medicines)
+        offset = min(max(request.args.get('offset', default=0, type=int), 0), total)
         limit = request.args.get('limit', default=100, type=int)
-        offset = request.args.get('offset', default=0, type=int)
-        
-        medicines_list = list(_medicines_cache.values())
-        total = len(medicines_list)
-        
-        paginated = medicines_list[offset:offset + limit]
-        
-        return jsonify({
-            'success': True,
-            'total': total,
-            'count': len(paginated),
-            'limit': limit,
-            'offset': offset,
-            'medicines': [_serialize_medicine(m) for m in paginated]
-        })
+        limit = total - offset if limit < 0 else min(limit, total - offset)
+        
+        page_ids = _engine.page_ids(offset, limit)
+        return _cached_json_response(
+            make_etag(_engine.catalog_version, 'medicines', offset, limit, _engine.price_tag(page_ids)),
+            lambda: _engine.list_medicines(offset, limit),
+            page_ids
+        )
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -149,22 +239,23 @@ def get_medicine(medicine_id: int):
         JSON with medicine details or error
     """
     try:
-        if medicine_id not in _medicines_cache:
+        if medicine_id not in _engine.medicines:
             return jsonify({
                 'success': False,
                 'error': f'Medicine with ID {medicine_id} not found'
             }), 404
         
-        medicine = _medicines_cache[medicine_id]
-        return jsonify({
-            'success': True,
-            'medicine': _serialize_medicine(medicine)
-        })
+        return _cached_json_response(
+            make_etag(_engine.catalog_version, 'medicine', medicine_id, _engine.price_tag([medicine_id])),
+            lambda: _engine.get_medicine(medicine_id),
+            [medicine_id]
+        )
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/search', methods=['POST'])
+@_admitted
 def search_medicines():
     """
     POST endpoint to search for medicines by name using fuzzy matching
@@ -172,7 +263,9 @@ def search_medicines():
     Request body:
     {
         'query': 'medicine name',
-        'threshold': 60  (optional, default: 60)
+        'threshold': 60,  (optional, default: 60)
+        'filters': {'max_price': 50, 'pack_unit': 'unit', 'min_pack': 10},  (optional, see PriceFilter)
+        'facets': {'category': ['tablet', 'capsule'], 'group_name': 'Antibiotics'}  (optional)
     }
     
     Returns:
@@ -189,6 +282,8 @@ def search_medicines():
         
         query = data.get('query', '').strip()
         threshold = data.get('threshold', 60)
+        price_filter = PriceFilter.from_dict(data.get('filters'))
+        facets = parse_facets(data.get('facets'))
         
         if not query:
             return jsonify({
@@ -196,34 +291,74 @@ def search_medicines():
                 'error': 'Query cannot be empty'
             }), 400
         
-        best_match = None
-        best_score = 0
+        def compute():
+            payload = _engine.search(query, threshold, g.deadline, price_filter, facets)
+            return payload, 200 if payload['success'] else 404
         
-        # Fuzzy search through all medicines
-        for med in _medicines_cache.values():
-            score = fuzz.token_set_ratio(query.lower(), med.name.lower())
-            if score > best_score:
-                best_score = score
-                best_match = med
+        filter_key = (price_filter.key() if price_filter else None, facets_key(facets))
+        payload, status = _singleflight.do(('search', _normalize_query(query), threshold, filter_key), compute)
+        return jsonify(payload), status
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest_names():
+    """
+    GET endpoint for medicine/ingredient name autocomplete
+    Query params:
+    - prefix: text typed so far (required)
+    - limit: number of completions to return (default: 10)
+    
+    Returns:
+        JSON with completions ranked by precomputed catalog popularity
+    """
+    try:
+        prefix = request.args.get('prefix', default='', type=str)
+        limit = request.args.get('limit', default=10, type=int)
         
-        if best_score >= threshold and best_match:
-            return jsonify({
-                'success': True,
-                'medicine': _serialize_medicine(best_match),
-                'similarity_score': best_score
-            })
-        else:
+        if not prefix.strip():
             return jsonify({
                 'success': False,
-                'error': f'No good match found (best match: {best_score}% similarity)',
-                'best_match_score': best_score
-            }), 404
+                'error': 'Missing required query param: prefix'
+            }), 400
+        
+        completions = _engine.suggest(prefix, limit=limit)
+        
+        return jsonify({
+            'success': True,
+            'prefix': prefix,
+            'count': len(completions),
+            'suggestions': completions
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/facets', methods=['GET'])
+def get_facets():
+    """
+    GET endpoint for medicine counts per category and group_name value
+    Optional query params (narrow the counted medicines):
+    - category, group_name: facet values (repeatable)
+    - min_price, max_price, pack_unit, min_pack, max_pack, min_unit_price, max_unit_price
     
+    Returns:
+        JSON with {'category': [{'value', 'count'}, ...], 'group_name': [...]}
+    """
+    try:
+        facets = parse_facets({f: request.args.getlist(f) for f in FACET_FIELDS if f in request.args})
+        price_filter = PriceFilter.from_dict(
+            {k: v for k, v in request.args.items() if k in PriceFilter.__dataclass_fields__}
+        )
+        return jsonify(_engine.facet_counts(price_filter, facets))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/substitutes', methods=['POST'])
+@_admitted
 def get_substitutes():
     """
     POST endpoint to find substitute medicines for a given medicine
@@ -231,7 +366,10 @@ def get_substitutes():
     Request body:
     {
         'medicine_id': 123,  (required)
-        'top_k': 5  (optional, default: 10)
+        'top_k': 5,  (optional, default: 10)
+        'filters': {'max_unit_price': 2.5, 'pack_unit': 'unit'},  (optional, see PriceFilter)
+        'facets': {'category': 'tablet'},  (optional, e.g. same dosage form only)
+        'price_basis': 'unit'  (optional: 'pack' (default) compares pack MRPs, 'unit' price per tablet/ml/g)
     }
     
     Returns:
@@ -248,28 +386,57 @@ def get_substitutes():
         
         medicine_id = data.get('medicine_id')
         top_k = data.get('top_k', 10)
+        price_filter = PriceFilter.from_dict(data.get('filters'))
+        facets = parse_facets(data.get('facets'))
+        price_basis = data.get('price_basis', 'pack')
+        if price_basis not in ('pack', 'unit'):
+            return jsonify({
+                'success': False,
+                'error': "price_basis must be 'pack' or 'unit'"
+            }), 400
         
-        if medicine_id not in _medicines_cache:
+        if medicine_id not in _engine.medicines:
             return jsonify({
                 'success': False,
                 'error': f'Medicine with ID {medicine_id} not found'
             }), 404
         
-        # Get substitutes
-        substitutes = find_substitutes(medicine_id, _medicines_cache, _drug_index_cache, top_k=top_k)
+        def compute():
+            return _engine.substitutes(medicine_id, top_k, g.deadline, price_filter, price_basis, facets), 200
         
-        return jsonify({
-            'success': True,
-            'medicine_id': medicine_id,
-            'count': len(substitutes),
-            'substitutes': [_serialize_candidate_score(s) for s in substitutes]
-        })
+        filter_key = (price_filter.key() if price_filter else None, facets_key(facets))
+        payload, status = _singleflight.do(('substitutes', medicine_id, top_k, filter_key, price_basis), compute)
+        return jsonify(payload), status
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+def _prescription_request() -> Tuple[List[str], int, Tuple[dict, int]]:
+    """Validate an analyze-prescription body; returns (lines, top_k, error response or None)"""
+    data = request.get_json()
+    
+    if not data or 'medicines' not in data:
+        return [], 0, ({
+            'success': False,
+            'error': 'Missing required field: medicines'
+        }, 400)
+    
+    medicines_list = data.get('medicines', [])
+    top_k = data.get('top_k', 5)
+    
+    if not isinstance(medicines_list, list) or len(medicines_list) == 0:
+        return [], 0, ({
+            'success': False,
+            'error': 'medicines must be a non-empty list'
+        }, 400)
+    
+    lines = [str(m).strip() for m in medicines_list if str(m).strip()]
+    return lines, top_k, None
+
+
 @app.route('/api/analyze-prescription', methods=['POST'])
+@_admitted
 def analyze_prescription():
     """
     POST endpoint to analyze a full prescription for multiple medicines
@@ -281,7 +448,154 @@ def analyze_prescription():
     }
     
     Returns:
-        JSON with analysis results for all medicines
+        JSON with the summary, ingredient totals, duplicates and 'results':
+        one {'position', 'query', 'result'} record per line, in order
+    """
+    try:
+        lines, top_k, error = _prescription_request()
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        return jsonify(_engine.analyze_prescription(lines, top_k, g.deadline))
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/analyze-prescription/stream', methods=['POST'])
+@_admitted
+def analyze_prescription_stream():
+    """
+    Streaming variant of /api/analyze-prescription (NDJSON)
+    Emits one record per medicine as soon as it is resolved and ranked,
+    followed by a summary record:
+    
+        {"type": "line", "position": 0, "query": "Paracetamol", "result": {...}}
+        ...
+        {"type": "summary", "success": true, "summary": {...}, "ingredients": [...],
+         "duplicate_ingredients": [...], "partial": false}
+    
+    Request body: same as /api/analyze-prescription
+    """
+    try:
+        lines, top_k, error = _prescription_request()
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        deadline = g.deadline
+        
+        def generate():
+            for record in _engine.iter_analyze_prescription(lines, top_k, deadline):
+                yield json.dumps(record) + '\n'
+        
+        return app.response_class(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/ingredients/search', methods=['POST'])
+def search_ingredients():
+    """
+    POST endpoint to resolve ingredient text to drug ids and the medicines containing them
+    
+    Request body:
+    {
+        'query': 'ingredient name',
+        'limit': 50  (optional, default: 50, max medicines returned)
+    }
+    
+    Returns:
+        JSON with matched drugs and medicines containing any of them
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or 'query' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Missing required field: query'
+            }), 400
+        
+        query = str(data.get('query', '')).strip()
+        limit = data.get('limit', 50)
+        
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': 'Query cannot be empty'
+            }), 400
+        
+        payload = _engine.search_ingredients(query, limit)
+        return jsonify(payload), 200 if payload['success'] else 404
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/medicines/dose-range', methods=['POST'])
+def medicines_by_dose_range():
+    """
+    POST endpoint to find medicines containing ingredients within dose ranges
+    Several ingredients are combined as a conjunction (all must be present).
+    
+    Request body:
+    {
+        'ingredients': [  (required)
+            {'name': 'Metformin', 'min': 450, 'max': 550, 'unit': 'mg'},
+            {'drug_id': 101, 'min': 1, 'max': 2}  (unit optional, default: mg)
+        ],
+        'limit': 50  (optional, default: 50)
+    }
+    
+    Returns:
+        JSON with medicines satisfying every dose range
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or 'ingredients' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Missing required field: ingredients'
+            }), 400
+        
+        ingredients = data.get('ingredients', [])
+        limit = data.get('limit', 50)
+        
+        if not isinstance(ingredients, list) or len(ingredients) == 0:
+            return jsonify({
+                'success': False,
+                'error': 'ingredients must be a non-empty list'
+            }), 400
+        
+        payload = _engine.medicines_by_dose_range(ingredients, limit)
+        return jsonify(payload), 200 if payload['success'] else 404
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/optimize-prescription', methods=['POST'])
+@_admitted
+def optimize_prescription():
+    """
+    POST endpoint to find the cheapest set of catalog medicines covering a whole prescription
+    Combination products may cover several prescription lines at once.
+    
+    Request body:
+    {
+        'medicines': ['Aceclofenac 100mg', 'Paracetamol 325mg'],  (required)
+        'dose_tol': 0.05,  (optional, default: 0.05, relative dose tolerance)
+        'time_budget_ms': 50  (optional, default: 50, capped at 500)
+    }
+    
+    Returns:
+        JSON with the chosen basket, its total price and the prescription's original price
     """
     try:
         data = request.get_json()
@@ -293,7 +607,8 @@ def analyze_prescription():
             }), 400
         
         medicines_list = data.get('medicines', [])
-        top_k = data.get('top_k', 5)
+        dose_tol = float(data.get('dose_tol', 0.05))
+        time_budget_ms = min(float(data.get('time_budget_ms', 50)), 500.0)
         
         if not isinstance(medicines_list, list) or len(medicines_list) == 0:
             return jsonify({
@@ -301,54 +616,10 @@ def analyze_prescription():
                 'error': 'medicines must be a non-empty list'
             }), 400
         
-        results = {}
-        
-        for med_name in medicines_list:
-            med_name = str(med_name).strip()
-            if not med_name:
-                continue
-            
-            # Search for the medicine
-            best_match = None
-            best_score = 0
-            
-            for med in _medicines_cache.values():
-                score = fuzz.token_set_ratio(med_name.lower(), med.name.lower())
-                if score > best_score:
-                    best_score = score
-                    best_match = med
-            
-            if best_score >= 60 and best_match:
-                # Find substitutes
-                substitutes = find_substitutes(best_match.medicine_id, _medicines_cache, _drug_index_cache, top_k=top_k)
-                results[med_name] = {
-                    'status': 'found',
-                    'original_medicine': _serialize_medicine(best_match),
-                    'similarity_score': best_score,
-                    'substitutes': [_serialize_candidate_score(s) for s in substitutes]
-                }
-            else:
-                results[med_name] = {
-                    'status': 'not_found',
-                    'error': f'No good match found (best: {best_score}% match)',
-                    'best_match_score': best_score
-                }
-        
-        # Calculate summary
-        found_count = sum(1 for r in results.values() if r['status'] == 'found')
-        not_found_count = len(results) - found_count
-        total_alternatives = sum(len(r.get('substitutes', [])) for r in results.values() if r['status'] == 'found')
-        
-        return jsonify({
-            'success': True,
-            'summary': {
-                'total_medicines': len(results),
-                'found_count': found_count,
-                'not_found_count': not_found_count,
-                'total_alternatives': total_alternatives
-            },
-            'results': results
-        })
+        lines = [str(m).strip() for m in medicines_list if str(m).strip()]
+        return jsonify(_engine.optimize_prescription(
+            lines, dose_tol=dose_tol, time_budget=time_budget_ms / 1000.0, deadline=g.deadline
+        ))
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -357,6 +628,7 @@ def analyze_prescription():
 # ============= ML-BASED ENDPOINTS =============
 
 @app.route('/api/ml/search', methods=['POST'])
+@_admitted
 def ml_search():
     """
     ML-based medicine search using TF-IDF + Cosine Similarity
@@ -365,14 +637,20 @@ def ml_search():
     Request body:
     {
         'query': 'medicine name or description',
-        'top_k': 5  (optional, default: 5)
+        'top_k': 5,  (optional, default: 5)
+        'facets': {'category': 'syrup'}  (optional; only these medicines are scored)
     }
     
     Returns:
         JSON with matched medicines ranked by TF-IDF similarity
     """
     try:
-        if not _ml_matcher:
+        if _engine.ml_state in ('not_started', 'loading'):
+            return jsonify({
+                'success': False,
+                'error': 'ML model is still loading. Using fuzzy matching instead.'
+            }), 503, {'Retry-After': '5'}
+        if not _engine.ml_matcher:
             return jsonify({
                 'success': False,
                 'error': 'ML model not loaded. Using fuzzy matching instead.'
@@ -388,6 +666,7 @@ def ml_search():
         
         query = data.get('query', '').strip()
         top_k = data.get('top_k', 5)
+        facets = parse_facets(data.get('facets'))
         
         if not query:
             return jsonify({
@@ -395,41 +674,43 @@ def ml_search():
                 'error': 'Query cannot be empty'
             }), 400
         
-        # Get matches from ML model
-        matches_df = _ml_matcher.find_matches(query, top_k=top_k)
-        
-        if matches_df.empty:
-            return jsonify({
-                'success': False,
-                'error': 'No matches found for the query'
-            }), 404
-        
-        # Convert to serializable format
-        results = []
-        for idx, row in matches_df.iterrows():
-            results.append({
-                'medicine_id': int(row['medicine_id']),
-                'name': row['medicine_name'],
-                'price': float(row['mrp']),
-                'unit_size': row['unit_size'],
-                'group_name': row['group_name'],
-                'category': row['category'],
-                'similarity_score': float(row['similarity_score'])
-            })
-        
-        return jsonify({
-            'success': True,
-            'method': 'TF-IDF (ML)',
-            'query': query,
-            'count': len(results),
-            'matches': results
-        })
+        def compute():
+            if g.deadline.expired():
+                return {
+                    'success': False,
+                    'error': 'Request deadline reached before the ML search ran',
+                    'partial': True
+                }, 503
+            # Get matches from ML model
+            results = _engine.ml_matches(query, top_k=top_k, allowed=_engine.allowed_ids(facets=facets))
+            
+            if not results:
+                return {
+                    'success': False,
+                    'error': 'No matches found for the query'
+                }, 404
+            
+            return {
+                'success': True,
+                'method': 'TF-IDF (ML)',
+                'query': query,
+                'count': len(results),
+                'matches': results,
+                'partial': False
+            }, 200
+        
+        payload, status = _singleflight.do(('ml_search', _normalize_query(query), top_k, facets_key(facets)), compute)
+        if 'query' in payload:
+            # coalesced callers echo their own spelling of the query
+            payload = dict(payload, query=query)
+        return jsonify(payload), status
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/ml/compare', methods=['POST'])
+@_admitted
 def ml_compare():
     """
     Compare results from both fuzzy matching and ML-based search
@@ -462,74 +743,99 @@ def ml_compare():
                 'error': 'Query cannot be empty'
             }), 400
         
-        comparison = {
-            'query': query,
-            'methods': {}
-        }
-        
-        # Method 1: Fuzzy Matching (existing)
-        try:
-            best_match = None
-            best_score = 0
-            
-            for med in _medicines_cache.values():
-                score = fuzz.token_set_ratio(query.lower(), med.name.lower())
-                if score > best_score:
-                    best_score = score
-                    best_match = med
-            
-            if best_score >= 60 and best_match:
-                comparison['methods']['fuzzy_matching'] = {
-                    'status': 'success',
-                    'medicine': _serialize_medicine(best_match),
-                    'similarity_score': best_score
-                }
-            else:
-                comparison['methods']['fuzzy_matching'] = {
-                    'status': 'no_match',
-                    'best_score': best_score
-                }
-        except Exception as e:
-            comparison['methods']['fuzzy_matching'] = {'status': 'error', 'error': str(e)}
-        
-        # Method 2: ML-based Search
-        try:
-            if _ml_matcher:
-                matches_df = _ml_matcher.find_matches(query, top_k=3)
-                if not matches_df.empty:
-                    ml_results = []
-                    for idx, row in matches_df.iterrows():
-                        ml_results.append({
-                            'medicine_id': int(row['medicine_id']),
-                            'name': row['medicine_name'],
-                            'price': float(row['mrp']),
-                            'similarity_score': float(row['similarity_score'])
-                        })
-                    comparison['methods']['ml_tfidf'] = {
-                        'status': 'success',
-                        'matches': ml_results
-                    }
-                else:
-                    comparison['methods']['ml_tfidf'] = {
-                        'status': 'no_match'
-                    }
-            else:
-                comparison['methods']['ml_tfidf'] = {
-                    'status': 'unavailable',
-                    'reason': 'ML model not loaded'
-                }
-        except Exception as e:
-            comparison['methods']['ml_tfidf'] = {'status': 'error', 'error': str(e)}
+        comparison = _engine.compare_methods(query, g.deadline)
         
         return jsonify({
             'success': True,
-            'comparison': comparison
+            'comparison': comparison,
+            'partial': g.deadline.hit
         })
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+@app.route('/api/admin/prices', methods=['POST'])
+@_admin_only
+def update_prices():
+    """
+    POST endpoint to apply a price delta feed to the live catalog (no reload)
+    
+    Request body: a `medicine_id,mrp` CSV (Content-Type: text/csv), or
+    {
+        'updates': [{'medicine_id': 123, 'mrp': 45.5}, ...]
+    }
+    
+    Returns:
+        JSON with updated / unknown medicine ids and the cache entries evicted
+    """
+    try:
+        started = time.perf_counter()
+        if request.mimetype == 'text/csv':
+            updates, errors = parse_price_feed(io.StringIO(request.get_data(as_text=True)))
+        else:
+            data = request.get_json()
+            if not data or not isinstance(data.get('updates'), list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Missing required field: updates'
+                }), 400
+            updates, errors = parse_price_feed(
+                f"{u.get('medicine_id')},{u.get('mrp')}" for u in data['updates'] if isinstance(u, dict)
+            )
+        
+        result = _engine.apply_price_updates(updates)
+        result['errors'] = errors
+        result['invalidated'] = _response_cache.invalidate_tags([('medicine', mid) for mid in result['updated']])
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@_admin_only
+def list_profiles():
+    """
+    GET endpoint listing stored request profiles, newest first
+    
+    Returns:
+        JSON with id, method, path, status, duration_ms, timestamp and trigger per profile
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': 'Profiling is disabled (set RXLENS_PROFILE=1)'
+        }), 404
+    profiles = _profile_store.list()
+    return jsonify({'success': True, 'count': len(profiles), 'profiles': profiles})
+
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@_admin_only
+def download_profile(profile_id: str):
+    """
+    GET endpoint to download one profile
+    Optional query params:
+    - format: 'prof' (default, a pstats/snakeviz-loadable dump) or 'text' (pstats report)
+    - sort: pstats sort key for the text report (default: cumulative)
+    """
+    try:
+        path = _profile_store.path(profile_id) if PROFILING_ENABLED else None
+        if path is None:
+            return jsonify({
+                'success': False,
+                'error': f'Profile {profile_id} not found'
+            }), 404
+        if request.args.get('format') == 'text':
+            report = _profile_store.summary(profile_id, sort=request.args.get('sort', 'cumulative'))
+            return app.response_class(report, mimetype='text/plain')
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=profile_id + '.prof')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -548,8 +854,12 @@ def internal_error(error):
     }), 500
 
 
+if AUTOSTART:
+    _load_cache()
+
+
 if __name__ == '__main__':
-    # Load data before starting server
+    # Start loading before the server binds (no-op when AUTOSTART already did)
     _load_cache()
     
     # Run Flask app
@@ -0,0 +1,162 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+try:
+    from .etl import Medicine
+    from .dose_index import within_tolerance
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import Medicine
+    from dose_index import within_tolerance
+
+
+@dataclass
+class Requirement:
+    canonical_id: int
+    unit: str
+    amount: float
+    lines: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Basket:
+    medicines: List[Medicine]
+    covers: List[List[int]]  # per chosen medicine, indexes into requirements
+    total_price: float
+    requirements: List[Requirement]
+    uncovered: List[int]
+    optimal: bool
+    nodes: int
+
+
+def prescription_requirements(resolved: Dict[str, Medicine]) -> List[Requirement]:
+    """Ingredients a basket must supply, one per (canonical_id, unit, amount).
+
+    The same ingredient at the same dose on two lines is required once; the
+    duplicate-salt report is where that overlap gets flagged.
+    """
+    reqs: Dict[Tuple[int, str, float], Requirement] = {}
+    for line, med in resolved.items():
+        for c in med.composition:
+            key = (c.canonical_id, c.unit or '', round(float(c.amount), 6))
+            req = reqs.get(key)
+            if req is None:
+                req = reqs[key] = Requirement(canonical_id=c.canonical_id, unit=c.unit or '', amount=float(c.amount))
+            if line not in req.lines:
+                req.lines.append(line)
+    return list(reqs.values())
+
+
+def _cover_mask(med: Medicine, by_key: Dict[Tuple[int, str], List[Tuple[float, int]]], dose_tol: float) -> int:
+    """Bitmask of requirements `med` supplies, or 0 if it carries any ingredient the prescription does not."""
+    mask = 0
+    for c in med.composition:
+        hit = False
+        for amount, i in by_key.get((c.canonical_id, c.unit or ''), ()):
+            if within_tolerance(amount, float(c.amount), dose_tol):
+                mask |= 1 << i
+                hit = True
+        if not hit:
+            return 0
+    return mask
+
+
+def cheapest_basket(resolved: Dict[str, Medicine], drug_index: Dict[int, List[Medicine]],
+                    dose_tol: float = 0.05, time_budget: float = 0.05) -> Basket:
+    """Lowest-cost set of catalog medicines covering every prescription ingredient.
+
+    Weighted set cover solved by branch-and-bound:
+      - candidates come from drug_index for the prescription's canonical ids,
+        must have a known price and must not add ingredients outside the
+        prescription
+      - only the cheapest medicine per cover mask is kept
+      - a greedy cover seeds the upper bound; each node branches on the first
+        uncovered requirement and is pruned when cost plus the largest
+        per-requirement minimum cost cannot beat the best basket
+      - the search stops at `time_budget` seconds and returns the best basket
+        found so far with optimal=False
+    """
+    deadline = time.perf_counter() + time_budget
+    reqs = prescription_requirements(resolved)
+    by_key: Dict[Tuple[int, str], List[Tuple[float, int]]] = {}
+    for i, r in enumerate(reqs):
+        by_key.setdefault((r.canonical_id, r.unit), []).append((r.amount, i))
+
+    cheapest_by_mask: Dict[int, Medicine] = {}
+    seen = set()
+    for cid in {r.canonical_id for r in reqs}:
+        for med in drug_index.get(cid, []):
+            if med.medicine_id in seen or med.price <= 0:
+                # a missing MRP is unknown, not free
+                continue
+            seen.add(med.medicine_id)
+            mask = _cover_mask(med, by_key, dose_tol)
+            if mask and (mask not in cheapest_by_mask or med.price < cheapest_by_mask[mask].price):
+                cheapest_by_mask[mask] = med
+
+    options = sorted(cheapest_by_mask.items(), key=lambda kv: kv[1].price)
+    coverable = 0
+    for mask, _ in options:
+        coverable |= mask
+    uncovered = [i for i in range(len(reqs)) if not coverable >> i & 1]
+
+    # per-requirement candidate lists (cheapest first) and minimum cost
+    by_req: List[List[Tuple[int, Medicine]]] = [[] for _ in reqs]
+    for mask, med in options:
+        for i in range(len(reqs)):
+            if mask >> i & 1:
+                by_req[i].append((mask, med))
+    min_cost = [opts[0][1].price if opts else 0.0 for opts in by_req]
+
+    # greedy seed: cheapest price per newly covered requirement
+    best_choice: List[Tuple[int, Medicine]] = []
+    covered = 0
+    while covered != coverable:
+        mask, med = min(
+            ((m, med) for m, med in options if m & ~covered),
+            key=lambda mm: mm[1].price / bin(mm[0] & ~covered).count('1'),
+        )
+        best_choice.append((mask, med))
+        covered |= mask
+    best_cost = sum(med.price for _, med in best_choice)
+
+    nodes = 0
+    timed_out = False
+
+    def search(covered: int, cost: float, chosen: List[Tuple[int, Medicine]]):
+        nonlocal best_cost, best_choice, nodes, timed_out
+        if timed_out:
+            return
+        nodes += 1
+        if time.perf_counter() > deadline:
+            timed_out = True
+            return
+        if covered == coverable:
+            if cost < best_cost:
+                best_cost, best_choice = cost, list(chosen)
+            return
+        remaining = [i for i in range(len(reqs)) if coverable >> i & 1 and not covered >> i & 1]
+        if cost + max(min_cost[i] for i in remaining) >= best_cost:
+            return
+        for mask, med in by_req[remaining[0]]:
+            if cost + med.price >= best_cost:
+                break
+            chosen.append((mask, med))
+            search(covered | mask, cost + med.price, chosen)
+            chosen.pop()
+
+    search(0, 0.0, [])
+
+    return Basket(
+        medicines=[med for _, med in best_choice],
+        covers=[[i for i in range(len(reqs)) if mask >> i & 1] for mask, _ in best_choice],
+        total_price=best_cost,
+        requirements=reqs,
+        uncovered=uncovered,
+        optimal=not timed_out,
+        nodes=nodes,
+    )
@@ -0,0 +1,126 @@
+"""
+Offline canonicalization of drug names into canonical ingredient ids.
+
+drugs.csv holds many spellings of one active ingredient as separate ids
+("Diclofenac", "Diclofenac IP", "Diclofenac Sodium", "Diclofenac Sodium IP",
+"Diclofenac Gastro-Resistant IP"). This pass clusters them by a canonical key
+and writes drug_canonical.csv (drug_id -> canonical_id) next to drugs.csv, so
+the runtime only does a dict lookup.
+
+Usage:
+    python src/core/canonical.py
+"""
+import csv
+from typing import Dict, Iterable, Tuple
+try:
+    from .etl import normalize_name
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import normalize_name
+
+
+# pharmacopoeia marks and formulation words with no therapeutic difference: dropped anywhere in the name.
+# Gastro-resistant / delayed release is an enteric coating around the same immediate dose.
+MODIFIER_WORDS = {
+    'ip', 'bp', 'usp',
+    'gastro', 'resistant', 'resistance', 'delayed', 'dr', 'release', 'released', 'dispersible', 'effervescent',
+    'soft', 'gelatin',
+}
+
+# release-form and route words: not interchangeable with the plain ingredient ('Metformin SR' is not
+# 'Metformin', 'Ciprofloxacin Eye' is not oral ciprofloxacin), so they qualify the key instead of vanishing
+QUALIFIER_WORDS = {
+    'prolonged': 'modified release', 'sustained': 'modified release', 'extended': 'modified release',
+    'modified': 'modified release', 'controlled': 'modified release',
+    'sr': 'modified release', 'er': 'modified release', 'xr': 'modified release',
+    'cr': 'modified release', 'mr': 'modified release',
+    'eye': 'ophthalmic', 'ophthalmic': 'ophthalmic', 'ear': 'otic', 'nasal': 'nasal', 'topical': 'topical',
+    'intravenous': 'intravenous', 'intravenouse': 'intravenous', 'infusion': 'intravenous',
+}
+
+# salt / hydrate forms: dropped only from the end of the name
+SALT_WORDS = {
+    'sodium', 'disodium', 'potassium', 'calcium', 'magnesium',
+    'hydrochloride', 'dihydrochloride', 'hcl', 'hydrobromide', 'bromide',
+    'sulphate', 'sulfate', 'maleate', 'besilate', 'besylate', 'mesylate', 'mesilate',
+    'trihydrate', 'dihydrate', 'monohydrate', 'anhydrous',
+    'citrate', 'phosphate', 'succinate', 'tartrate', 'bitartrate', 'fumarate',
+    'acetate', 'propionate', 'dipropionate', 'valerate', 'diethylamine',
+    'nitrate', 'hyclate', 'etabonate',
+}
+
+# when the remaining name ends in one of these the salt IS the ingredient
+# ("Calcium Acetate", "Ferrous Fumarate", "Zinc Sulphate")
+CATION_WORDS = {'sodium', 'potassium', 'calcium', 'magnesium', 'zinc', 'ferrous', 'ferric', 'aluminium', 'ammonium'}
+
+SYNONYMS = {
+    'cetrizine': 'cetirizine',
+    'amoxycillin': 'amoxicillin',
+    'acyclovir': 'aciclovir',
+    'acetylsalicylic acid': 'aspirin',
+    'levo thyroxine': 'levothyroxine',
+    'thyroxine': 'levothyroxine',
+}
+
+
+def canonical_key(name: str) -> str:
+    """Reduce a drug name to its active-ingredient key, qualified by release form and route.
+
+    'Diclofenac Sodium Gastro-Resistant IP' -> 'diclofenac'
+    'Diclofenac Sodium Prolonged Release IP' -> 'diclofenac (modified release)'
+    'Calcium Acetate' -> 'calcium acetate'
+    """
+    words = normalize_name(name).split()
+    if not words:
+        return ''
+    qualifiers = sorted({QUALIFIER_WORDS[w] for w in words if w in QUALIFIER_WORDS})
+    core = [w for w in words if w not in MODIFIER_WORDS and w not in QUALIFIER_WORDS]
+    if not core:
+        # nothing but modifiers ('Eye', 'Ophthalmic'): keep the name as its own key
+        return ' '.join(words)
+    while len(core) > 1 and core[-1] in SALT_WORDS and core[-2] not in CATION_WORDS:
+        core.pop()
+    core = [SYNONYMS.get(w, w) for w in core]
+    key = ' '.join(core)
+    key = SYNONYMS.get(key, key)
+    return f"{key} ({', '.join(qualifiers)})" if qualifiers else key
+
+
+def cluster_drugs(drugs: Iterable[Tuple[int, str]]) -> Dict[int, int]:
+    """Map every drug_id to a canonical id: the smallest drug_id sharing its canonical key."""
+    canonical_by_key: Dict[str, int] = {}
+    keyed = []
+    for did, dname in drugs:
+        key = canonical_key(dname)
+        keyed.append((did, key))
+        if key and (key not in canonical_by_key or did < canonical_by_key[key]):
+            canonical_by_key[key] = did
+    return {did: canonical_by_key.get(key, did) if key else did for did, key in keyed}
+
+
+def build_canonical_csv(drugs_csv: str, output_csv: str) -> Dict[int, int]:
+    """Read drugs.csv, cluster it and write drug_id,canonical_id rows to output_csv."""
+    with open(drugs_csv, newline='', encoding='utf-8') as f:
+        rows = [(int(r['drug_id']), r['drug_name']) for r in csv.DictReader(f) if r['drug_id']]
+
+    mapping = cluster_drugs(rows)
+
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['drug_id', 'canonical_id'])
+        for did in sorted(mapping):
+            writer.writerow([did, mapping[did]])
+    return mapping
+
+
+if __name__ == '__main__':
+    import os
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    refined_dir = os.path.join(project_root, 'data', 'refined')
+    mapping = build_canonical_csv(os.path.join(refined_dir, 'drugs.csv'), os.path.join(refined_dir, 'drug_canonical.csv'))
+    clusters = len(set(mapping.values()))
+    print(f"Clustered {len(mapping)} drug names into {clusters} canonical ingredients")
@@ -0,0 +1,164 @@
+"""
+Dosage grammar shared by catalog cleaning and query parsing.
+
+scripts/ingest/dataset_cleaning/jan_aushadhi_clean.py reads generic names with
+it and query_parser reads free-text queries with it, so a query's doses are
+read exactly the way catalog compositions were.
+"""
+
+import re
+
+# ==================================================
+# Category keywords
+# ==================================================
+CATEGORY_KEYWORDS = {
+    "tablet": "tablet",
+    "tablets": "tablet",
+    "capsule": "capsule",
+    "capsules": "capsule",
+    "injection": "injection",
+    "syrup": "syrup",
+    "spray": "spray",
+    "gel": "gel",
+    "cream": "cream",
+    "ointment": "ointment",
+    "solution": "solution",
+    "drop": "drops",
+    "drops": "drops"
+}
+
+CATEGORY_WORDS = set(CATEGORY_KEYWORDS.keys())
+
+REDUNDANT_WORDS = {
+    "and", "for", "with",
+    "suspension", "resistant",
+    "oral", "orally",
+    "disintegrating",
+    "paediatric", "pediatric"
+}
+
+# ==================================================
+# Patterns (compiled once)
+# ==================================================
+BRACKETS_RE = re.compile(r'\([^)]*\)')
+PERCENT_W_W_RE = re.compile(r'%\s*w\s*/\s*w', re.IGNORECASE)
+PERCENT_W_V_RE = re.compile(r'%\s*w\s*/\s*v', re.IGNORECASE)
+
+PER_EXPRESSION_RE = re.compile(r'''
+    (\d+(?:\.\d+)?)\s*
+    (mg|mcg|g|gm|kg)\s*
+    (?:per|/)\s*
+    (\d+(?:\.\d+)?)?\s*
+    (ml|l)
+''', re.IGNORECASE | re.VERBOSE)
+
+DOSAGE_RE = re.compile(r'''
+    (\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?)\s*
+    (
+        mg/ml |
+        g/l |
+        mg |
+        mcg |
+        g |
+        gm |
+        kg |
+        ml |
+        l |
+        iu |
+        billion |
+        %w/w |
+        %w/v |
+        %
+    )
+''', re.IGNORECASE | re.VERBOSE)
+
+DOSE_TOKEN_RE = re.compile(r'\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?\s*\S+')
+
+# ==================================================
+# Helpers
+# ==================================================
+def remove_brackets(text: str) -> str:
+    return BRACKETS_RE.sub('', text)
+
+
+def normalize_percent_units(text: str) -> str:
+    text = PERCENT_W_W_RE.sub('%w/w', text)
+    text = PERCENT_W_V_RE.sub('%w/v', text)
+    return text
+
+
+def protect_percent_units(text: str) -> str:
+    return (
+        text.replace("%w/w", "__PERCENT_W_W__")
+            .replace("%w/v", "__PERCENT_W_V__")
+    )
+
+
+def restore_percent_units(text: str) -> str:
+    return (
+        text.replace("__PERCENT_W_W__", "%w/w")
+            .replace("__PERCENT_W_V__", "%w/v")
+    )
+
+
+def _per_expression(m):
+    a, au = m.group(1), m.group(2)
+    b, bu = m.group(3) or "1", m.group(4)
+    return f"{a}/{b} {au}/{bu}"
+
+
+def normalize_per_expressions(text: str) -> str:
+    return PER_EXPRESSION_RE.sub(_per_expression, text)
+
+
+def remove_noise_words(text: str) -> str:
+    return " ".join(
+        w for w in text.split()
+        if w.lower() not in REDUNDANT_WORDS
+        and w.lower() not in CATEGORY_WORDS
+    )
+
+
+def extract_category(text: str) -> str:
+    t = text.lower()
+    for k, v in CATEGORY_KEYWORDS.items():
+        if k in t:
+            return v
+    return "unknown"
+
+
+def extract_dosage_endpoints(text: str):
+    return [
+        (m.end(), m.group(1), m.group(2).lower())
+        for m in DOSAGE_RE.finditer(text)
+    ]
+
+
+def normalize_drug_name(component: str) -> str:
+    component = DOSE_TOKEN_RE.sub('', component)
+    words = [w for w in component.split() if w.lower() not in REDUNDANT_WORDS]
+    return " ".join(words).strip(" ,+-")
+
+
+def parse_composition(text: str):
+    endpoints = extract_dosage_endpoints(text)
+    results = []
+    prev = 0
+
+    for end, amount, unit in endpoints:
+        part = text[prev:end]
+        prev = end
+        drug = normalize_drug_name(part)
+        if drug:
+            results.append((drug, amount, unit))
+    return results
+
+
+def normalize_dosage_text(text: str) -> str:
+    """Bracket-free text with percent and per-volume units normalized and noise/category words removed"""
+    t = remove_brackets(text)
+    t = normalize_percent_units(t)
+    t = protect_percent_units(t)
+    t = normalize_per_expressions(t)
+    t = remove_noise_words(t)
+    return restore_percent_units(t)
@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+try:
+    from .etl import Medicine, _normalize_unit
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import Medicine, _normalize_unit
+
+
+DoseKey = Tuple[int, str]
+
+
+@dataclass
+class DoseIndex:
+    """Per-(canonical drug, unit) dose arrays sorted by amount, with parallel medicine ids."""
+    amounts: Dict[DoseKey, List[float]]
+    medicine_ids: Dict[DoseKey, List[int]]
+
+
+def within_tolerance(a: float, b: float, dose_tol: float) -> bool:
+    """Doses match when they differ by at most dose_tol of the larger one."""
+    return abs(a - b) <= dose_tol * max(a, b, 1e-9)
+
+
+def tolerance_window(amount: float, dose_tol: float) -> Tuple[float, float]:
+    """Bounds [lo, hi] containing every dose within tolerance of `amount`.
+
+    |a - b| <= tol * max(a, b) solves to a * (1 - tol) <= b <= a / (1 - tol).
+    """
+    if dose_tol >= 1:
+        return 0.0, float('inf')
+    if amount <= 0:
+        return 0.0, 1e-9 * dose_tol
+    return amount * (1 - dose_tol), amount / (1 - dose_tol)
+
+
+def count_in_window(sorted_amounts: List[float], amount: float, dose_tol: float) -> int:
+    """Number of doses in a sorted array that are within tolerance of `amount`."""
+    lo, hi = tolerance_window(amount, dose_tol)
+    # widen slightly and re-check, so float rounding in the window never changes the answer
+    i = bisect_left(sorted_amounts, lo * (1 - 1e-12))
+    j = bisect_right(sorted_amounts, hi * (1 + 1e-12))
+    return sum(1 for b in sorted_amounts[i:j] if within_tolerance(amount, b, dose_tol))
+
+
+def dose_matches(index: DoseIndex, signature: Iterable[Tuple[int, float, str]], dose_tol: float) -> Dict[int, int]:
+    """Per medicine id, the (signature item, medicine item) pairs with the same drug and unit and a dose within tolerance.
+
+    `signature` holds composition_signature items (canonical id, amount
+    rounded to 6 places, unit); one bisect window per item replaces
+    comparing the signature against every candidate's composition.
+    """
+    matched: Dict[int, int] = {}
+    for drug_id, amount, unit in signature:
+        amounts = index.amounts.get((drug_id, unit))
+        if not amounts:
+            continue
+        lo, hi = tolerance_window(amount, dose_tol)
+        i = bisect_left(amounts, lo * (1 - 1e-12))
+        j = bisect_right(amounts, hi * (1 + 1e-12))
+        # a medicine listing the same dose twice has it once in its signature
+        hits = {(mid, round(b, 6)) for b, mid in zip(amounts[i:j], index.medicine_ids[(drug_id, unit)][i:j])}
+        for mid, b in hits:
+            if within_tolerance(amount, b, dose_tol):
+                matched[mid] = matched.get(mid, 0) + 1
+    return matched
+
+
+def build_dose_index(medicines: Dict[int, Medicine]) -> DoseIndex:
+    """Build the sorted dose arrays at catalog load."""
+    grouped: Dict[DoseKey, List[Tuple[float, int]]] = {}
+    for med in medicines.values():
+        for c in med.composition:
+            grouped.setdefault((c.canonical_id, c.unit or ''), []).append((float(c.amount), med.medicine_id))
+
+    amounts: Dict[DoseKey, List[float]] = {}
+    medicine_ids: Dict[DoseKey, List[int]] = {}
+    for key, pairs in grouped.items():
+        pairs.sort()
+        amounts[key] = [a for a, _ in pairs]
+        medicine_ids[key] = [m for _, m in pairs]
+    return DoseIndex(amounts=amounts, medicine_ids=medicine_ids)
+
+
+def normalize_dose(amount: float, unit: str) -> Tuple[float, str]:
+    """Normalize a query dose to the units the catalog is stored in (g/mcg -> mg)."""
+    return _normalize_unit(float(amount), unit or '')
+
+
+def medicines_in_range(index: DoseIndex, drug_id: int, unit: str, lo: float, hi: float) -> List[int]:
+    """Medicine ids containing canonical drug `drug_id` dosed between lo and hi (inclusive)."""
+    key = (drug_id, unit or '')
+    amounts = index.amounts.get(key)
+    if not amounts:
+        return []
+    i = bisect_left(amounts, lo)
+    j = bisect_right(amounts, hi)
+    return index.medicine_ids[key][i:j]
+
+
+def medicines_matching_all(index: DoseIndex, terms: Iterable[Tuple[Iterable[int], str, float, float]]) -> List[int]:
+    """Intersect dose ranges: medicines satisfying every (drug_ids, unit, lo, hi) term.
+
+    Each term may name several canonical ids (e.g. every match for an
+    ingredient query); a medicine satisfies the term if any of them fits.
+    """
+    sets = []
+    for drug_ids, unit, lo, hi in terms:
+        ids = set()
+        for did in drug_ids:
+            ids.update(medicines_in_range(index, did, unit, lo, hi))
+        if not ids:
+            return []
+        sets.append(ids)
+    if not sets:
+        return []
+    sets.sort(key=len)
+    result = sets[0]
+    for s in sets[1:]:
+        result = result & s
+        if not result:
+            break
+    return sorted(result)
@@ -0,0 +1,861 @@
+"""
+In-process RxLens engine: the catalog, its indexes and the ML matcher behind one object.
+
+The Flask API is a thin HTTP adapter over an RxLensEngine, and the Streamlit UI
+can hold one directly (embedded mode) to skip the JSON/HTTP round trip. Every
+method returns the same JSON-ready dicts the API sends.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from itertools import groupby, islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from rapidfuzz import fuzz
+try:
+    from .etl import load_data, load_drugs, Medicine, DrugDictionary
+    from .matching import find_substitutes, CandidateScore
+    from .ingredients import resolve_ingredient, canonical_ids, medicines_for_drugs
+    from .suggest import SuggestIndex, build_suggest_index, suggest, update_medicine_prices
+    from .dose_index import DoseIndex, build_dose_index, normalize_dose, medicines_matching_all, tolerance_window
+    from .query_parser import QueryTerm, parse_query
+    from .price_index import PriceIndex, PriceFilter, build_price_index, allowed_ids, update_prices
+    from .facets import FacetIndex, Facets, build_facet_index, select, ids_from_bitmap, bitmap_from_ids, facet_counts
+    from .prescription import IngredientTotal, ingredient_totals, duplicate_ingredients
+    from .basket import cheapest_basket
+    from .admission import Deadline
+    from .sqlite_store import SqliteStore, build_sqlite_store, sqlite_store_is_stale
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import load_data, load_drugs, Medicine, DrugDictionary
+    from matching import find_substitutes, CandidateScore
+    from ingredients import resolve_ingredient, canonical_ids, medicines_for_drugs
+    from suggest import SuggestIndex, build_suggest_index, suggest, update_medicine_prices
+    from dose_index import DoseIndex, build_dose_index, normalize_dose, medicines_matching_all, tolerance_window
+    from query_parser import QueryTerm, parse_query
+    from price_index import PriceIndex, PriceFilter, build_price_index, allowed_ids, update_prices
+    from facets import FacetIndex, Facets, build_facet_index, select, ids_from_bitmap, bitmap_from_ids, facet_counts
+    from prescription import IngredientTotal, ingredient_totals, duplicate_ingredients
+    from basket import cheapest_basket
+    from admission import Deadline
+    from sqlite_store import SqliteStore, build_sqlite_store, sqlite_store_is_stale
+
+# ML module (src/ml sits next to src/core); imported lazily by load_ml, it pulls in scikit-learn/SciPy
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+if TYPE_CHECKING:
+    from ml.model import MedicineMatcher
+
+# Data paths
+BASE_DIR = os.path.dirname(SRC_DIR)
+DATA_DIR = os.path.join(BASE_DIR, 'data', 'refined')
+ML_MODEL_PATH = os.path.join(SRC_DIR, 'ml', 'medicine_matcher.pkl')
+
+# Storage backends: 'memory' loads the CSVs into dicts, 'sqlite' serves them from an indexed SQLite file
+STORAGE_BACKENDS = ('memory', 'sqlite')
+SQLITE_PATH = os.path.join(DATA_DIR, 'rxlens.sqlite3')
+
+# Minimum fuzzy score for a free-text line to count as a catalog match
+MATCH_THRESHOLD = 60
+
+# Relative tolerance when narrowing a query's candidates to its stated doses (float rounding only)
+QUERY_DOSE_TOL = 0.001
+
+# Price feeds changing more than this share of the catalog rebuild the price-derived indexes
+# instead of patching them entry by entry (around there the patches cost as much as a rebuild)
+PRICE_REBUILD_FRACTION = 0.25
+
+
+class RxLensEngine:
+    """Owns the loaded catalog, its derived indexes and the optional ML matcher.
+
+    Call `load()` once (or `start()` to load in the background: catalog
+    first, then the ML matcher, see `readiness()`); after that the engine is
+    read-only and safe to share between threads. `generation` is bumped on
+    every catalog (re)load so callers can key caches on it.
+
+    With storage='sqlite' the catalog stays on disk: `medicines` and
+    `drug_index` become read-only views over indexed queries, and name
+    search, suggestions and dose ranges use the store's FTS/B-tree indexes
+    instead of in-memory ones. The SQLite file is (re)built from the CSVs
+    when missing or older than them.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, ml_model_path: str = ML_MODEL_PATH,
+                 storage: str = 'memory', sqlite_path: Optional[str] = None):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend {storage!r} (expected one of {', '.join(STORAGE_BACKENDS)})")
+        self.medicines_csv = os.path.join(data_dir, 'jan_aushadhi_medicines.csv')
+        self.composition_csv = os.path.join(data_dir, 'jan_aushadhi_composition.csv')
+        self.drugs_csv = os.path.join(data_dir, 'drugs.csv')
+        self.drug_canonical_csv = os.path.join(data_dir, 'drug_canonical.csv')
+        self.ml_model_path = ml_model_path
+        self.storage = storage
+        self.sqlite_path = sqlite_path or os.path.join(data_dir, os.path.basename(SQLITE_PATH))
+        self.store: Optional[SqliteStore] = None
+
+        self.medicines: Dict[int, Medicine] = {}
+        self.drug_index: Dict[int, List[Medicine]] = {}
+        self.drugs: DrugDictionary = DrugDictionary(names=[], name_index={}, token_index={})
+        self.suggest_index: Optional[SuggestIndex] = None
+        self.dose_index: DoseIndex = DoseIndex(amounts={}, medicine_ids={})
+        self.price_index: PriceIndex = build_price_index({})
+        self.facet_index: FacetIndex = build_facet_index({})
+        self.generation = 0
+        # fingerprint of the source files the catalog was loaded from; stable across restarts (see price_tag)
+        self.catalog_version = ''
+        self.loaded = False
+        # per-medicine count of price changes since the catalog was loaded (see apply_price_updates)
+        self.price_versions: Dict[int, int] = {}
+        # patched prices live only in this process, so their versions are qualified by it
+        self._process_id = os.urandom(4).hex()
+        self._update_lock = threading.Lock()
+
+        self.ml_matcher: Optional['MedicineMatcher'] = None
+        # medicine_id -> row of ml_matcher.medicines_df, to score only filtered rows
+        self.ml_rows: Dict[int, int] = {}
+        self.ml_loaded = False
+
+        # startup lifecycle (see start / readiness)
+        self.core_ready = threading.Event()
+        self.ml_state = 'not_started'
+        self.startup_error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._start_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._started = False
+
+    # ----- loading -----
+
+    def start(self, wait_core: bool = False):
+        """Load the catalog, then the ML matcher, on a background thread (idempotent).
+
+        The catalog (core) becomes usable as soon as `core_ready` is set, before
+        scikit-learn is even imported. With wait_core the call returns once the
+        catalog is loaded (or failed).
+        """
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._startup, name='rxlens-startup', daemon=True).start()
+        if wait_core:
+            self.core_ready.wait()
+
+    def _startup(self):
+        started = time.perf_counter()
+        try:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load_catalog()
+        except Exception as e:
+            self.startup_error = f'Catalog failed to load: {e}'
+        finally:
+            self.timings['catalog_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self.core_ready.set()
+        with self._load_lock:
+            if not self.ml_loaded:
+                self.load_ml()
+        self.timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def wait_core(self, timeout: Optional[float] = None) -> bool:
+        """True once the catalog is loaded; False on timeout or if it failed to load"""
+        self.core_ready.wait(timeout)
+        return self.loaded
+
+    def readiness(self) -> dict:
+        """Core (catalog) and ML readiness with per-phase startup timings"""
+        return {
+            'ready': self.loaded,
+            'core': {'ready': self.loaded, 'medicines': len(self.medicines) if self.loaded else 0},
+            'ml': {'state': self.ml_state, 'ready': self.ml_state == 'ready'},
+            'timings_ms': dict(self.timings),
+            'error': self.startup_error
+        }
+
+    def load(self):
+        """Load the catalog and indexes, then the ML model; each only once (waits for a running start())"""
+        with self._load_lock:
+            if not self.loaded:
+                self.load_catalog()
+            if not self.ml_loaded:
+                self.load_ml()
+
+    def load_catalog(self):
+        try:
+            self.drugs = load_drugs(self.drugs_csv, self.drug_canonical_csv)
+            if self.storage == 'sqlite':
+                self.store = self.open_store()
+                self.medicines, self.drug_index = self.store.medicines, self.store.drug_index
+            else:
+                self.medicines, self.drug_index = load_data(self.medicines_csv, self.composition_csv, self.drugs)
+                self.suggest_index = build_suggest_index(self.medicines, self.drug_index, self.drugs)
+                self.dose_index = build_dose_index(self.medicines)
+                self.price_index = build_price_index(self.medicines)
+                self.facet_index = build_facet_index(self.medicines)
+            self.price_versions = {}
+            self.catalog_version = self.source_fingerprint()
+            self.generation += 1
+            self.loaded = True
+            print(f"Loaded {len(self.medicines)} medicines and {len(self.drugs.name_index)} drug names from database")
+        except Exception as e:
+            print(f"Error loading medicines: {e}")
+            raise
+
+    def open_store(self) -> SqliteStore:
+        sources = (self.medicines_csv, self.composition_csv, self.drugs_csv, self.drug_canonical_csv)
+        if sqlite_store_is_stale(self.sqlite_path, *sources):
+            print(f"Building SQLite catalog at {self.sqlite_path}")
+            build_sqlite_store(self.sqlite_path, self.medicines_csv, self.composition_csv, self.drugs)
+        return SqliteStore(self.sqlite_path)
+
+    def load_ml(self):
+        """Import ml.model (only if a model file exists) and load the matcher; never raises"""
+        self.ml_state = 'loading'
+        try:
+            if os.path.exists(self.ml_model_path):
+                started = time.perf_counter()
+                from ml.model import MedicineMatcher
+                self.timings['ml_import_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                started = time.perf_counter()
+                matcher = MedicineMatcher.load(self.ml_model_path)
+                self.ml_rows = {int(mid): i for i, mid in enumerate(matcher.medicines_df['medicine_id'])}
+                self.ml_matcher = matcher
+                self.timings['ml_load_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                self.ml_state = 'ready'
+                print(f"Loaded ML model from {self.ml_model_path}")
+            else:
+                self.ml_state = 'unavailable'
+                print(f"⚠️  ML model not found at {self.ml_model_path}. ML endpoints will not be available.")
+        except Exception as e:
+            self.ml_state = 'failed'
+            print(f"Warning: Could not load ML model: {e}")
+        # Mark as attempted either way to avoid repeated tries
+        self.ml_loaded = True
+
+    # ----- price feed -----
+
+    def apply_price_updates(self, updates: List[Tuple[int, float]]) -> dict:
+        """Patch medicine prices in the live catalog without a reload.
+
+        Medicines are shared by `medicines`, `drug_index` and the basket/
+        substitute code, which derive price scores per request, so patching
+        them in place is enough. The price-derived indexes (suggest ties,
+        sorted price arrays) are patched at the changed medicines' entries
+        only, or rebuilt when a feed changes more than
+        PRICE_REBUILD_FRACTION of the catalog. A feed listing an id more than
+        once keeps its last price.
+        `generation` is left alone; each changed medicine's price version is
+        bumped instead so callers can invalidate just the cache entries that
+        include it.
+        """
+        received = len(updates)
+        updates = list(dict(updates).items())
+        with self._update_lock:
+            if self.store is not None:
+                known = {m.medicine_id: m.price for m in self.store.get_many(mid for mid, _ in updates)}
+            else:
+                known = {mid: self.medicines[mid].price for mid, _ in updates if mid in self.medicines}
+            unknown = [mid for mid, _ in updates if mid not in known]
+            changed = [(mid, mrp) for mid, mrp in updates if mid in known and known[mid] != mrp]
+
+            if self.store is not None:
+                self.store.update_prices(changed)
+            else:
+                for mid, mrp in changed:
+                    self.medicines[mid].price = mrp
+                if len(changed) > PRICE_REBUILD_FRACTION * len(self.medicines):
+                    self.suggest_index = build_suggest_index(self.medicines, self.drug_index, self.drugs)
+                    self.price_index = build_price_index(self.medicines)
+                elif changed:
+                    if self.suggest_index is not None:
+                        update_medicine_prices(self.suggest_index, [self.medicines[mid] for mid, _ in changed])
+                    update_prices(self.price_index, [(self.medicines[mid], known[mid]) for mid, _ in changed])
+            if changed and self.ml_matcher is not None and self.ml_matcher.medicines_df is not None:
+                df = self.ml_matcher.medicines_df
+                new_prices = df['medicine_id'].map(dict(changed))
+                df.loc[new_prices.notna(), 'mrp'] = new_prices[new_prices.notna()]
+            for mid, _ in changed:
+                self.price_versions[mid] = self.price_versions.get(mid, 0) + 1
+
+        return {
+            'success': True,
+            'received': received,
+            'updated': [mid for mid, _ in changed],
+            'unchanged_count': len(updates) - len(changed) - len(unknown),
+            'unknown': unknown
+        }
+
+    def source_fingerprint(self) -> str:
+        """Short hash of the catalog CSVs' paths, sizes and mtimes; changes when any of them does"""
+        h = hashlib.sha1()
+        for path in (self.medicines_csv, self.composition_csv, self.drugs_csv, self.drug_canonical_csv):
+            try:
+                st = os.stat(path)
+                h.update(f'{path}:{st.st_size}:{st.st_mtime_ns}\n'.encode())
+            except OSError:
+                h.update(f'{path}:missing\n'.encode())
+        return h.hexdigest()[:12]
+
+    def price_version(self, medicine_ids) -> int:
+        """Changes only when the price of one of medicine_ids changes"""
+        return sum(self.price_versions.get(mid, 0) for mid in medicine_ids)
+
+    def price_tag(self, medicine_ids) -> str:
+        """ETag component for the prices of medicine_ids: 'p0' while they are the CSV prices (valid
+        across restarts, with catalog_version), process-qualified once a price feed changed them"""
+        version = self.price_version(medicine_ids)
+        return 'p0' if version == 0 else 'p%s.%d' % (self._process_id, version)
+
+    def page_ids(self, offset: int = 0, limit: int = 100) -> List[int]:
+        """Medicine ids list_medicines(offset, limit) returns"""
+        if self.store is not None:
+            return self.store.page_ids(offset, limit)
+        return list(islice(self.medicines.keys(), offset, offset + limit))
+
+    # ----- serialization -----
+
+    def serialize_composition(self, composition) -> List[dict]:
+        """Convert CompositionItem objects to serializable dict"""
+        return [
+            {
+                'drug_id': c.drug_id,
+                'drug_name': self.drugs.name(c.drug_id),
+                'canonical_id': c.canonical_id,
+                'amount': c.amount,
+                'unit': c.unit
+            }
+            for c in composition
+        ]
+
+    def serialize_medicine(self, medicine: Medicine) -> dict:
+        """Convert Medicine object to JSON-serializable dict"""
+        return {
+            'medicine_id': medicine.medicine_id,
+            'name': medicine.name,
+            'price': medicine.price,
+            'unit_size': medicine.unit_size,
+            'group_name': medicine.group_name,
+            'category': medicine.category,
+            'pack_quantity': medicine.pack_quantity,
+            'pack_unit': medicine.pack_unit,
+            'unit_price': medicine.unit_price,
+            'composition': self.serialize_composition(medicine.composition)
+        }
+
+    def serialize_candidate_score(self, candidate: CandidateScore) -> dict:
+        """Convert CandidateScore object to JSON-serializable dict"""
+        return {
+            'medicine': self.serialize_medicine(candidate.medicine),
+            'score': candidate.score,
+            'comp_similarity': candidate.comp_similarity,
+            'price_score': candidate.price_score
+        }
+
+    def serialize_ingredient_total(self, total: IngredientTotal) -> dict:
+        """Convert IngredientTotal object to JSON-serializable dict"""
+        return {
+            'canonical_id': total.canonical_id,
+            'drug_name': self.drugs.name(total.canonical_id),
+            'unit': total.unit,
+            'total_amount': total.total_amount,
+            'lines': total.lines,
+            'positions': total.positions,
+            'medicine_ids': total.medicine_ids
+        }
+
+    # ----- catalog -----
+
+    def list_medicines(self, offset: int = 0, limit: int = 100) -> dict:
+        if self.store is not None:
+            paginated = self.store.page(offset, limit)
+        else:
+            paginated = list(islice(self.medicines.values(), offset, offset + limit))
+        return {
+            'success': True,
+            'total': len(self.medicines),
+            'count': len(paginated),
+            'limit': limit,
+            'offset': offset,
+            'medicines': [self.serialize_medicine(m) for m in paginated]
+        }
+
+    def get_medicine(self, medicine_id: int) -> Optional[dict]:
+        medicine = self.medicines.get(medicine_id)
+        if medicine is None:
+            return None
+        return {'success': True, 'medicine': self.serialize_medicine(medicine)}
+
+    # ----- search -----
+
+    def allowed_ids(self, price_filter: Optional[PriceFilter] = None, facets: Optional[Facets] = None):
+        """Ids passing a price/pack filter and facets, by index intersection (sorted price arrays and facet
+        bitmaps, or the store's indexes); None = no filter"""
+        if self.store is not None:
+            return self.store.allowed_ids(price_filter, facets)
+        selection = select(self.facet_index, facets)
+        priced = allowed_ids(self.price_index, price_filter)
+        if selection is None:
+            return priced
+        if priced is not None:
+            selection &= bitmap_from_ids(priced, self.facet_index.size)
+        return set(ids_from_bitmap(selection))
+
+    def facet_counts(self, price_filter: Optional[PriceFilter] = None, facets: Optional[Facets] = None) -> dict:
+        """Medicine counts per category and group_name value among medicines passing the filters"""
+        if self.store is not None:
+            counts = self.store.facet_counts(price_filter, facets)
+        else:
+            selection = select(self.facet_index, facets)
+            priced = allowed_ids(self.price_index, price_filter)
+            if priced is not None:
+                priced = bitmap_from_ids(priced, self.facet_index.size)
+                selection = priced if selection is None else selection & priced
+            counts = facet_counts(self.facet_index, selection)
+        return {'success': True, 'facets': counts}
+
+    def _resolve_terms(self, terms: List[QueryTerm]) -> List[Tuple[QueryTerm, List[int]]]:
+        """Each parsed term with its canonical ingredient ids ([] when it names no known ingredient)"""
+        return [(term, canonical_ids(self.drugs, resolve_ingredient(self.drugs, term.name))) for term in terms]
+
+    def _ranked_candidates(self, resolved: List[Tuple[QueryTerm, List[int]]], allowed=None) -> List[Tuple[Tuple[int, int], Medicine]]:
+        """(composition fit, medicine) for medicines containing every resolved ingredient, closest fit first
+
+        The pool comes from drug_index postings, stated doses from the dose
+        index; fit is (stated doses missed, ingredients the query does not
+        name), so (0, 0) is an exact fit.
+        """
+        in_range = self.store.medicines_matching_all if self.store is not None else \
+            lambda t: medicines_matching_all(self.dose_index, t)
+        pool = None
+        dosed = []
+        named = set()
+        for term, drug_ids in resolved:
+            if self.store is not None:
+                ids = self.store.ids_with_ingredients(drug_ids)
+            else:
+                ids = {m.medicine_id for did in drug_ids for m in self.drug_index.get(did, ())}
+            pool = ids if pool is None else pool & ids
+            if not pool:
+                return []
+            if term.amount is not None:
+                lo, hi = tolerance_window(term.amount, QUERY_DOSE_TOL)
+                dosed.append(set(in_range([(drug_ids, term.unit, lo, hi)])))
+            named.update(drug_ids)
+        if allowed is not None:
+            pool &= set(allowed)
+        ids = sorted(pool)
+        meds = self.store.get_many(ids) if self.store is not None else [self.medicines[mid] for mid in ids]
+        ranked = [((sum(1 for with_dose in dosed if med.medicine_id not in with_dose),
+                    len({c.canonical_id for c in med.composition} - named)), med) for med in meds]
+        ranked.sort(key=lambda r: (r[0], r[1].medicine_id))
+        return ranked
+
+    def query_candidates(self, query: str, allowed=None) -> Optional[List[int]]:
+        """Ids of medicines containing every ingredient the query names, closest composition fit first
+
+        None when the query names no known ingredient (score the whole
+        catalog instead); `allowed` restricts the result.
+        """
+        resolved = self._resolve_terms(parse_query(query))
+        if not resolved or not all(drug_ids for _, drug_ids in resolved):
+            return None
+        return [med.medicine_id for _, med in self._ranked_candidates(resolved, allowed)]
+
+    @staticmethod
+    def _has_dose(med: Medicine, term: QueryTerm) -> bool:
+        lo, hi = tolerance_window(term.amount, QUERY_DOSE_TOL)
+        return any(c.unit == term.unit and lo <= c.amount <= hi for c in med.composition)
+
+    def _best_name_match(self, q: str, candidates, deadline: Deadline = None, accept=None) -> Tuple[Medicine, float]:
+        best_match = None
+        best_score = 0
+        for i, med in enumerate(candidates):
+            if deadline is not None and i % 256 == 0 and deadline.expired():
+                break
+            if accept is not None and not accept(med):
+                continue
+            score = fuzz.token_set_ratio(q, med.name.lower())
+            if score > best_score:
+                best_score = score
+                best_match = med
+        return best_match, best_score
+
+    def fuzzy_best_match(self, query: str, deadline: Deadline = None, allowed=None) -> Tuple[Medicine, float]:
+        """Return the catalog medicine best matching query, with its name's token_set_ratio score
+
+        Queries naming known ingredients ('Metformin 500 mg SR') are matched on
+        composition first: only medicines containing every named ingredient
+        are considered, the closest fit (stated doses present, no other
+        ingredients) wins and the name score only breaks ties within a fit. A
+        looser fit is taken only when no closer one reaches MATCH_THRESHOLD.
+        Queries naming some known ingredients score the whole catalog by name
+        but accept only medicines that contain those ingredients and, if a
+        dose is stated, that dose. Queries naming none (brands such as
+        'Dolo 650'), or whose filter accepts nothing, fall back to plain name
+        scoring over the whole catalog. Stops at the deadline with the best
+        match scanned so far (deadline.hit tells the caller). With a SQLite store the
+        full scan covers only the FTS name candidates; `allowed` restricts the
+        candidates to those ids.
+        """
+        q = query.lower()
+        terms = parse_query(query)
+        resolved = self._resolve_terms(terms)
+        complete = bool(resolved) and all(drug_ids for _, drug_ids in resolved)
+        ranked = self._ranked_candidates(resolved, allowed) if complete else []
+        if ranked:
+            fallback = (None, 0)
+            for _, group in groupby(ranked, key=lambda r: r[0]):
+                best_match, best_score = self._best_name_match(q, (med for _, med in group), deadline)
+                if best_score >= MATCH_THRESHOLD or (deadline is not None and deadline.hit):
+                    return best_match, best_score
+                if best_score > fallback[1]:
+                    fallback = (best_match, best_score)
+            return fallback
+
+        known = [set(drug_ids) for _, drug_ids in resolved if drug_ids]
+        if not known:
+            # brand names ('Dolo 650', 'Calpol 120mg/5ml'): plain name scoring over the whole catalog
+            return self._best_name_match(q, self._scan_candidates(query, allowed), deadline)
+        dosed = [term for term in terms if term.amount is not None]
+
+        def accept(med: Medicine) -> bool:
+            ingredients = {c.canonical_id for c in med.composition}
+            return all(ingredients & ids for ids in known) and \
+                (not dosed or any(self._has_dose(med, term) for term in dosed))
+        best_match, best_score = self._best_name_match(q, self._scan_candidates(query, allowed), deadline, accept)
+        if best_match is None and not (deadline is not None and deadline.hit):
+            return self._best_name_match(q, self._scan_candidates(query, allowed), deadline)
+        return best_match, best_score
+
+    def _scan_candidates(self, query: str, allowed=None) -> Iterable[Medicine]:
+        """Medicines a full name scan scores: FTS name candidates with a SQLite store, else the catalog"""
+        if self.store is not None:
+            return self.store.name_candidates(query, allowed=allowed)
+        if allowed is not None:
+            return (self.medicines[mid] for mid in sorted(allowed))
+        return self.medicines.values()
+
+    def search(self, query: str, threshold: float = MATCH_THRESHOLD, deadline: Deadline = None,
+               price_filter: Optional[PriceFilter] = None, facets: Optional[Facets] = None) -> dict:
+        """Best fuzzy name match among medicines passing the filters; success is False when nothing reaches threshold"""
+        deadline = deadline or Deadline()
+        best_match, best_score = self.fuzzy_best_match(query, deadline, self.allowed_ids(price_filter, facets))
+        if best_score >= threshold and best_match:
+            return {
+                'success': True,
+                'medicine': self.serialize_medicine(best_match),
+                'similarity_score': best_score,
+                'partial': deadline.hit
+            }
+        return {
+            'success': False,
+            'error': f'No good match found (best match: {best_score}% similarity)',
+            'best_match_score': best_score,
+            'partial': deadline.hit
+        }
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        if self.store is not None:
+            completions = self.store.suggest(prefix, limit)
+        else:
+            completions = suggest(self.suggest_index, prefix, limit=limit) if self.suggest_index else []
+        return [{'kind': s.kind, 'id': s.id, 'label': s.label, 'weight': s.weight} for s in completions]
+
+    def ranking_dose_index(self) -> Optional[DoseIndex]:
+        """The in-memory dose index substitute ranking looks matches up in (None with a SQLite store, which has none)"""
+        return self.dose_index if self.store is None else None
+
+    def substitutes(self, medicine_id: int, top_k: int = 10, deadline: Deadline = None,
+                    price_filter: Optional[PriceFilter] = None, price_basis: str = 'pack',
+                    facets: Optional[Facets] = None) -> dict:
+        """Ranked substitutes for a catalog medicine (which must exist), optionally price/pack/facet filtered"""
+        deadline = deadline or Deadline()
+        substitutes = find_substitutes(medicine_id, self.medicines, self.drug_index, top_k=top_k, deadline=deadline,
+                                       allowed=self.allowed_ids(price_filter, facets), price_basis=price_basis,
+                                       dose_index=self.ranking_dose_index())
+        return {
+            'success': True,
+            'medicine_id': medicine_id,
+            'count': len(substitutes),
+            'substitutes': [self.serialize_candidate_score(s) for s in substitutes],
+            'partial': deadline.hit
+        }
+
+    # ----- prescriptions -----
+
+    def analyze_line(self, med_name: str, top_k: int, deadline: Deadline) -> Tuple[dict, Optional[Medicine]]:
+        """Resolve one prescription line and rank its substitutes; returns (result, matched medicine or None)"""
+        if deadline.expired():
+            return {
+                'status': 'skipped',
+                'error': 'Request deadline reached before this medicine was analyzed'
+            }, None
+
+        # Search for the medicine
+        best_match, best_score = self.fuzzy_best_match(med_name, deadline)
+
+        if best_score >= MATCH_THRESHOLD and best_match:
+            # Find substitutes
+            substitutes = find_substitutes(best_match.medicine_id, self.medicines, self.drug_index, top_k=top_k,
+                                           deadline=deadline, dose_index=self.ranking_dose_index())
+            return {
+                'status': 'found',
+                'original_medicine': self.serialize_medicine(best_match),
+                'similarity_score': best_score,
+                'substitutes': [self.serialize_candidate_score(s) for s in substitutes]
+            }, best_match
+        return {
+            'status': 'not_found',
+            'error': f'No good match found (best: {best_score}% match)',
+            'best_match_score': best_score
+        }, None
+
+    def prescription_summary(self, results: Dict[Tuple[int, str], dict], resolved: Dict[Tuple[int, str], Medicine]) -> dict:
+        """Summary counts plus the prescription-level ingredient multiset (cumulative doses, duplicate salts)"""
+        found_count = sum(1 for r in results.values() if r['status'] == 'found')
+        not_found_count = sum(1 for r in results.values() if r['status'] == 'not_found')
+        total_alternatives = sum(len(r.get('substitutes', [])) for r in results.values() if r['status'] == 'found')
+
+        totals = ingredient_totals(resolved)
+        duplicates = duplicate_ingredients(totals)
+
+        return {
+            'summary': {
+                'total_medicines': len(results),
+                'found_count': found_count,
+                'not_found_count': not_found_count,
+                'total_alternatives': total_alternatives,
+                'skipped_count': sum(1 for r in results.values() if r['status'] == 'skipped'),
+                'duplicate_ingredient_count': len({t.canonical_id for t in duplicates})
+            },
+            'ingredients': [self.serialize_ingredient_total(t) for t in totals],
+            'duplicate_ingredients': [self.serialize_ingredient_total(t) for t in duplicates]
+        }
+
+    def iter_analyze_prescription(self, lines: List[str], top_k: int = 5, deadline: Deadline = None) -> Iterator[dict]:
+        """Yield {'type': 'line', 'position', 'query', 'result'} per line as it is analyzed, then one 'summary' record"""
+        deadline = deadline or Deadline()
+        # keyed by (position, line) so a medicine listed twice stays two lines
+        results = {}
+        resolved = {}
+        for position, med_name in enumerate(lines):
+            key = (position, med_name)
+            results[key], match = self.analyze_line(med_name, top_k, deadline)
+            if match is not None:
+                resolved[key] = match
+            yield {'type': 'line', 'position': position, 'query': med_name, 'result': results[key]}
+        yield dict(type='summary', success=True, partial=deadline.hit, **self.prescription_summary(results, resolved))
+
+    def analyze_prescription(self, lines: List[str], top_k: int = 5, deadline: Deadline = None) -> dict:
+        """Whole-prescription analysis: per-line results, summary, ingredient totals and duplicates
+
+        `results` lists one {'position', 'query', 'result'} record per line in
+        prescription order, so a medicine listed twice keeps both entries.
+        """
+        results = []
+        analysis = {}
+        for record in self.iter_analyze_prescription(lines, top_k, deadline):
+            if record['type'] == 'line':
+                results.append({k: v for k, v in record.items() if k != 'type'})
+            else:
+                analysis = {k: v for k, v in record.items() if k != 'type'}
+        return dict(analysis, results=results)
+
+    def resolve_lines(self, lines: List[str], deadline: Deadline = None) -> Tuple[Dict[str, Medicine], List[str]]:
+        """Fuzzy-resolve prescription lines to catalog medicines; returns (resolved, not_found lines)"""
+        resolved = {}
+        not_found = []
+        for med_name in lines:
+            best_match, best_score = self.fuzzy_best_match(med_name, deadline)
+            if best_score >= MATCH_THRESHOLD and best_match:
+                resolved[med_name] = best_match
+            else:
+                not_found.append(med_name)
+        return resolved, not_found
+
+    def optimize_prescription(self, lines: List[str], dose_tol: float = 0.05, time_budget: float = 0.05,
+                              deadline: Deadline = None) -> dict:
+        """Cheapest set of catalog medicines covering every ingredient of the prescription"""
+        deadline = deadline or Deadline()
+        resolved, not_found = self.resolve_lines(lines, deadline)
+
+        remaining = deadline.remaining()
+        if remaining is not None:
+            time_budget = min(time_budget, remaining)
+        basket = cheapest_basket(resolved, self.drug_index, dose_tol=dose_tol, time_budget=time_budget)
+        requirements = basket.requirements
+
+        return {
+            'success': True,
+            'optimal': basket.optimal,
+            'nodes_explored': basket.nodes,
+            'original_price': sum(m.price for m in {m.medicine_id: m for m in resolved.values()}.values()),
+            'total_price': basket.total_price,
+            'basket': [
+                {
+                    'medicine': self.serialize_medicine(med),
+                    'covers': [
+                        {
+                            'canonical_id': requirements[i].canonical_id,
+                            'drug_name': self.drugs.name(requirements[i].canonical_id),
+                            'amount': requirements[i].amount,
+                            'unit': requirements[i].unit,
+                            'lines': requirements[i].lines
+                        }
+                        for i in covers
+                    ]
+                }
+                for med, covers in zip(basket.medicines, basket.covers)
+            ],
+            'uncovered': [
+                {
+                    'canonical_id': requirements[i].canonical_id,
+                    'drug_name': self.drugs.name(requirements[i].canonical_id),
+                    'lines': requirements[i].lines
+                }
+                for i in basket.uncovered
+            ],
+            'not_found': not_found,
+            'partial': deadline.hit or not basket.optimal
+        }
+
+    # ----- ingredients -----
+
+    def search_ingredients(self, query: str, limit: int = 50) -> dict:
+        """Drugs matching ingredient text and the medicines containing any of them"""
+        drug_ids = resolve_ingredient(self.drugs, query)
+        if not drug_ids:
+            return {
+                'success': False,
+                'error': f'No ingredient found matching "{query}"'
+            }
+
+        medicines = medicines_for_drugs(self.drug_index, canonical_ids(self.drugs, drug_ids))
+        return {
+            'success': True,
+            'query': query,
+            'drugs': [
+                {
+                    'drug_id': did,
+                    'drug_name': self.drugs.name(did),
+                    'canonical_id': self.drugs.canonical_id(did),
+                    'medicine_count': len(self.drug_index.get(self.drugs.canonical_id(did), []))
+                }
+                for did in drug_ids
+            ],
+            'total_medicines': len(medicines),
+            'medicines': [self.serialize_medicine(m) for m in medicines[:limit]]
+        }
+
+    def medicines_by_dose_range(self, ingredients: List[dict], limit: int = 50) -> dict:
+        """Medicines containing every ingredient within its dose range (see /api/medicines/dose-range)"""
+        terms = []
+        for term in ingredients:
+            if 'drug_id' in term:
+                drug_ids = [self.drugs.canonical_id(int(term['drug_id']))]
+            else:
+                drug_ids = canonical_ids(self.drugs, resolve_ingredient(self.drugs, str(term.get('name', ''))))
+            if not drug_ids:
+                return {
+                    'success': False,
+                    'error': f'Unknown ingredient: {term.get("name", term.get("drug_id"))}'
+                }
+            lo, unit = normalize_dose(term.get('min', 0), term.get('unit', 'mg'))
+            hi, _ = normalize_dose(term.get('max', float('inf')), term.get('unit', 'mg'))
+            terms.append((drug_ids, unit, lo, hi))
+
+        if self.store is not None:
+            medicine_ids = self.store.medicines_matching_all(terms)
+            page = self.store.get_many(medicine_ids[:limit])
+        else:
+            medicine_ids = medicines_matching_all(self.dose_index, terms)
+            page = [self.medicines[mid] for mid in medicine_ids[:limit]]
+        return {
+            'success': True,
+            'total': len(medicine_ids),
+            'count': min(len(medicine_ids), limit),
+            'medicines': [self.serialize_medicine(m) for m in page]
+        }
+
+    # ----- ML -----
+
+    def ml_matches(self, query: str, top_k: int = 5, allowed=None) -> List[dict]:
+        """TF-IDF matches for query (empty when nothing matches); requires ml_matcher
+
+        With `allowed` (see allowed_ids) only those medicines' rows are scored.
+        """
+        rows = None
+        if allowed is not None:
+            rows = sorted(self.ml_rows[mid] for mid in allowed if mid in self.ml_rows)
+            if not rows:
+                return []
+        matches_df = self.ml_matcher.find_matches(query, top_k=top_k, rows=rows)
+        return [
+            {
+                'medicine_id': int(row['medicine_id']),
+                'name': row['medicine_name'],
+                'price': float(row['mrp']),
+                'unit_size': row['unit_size'],
+                'group_name': row['group_name'],
+                'category': row['category'],
+                'similarity_score': float(row['similarity_score'])
+            }
+            for _, row in matches_df.iterrows()
+        ]
+
+    def compare_methods(self, query: str, deadline: Deadline = None) -> dict:
+        """Fuzzy matching and ML search side by side for one query"""
+        comparison = {
+            'query': query,
+            'methods': {}
+        }
+
+        # Method 1: Fuzzy Matching (existing)
+        try:
+            best_match, best_score = self.fuzzy_best_match(query, deadline)
+
+            if best_score >= MATCH_THRESHOLD and best_match:
+                comparison['methods']['fuzzy_matching'] = {
+                    'status': 'success',
+                    'medicine': self.serialize_medicine(best_match),
+                    'similarity_score': best_score
+                }
+            else:
+                comparison['methods']['fuzzy_matching'] = {
+                    'status': 'no_match',
+                    'best_score': best_score
+                }
+        except Exception as e:
+            comparison['methods']['fuzzy_matching'] = {'status': 'error', 'error': str(e)}
+
+        # Method 2: ML-based Search
+        try:
+            if self.ml_matcher:
+                matches = self.ml_matches(query, top_k=3)
+                if matches:
+                    comparison['methods']['ml_tfidf'] = {
+                        'status': 'success',
+                        'matches': [
+                            {k: m[k] for k in ('medicine_id', 'name', 'price', 'similarity_score')}
+                            for m in matches
+                        ]
+                    }
+                else:
+                    comparison['methods']['ml_tfidf'] = {
+                        'status': 'no_match'
+                    }
+            else:
+                comparison['methods']['ml_tfidf'] = {
+                    'status': 'unavailable',
+                    'reason': 'ML model not loaded'
+                }
+        except Exception as e:
+            comparison['methods']['ml_tfidf'] = {'status': 'error', 'error': str(e)}
+
+        return comparison
@@ -1,24 +1,80 @@
-from typing import Dict, Tuple, List
+import os
+import re
+import sys
+from typing import Dict, Tuple, List, Optional
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
-@dataclass
+def _intern(value):
+    """Share one copy of a repeated categorical string (category, unit, ...) across instances"""
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(frozen=True, slots=True)
 class CompositionItem:
     drug_id: int
     amount: float
     unit: str
+    # canonical ingredient id shared by salt/spelling variants; defaults to drug_id
+    canonical_id: Optional[int] = None
 
+    def __post_init__(self):
+        if self.canonical_id is None:
+            object.__setattr__(self, 'canonical_id', self.drug_id)
+        object.__setattr__(self, 'unit', _intern(self.unit))
 
-@dataclass
+
+@dataclass(slots=True)
 class Medicine:
+    """One catalog product; slotted, with interned categorical fields and an immutable composition tuple.
+
+    Only `price` changes after load (price feeds patch it in place).
+    """
     medicine_id: int
     name: str
     price: float
     unit_size: str
     group_name: str
     category: str
-    composition: List[CompositionItem]
+    composition: Tuple[CompositionItem, ...]
+    # unit_size parsed once at load (see parse_unit_size); quantity is None when unparseable
+    pack_quantity: Optional[float] = None
+    pack_unit: str = ''
+
+    def __post_init__(self):
+        self.composition = tuple(self.composition)
+        self.unit_size = _intern(self.unit_size)
+        self.group_name = _intern(self.group_name)
+        self.category = _intern(self.category)
+        self.pack_unit = _intern(self.pack_unit)
+
+    @property
+    def unit_price(self) -> Optional[float]:
+        """Price per pack unit (tablet, ml, g or dose), or None when the pack size is unknown"""
+        if not self.pack_quantity:
+            return None
+        return self.price / self.pack_quantity
+
+
+@dataclass
+class DrugDictionary:
+    names: List[str]
+    name_index: Dict[str, List[int]]
+    token_index: Dict[str, List[int]]
+    canonical: List[int] = field(default_factory=list)
+
+    def name(self, drug_id: int) -> str:
+        """Return the display name for a drug id, or '' if the id is unknown."""
+        if 0 <= drug_id < len(self.names):
+            return self.names[drug_id]
+        return ''
+
+    def canonical_id(self, drug_id: int) -> int:
+        """Return the canonical ingredient id for a drug id (itself if unmapped)."""
+        if 0 <= drug_id < len(self.canonical):
+            return self.canonical[drug_id]
+        return drug_id
 
 
 def _parse_fraction(value: str) -> float:
@@ -54,17 +110,62 @@ def _normalize_unit(amount: float, unit: str) -> Tuple[float, str]:
     return amount, u
 
 
-def load_data(medicines_csv: str, composition_csv: str) -> Tuple[Dict[int, Medicine], Dict[int, List[Medicine]]]:
+# (pattern, unit, factor to that unit), tried in order
+_PACK_MEASURE_RES = [
+    (re.compile(r'(\d+(?:\.\d+)?)\s*ml\b'), 'ml', 1.0),
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:g|gm|gms|gram|grams)\b'), 'g', 1.0),
+    (re.compile(r'(\d+(?:\.\d+)?)\s*kg\b'), 'g', 1000.0),
+    (re.compile(r'(\d+)\s*(?:mdi|md)\b'), 'dose', 1.0),
+]
+_PACK_COUNT_RE = re.compile(
+    r"(\d+)\s*(?:['\u2019]s|s|tablets?|capsules?|sachets?|vials?|ampoules?|pcs?|pieces?|strips?|napkins?|wipes?|buds?)\b"
+    r"|pack of (\d+)"
+)
+_PACK_COUNT_WORDS = {'one': 1, 'single': 1, 'pair': 2, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'ten': 10}
+_PACK_SINGLE_RE = re.compile(r'\b(?:vial|ampoule|sachet|kit|tube|bottle|pen|cartridge|catridge|inhaler|bar)\b')
+
+
+def parse_unit_size(unit_size: str) -> Tuple[Optional[float], str]:
+    """Parse a pack label into (quantity, unit), unit one of 'unit', 'ml', 'g', 'dose'.
+
+    e.g. "10's" -> (10, 'unit'), '100 ml Bottle' -> (100, 'ml'), '15 Gms Tube'
+    -> (15, 'g'), '200 MDI' -> (200, 'dose'), 'Pair in Mono-Pack' -> (2, 'unit'),
+    'Vial & Wfi' -> (1, 'unit'). Measures win over counts ("1's Tin 250g" is
+    250 g). Returns (None, '') when nothing is recognised.
+    """
+    if unit_size is None or (not isinstance(unit_size, str) and pd.isna(unit_size)):
+        return None, ''
+    s = str(unit_size).strip().lower()
+    for pattern, unit, factor in _PACK_MEASURE_RES:
+        m = pattern.search(s)
+        if m and float(m.group(1)) > 0:
+            return float(m.group(1)) * factor, unit
+    m = _PACK_COUNT_RE.search(s)
+    if m and int(m.group(1) or m.group(2)) > 0:
+        return float(m.group(1) or m.group(2)), 'unit'
+    first = s.split(' ', 1)[0]
+    if first in _PACK_COUNT_WORDS:
+        return float(_PACK_COUNT_WORDS[first]), 'unit'
+    if _PACK_SINGLE_RE.search(s):
+        return 1.0, 'unit'
+    return None, ''
+
+
+def load_data(medicines_csv: str, composition_csv: str, drugs: Optional[DrugDictionary] = None) -> Tuple[Dict[int, Medicine], Dict[int, List[Medicine]]]:
     """Load medicines and composition CSVs and return medicines map and drug->med index.
 
     - medicines_csv: path to jan_aushadhi_medicines.csv
     - composition_csv: path to jan_aushadhi_composition.csv
+    - drugs: optional drug dictionary; when given, composition items carry its
+      canonical ids and the index is keyed on them so salt variants share a key
     """
     meds_df = pd.read_csv(medicines_csv)
     comp_df = pd.read_csv(composition_csv)
 
     medicines: Dict[int, Medicine] = {}
     drug_index: Dict[int, List[Medicine]] = {}
+    # composition items are immutable, so medicines with the same ingredient and dose share one
+    items: Dict[tuple, CompositionItem] = {}
 
     # pre-group composition by medicine_id
     grouped = comp_df.groupby('medicine_id')
@@ -84,17 +185,79 @@ def load_data(medicines_csv: str, composition_csv: str) -> Tuple[Dict[int, Medic
                     raw_amt = crow['amount']
                     parsed = _parse_fraction(raw_amt)
                     normalized_amt, normalized_unit = _normalize_unit(parsed, crow['unit'])
-                    comp_items.append(CompositionItem(int(crow['drug_id']), normalized_amt, normalized_unit))
+                    did = int(crow['drug_id'])
+                    cid = drugs.canonical_id(did) if drugs is not None else did
+                    key = (did, normalized_amt, normalized_unit, cid)
+                    item = items.get(key)
+                    if item is None:
+                        item = items[key] = CompositionItem(did, normalized_amt, normalized_unit, cid)
+                    comp_items.append(item)
                 except Exception:
                     # skip malformed composition rows
                     continue
 
-        med = Medicine(medicine_id=mid, name=name, price=price, unit_size=unit_size, group_name=group_name, category=category, composition=comp_items)
+        pack_quantity, pack_unit = parse_unit_size(unit_size)
+        med = Medicine(medicine_id=mid, name=name, price=price, unit_size=unit_size, group_name=group_name, category=category,
+                       composition=comp_items, pack_quantity=pack_quantity, pack_unit=pack_unit)
         medicines[mid] = med
 
-    # build inverted index
+    # build inverted index on canonical ids (one entry per medicine even if two variants collapse)
     for med in medicines.values():
-        for c in med.composition:
-            drug_index.setdefault(c.drug_id, []).append(med)
+        for cid in dict.fromkeys(c.canonical_id for c in med.composition):
+            drug_index.setdefault(cid, []).append(med)
 
     return medicines, drug_index
+
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace, e.g. 'Aspirin Gastro-resistant IP' -> 'aspirin gastro resistant ip'."""
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return ''
+    return _NON_ALNUM.sub(' ', str(text).lower()).strip()
+
+
+def load_drugs(drugs_csv: str, canonical_csv: Optional[str] = None) -> DrugDictionary:
+    """Load drugs.csv into an id->name array plus normalized name and token indexes.
+
+    - names[drug_id] is the display name ('' for ids not present in the file)
+    - name_index maps the full normalized name to drug ids
+    - token_index maps each normalized token to the sorted drug ids containing it
+    - canonical[drug_id] is the canonical ingredient id from canonical_csv
+      (written offline by canonical.py); identity when the file is absent
+    """
+    drugs_df = pd.read_csv(drugs_csv)
+
+    rows: List[Tuple[int, str]] = []
+    for did, dname in zip(drugs_df['drug_id'], drugs_df['drug_name']):
+        if pd.isna(did):
+            continue
+        rows.append((int(did), '' if pd.isna(dname) else str(dname).strip()))
+
+    size = max((did for did, _ in rows), default=-1) + 1
+    names: List[str] = [''] * size
+    name_index: Dict[str, List[int]] = {}
+    token_index: Dict[str, List[int]] = {}
+
+    for did, dname in rows:
+        names[did] = dname
+        key = normalize_name(dname)
+        if not key:
+            continue
+        name_index.setdefault(key, []).append(did)
+        for token in set(key.split()):
+            token_index.setdefault(token, []).append(did)
+
+    for ids in token_index.values():
+        ids.sort()
+
+    canonical: List[int] = list(range(size))
+    if canonical_csv and os.path.exists(canonical_csv):
+        canon_df = pd.read_csv(canonical_csv)
+        for did, cid in zip(canon_df['drug_id'], canon_df['canonical_id']):
+            if 0 <= int(did) < size:
+                canonical[int(did)] = int(cid)
+
+    return DrugDictionary(names=names, name_index=name_index, token_index=token_index, canonical=canonical)
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+try:
+    from .etl import Medicine
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import Medicine
+
+
+FACET_FIELDS = ('category', 'group_name')
+
+# facet name -> selected value keys; values of one facet are OR-ed, facets AND-ed
+Facets = Dict[str, List[str]]
+
+
+@dataclass
+class FacetIndex:
+    """Per facet value, a bitmap (Python int, bit i = medicine id i) of the medicines having it."""
+    bitmaps: Dict[str, Dict[str, int]]
+    # facet -> value key -> display value (alphabetically first spelling)
+    labels: Dict[str, Dict[str, str]]
+    size: int
+
+
+def facet_key(value) -> str:
+    """Case/whitespace-insensitive facet value ('Anti-diabetic ' and 'Anti-Diabetic' are one group)"""
+    if not isinstance(value, str):
+        return ''
+    return ' '.join(value.split()).lower()
+
+
+def bitmap_from_ids(ids: Iterable[int], size: int) -> int:
+    bits = bytearray((size + 8) // 8)
+    for mid in ids:
+        if 0 <= mid <= size:
+            bits[mid >> 3] |= 1 << (mid & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def ids_from_bitmap(bitmap: int) -> List[int]:
+    """Set bit positions in ascending order"""
+    ids = []
+    for i, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = i << 3
+            ids.extend(base + b for b in range(8) if byte >> b & 1)
+    return ids
+
+
+def build_facet_index(medicines: Dict[int, Medicine]) -> FacetIndex:
+    """Build per-value bitmaps over FACET_FIELDS at catalog load."""
+    size = max(medicines, default=0)
+    members: Dict[str, Dict[str, List[int]]] = {f: {} for f in FACET_FIELDS}
+    labels: Dict[str, Dict[str, str]] = {f: {} for f in FACET_FIELDS}
+    for med in medicines.values():
+        for f in FACET_FIELDS:
+            value = getattr(med, f)
+            key = facet_key(value)
+            if key:
+                members[f].setdefault(key, []).append(med.medicine_id)
+                label = ' '.join(value.split())
+                labels[f][key] = min(labels[f].get(key, label), label)
+    bitmaps = {f: {key: bitmap_from_ids(ids, size) for key, ids in values.items()} for f, values in members.items()}
+    return FacetIndex(bitmaps=bitmaps, labels=labels, size=size)
+
+
+def parse_facets(data) -> Optional[Facets]:
+    """Validate a request's 'facets' object ({'category': 'tablet' or [...], ...}); None when empty. Raises ValueError."""
+    if not data:
+        return None
+    if not isinstance(data, dict):
+        raise ValueError('facets must be an object')
+    unknown = set(data) - set(FACET_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown facet(s): {", ".join(sorted(unknown))} (expected {", ".join(FACET_FIELDS)})')
+    facets = {}
+    for f, values in data.items():
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f'facet {f} must be a string or a list of strings')
+        keys = sorted({facet_key(v) for v in values} - {''})
+        if keys:
+            facets[f] = keys
+    return facets or None
+
+
+def facets_key(facets: Optional[Facets]) -> Optional[tuple]:
+    """Hashable form, for request coalescing keys"""
+    return tuple(sorted((f, tuple(v)) for f, v in facets.items())) if facets else None
+
+
+def select(index: FacetIndex, facets: Optional[Facets]) -> Optional[int]:
+    """Bitmap of medicines matching every facet (any of its values); None when facets is empty."""
+    if not facets:
+        return None
+    selection = None
+    for f, keys in facets.items():
+        bitmap = 0
+        for key in keys:
+            bitmap |= index.bitmaps.get(f, {}).get(key, 0)
+        selection = bitmap if selection is None else selection & bitmap
+        if not selection:
+            return 0
+    return selection
+
+
+def facet_counts(index: FacetIndex, selection: Optional[int] = None) -> Dict[str, List[dict]]:
+    """Per facet, each value's medicine count within selection (all medicines if None), largest first."""
+    counts = {}
+    for f in FACET_FIELDS:
+        values = []
+        for key, bitmap in index.bitmaps[f].items():
+            n = (bitmap if selection is None else bitmap & selection).bit_count()
+            if n:
+                values.append({'value': index.labels[f][key], 'count': n})
+        values.sort(key=lambda v: (-v['count'], v['value']))
+        counts[f] = values
+    return counts
@@ -0,0 +1,140 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import brotli  # optional: gzip is used when it is not installed
+except ImportError:
+    brotli = None
+
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+# ETag suffix per content coding: each encoded body is its own representation
+ENCODING_ETAG_SUFFIX = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+
+def make_etag(catalog_version, *parts) -> str:
+    """Strong entity tag (unquoted) for a response derived from the catalog at `catalog_version`."""
+    return '-'.join(['g%s' % catalog_version] + [str(p) for p in parts])
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The strong ETag of etag's body in `encoding` ('identity', 'gzip' or 'br')"""
+    return etag + ENCODING_ETAG_SUFFIX[encoding]
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Pick 'br', 'gzip' or 'identity' from an Accept-Encoding header."""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return 'identity'
+
+
+def encode(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+class EncodedResponseCache:
+    """LRU of encoded response bodies for one catalog generation.
+
+    Entries are keyed on (etag, encoding). Seeing a newer generation drops
+    everything, so stale bytes are never served after a catalog change.
+    Entries may also carry tags (e.g. the medicine ids in the body) so a
+    partial change can evict just the entries that include it.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, str]]" = OrderedDict()
+        self._tagged: Dict[object, Set[Tuple[str, str]]] = {}
+        self._tags_of: Dict[Tuple[str, str], tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, generation: int, etag: str, encoding: str, build: Callable[[], bytes],
+                     tags: Iterable = ()) -> Tuple[bytes, str]:
+        """Return (body, encoding actually used) for etag, building and encoding it on a miss.
+
+        Small bodies are stored and returned as identity even if compression was accepted.
+        """
+        key = (etag, encoding)
+        with self._lock:
+            if self._generation != generation:
+                self._entries.clear()
+                self._tagged.clear()
+                self._tags_of.clear()
+                self._generation = generation
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        raw = build()
+        used = encoding if len(raw) >= MIN_COMPRESS_BYTES else 'identity'
+        entry = (encode(raw, used), used)
+
+        with self._lock:
+            self.misses += 1
+            if self._generation == generation:
+                self._entries[key] = entry
+                self._tags_of[key] = tuple(tags)
+                for tag in self._tags_of[key]:
+                    self._tagged.setdefault(tag, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._forget(self._entries.popitem(last=False)[0])
+        return entry
+
+    def _forget(self, key: Tuple[str, str]):
+        """Remove an evicted key from the tag map (callers hold the lock)"""
+        for tag in self._tags_of.pop(key, ()):
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def invalidate(self, etag: str = None):
+        """Drop one etag (all encodings), or everything when etag is None."""
+        with self._lock:
+            if etag is None:
+                self._entries.clear()
+                self._tagged.clear()
+                self._tags_of.clear()
+                return
+            for key in [k for k in self._entries if k[0] == etag]:
+                del self._entries[key]
+                self._forget(key)
+
+    def invalidate_tags(self, tags: Iterable) -> int:
+        """Drop every entry carrying any of tags; returns how many were dropped."""
+        dropped = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tagged.get(tag, ())):
+                    if self._entries.pop(key, None) is not None:
+                        dropped += 1
+                    self._forget(key)
+        return dropped
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'generation': self._generation}
@@ -0,0 +1,56 @@
+from typing import Dict, List
+try:
+    from .etl import DrugDictionary, Medicine, normalize_name
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import DrugDictionary, Medicine, normalize_name
+
+
+def resolve_ingredient(drugs: DrugDictionary, text: str) -> List[int]:
+    """Resolve free ingredient text to drug ids using the precomputed indexes.
+
+    Strategy:
+      - intersect the token postings of every query token, smallest posting
+        list first so the intersection stays cheap ('diclofenac' also finds
+        'Diclofenac Sodium IP')
+      - exact normalized name hits are returned first
+    """
+    key = normalize_name(text)
+    if not key:
+        return []
+    exact = drugs.name_index.get(key, [])
+
+    postings = []
+    for token in set(key.split()):
+        ids = drugs.token_index.get(token)
+        if not ids:
+            return list(exact)
+        postings.append(ids)
+    postings.sort(key=len)
+
+    result = set(postings[0])
+    for ids in postings[1:]:
+        result.intersection_update(ids)
+        if not result:
+            break
+    result.difference_update(exact)
+    return list(exact) + sorted(result)
+
+
+def canonical_ids(drugs: DrugDictionary, drug_ids: List[int]) -> List[int]:
+    """Map drug ids to their canonical ingredient ids, keeping first-seen order."""
+    return list(dict.fromkeys(drugs.canonical_id(did) for did in drug_ids))
+
+
+def medicines_for_drugs(drug_index: Dict[int, List[Medicine]], canonical_drug_ids: List[int]) -> List[Medicine]:
+    """Union of drug_index postings for the given canonical ids, deduplicated by medicine_id."""
+    med_by_id: Dict[int, Medicine] = {}
+    for did in canonical_drug_ids:
+        for m in drug_index.get(did, []):
+            if m.medicine_id not in med_by_id:
+                med_by_id[m.medicine_id] = m
+    return list(med_by_id.values())
@@ -1,7 +1,9 @@
 from dataclasses import dataclass
-from typing import List, Dict, Tuple, Iterable
+from typing import Callable, List, Dict, Tuple, Iterable, Optional, Set
 try:
     from .etl import CompositionItem, Medicine, load_data
+    from .dose_index import DoseIndex, dose_matches
+    from .admission import Deadline
 except Exception:
     # allow running as a script (no package) by adding the current package dir to sys.path
     import sys, os
@@ -9,9 +11,11 @@ except Exception:
     if pkg_dir not in sys.path:
         sys.path.insert(0, pkg_dir)
     from etl import CompositionItem, Medicine, load_data
+    from dose_index import DoseIndex, dose_matches
+    from admission import Deadline
 
 
-@dataclass
+@dataclass(slots=True)
 class CandidateScore:
     medicine: Medicine
     score: float
@@ -20,15 +24,22 @@ class CandidateScore:
 
 
 def composition_signature(composition: Iterable[CompositionItem]) -> frozenset:
-    """Return canonical signature as frozenset of (drug_id, rounded_amount, unit)"""
+    """Return canonical signature as frozenset of (canonical_id, rounded_amount, unit)"""
     sig = set()
     for c in composition:
         # round to reasonable precision
         amt = round(float(c.amount), 6)
-        sig.add((int(c.drug_id), amt, c.unit or ''))
+        sig.add((int(c.canonical_id), amt, c.unit or ''))
     return frozenset(sig)
 
 
+def signature_size(composition: Tuple[CompositionItem, ...]) -> int:
+    """len(composition_signature(composition)), without building it when no ingredient repeats"""
+    if len(composition) < 2 or len({c.canonical_id for c in composition}) == len(composition):
+        return len(composition)
+    return len({(c.canonical_id, round(float(c.amount), 6), c.unit or '') for c in composition})
+
+
 def composition_similarity(sig_a: frozenset, sig_b: frozenset, dose_tol: float = 0.05) -> float:
     """Compute a simple similarity between two composition signatures (0..1).
 
@@ -36,22 +47,21 @@ def composition_similarity(sig_a: frozenset, sig_b: frozenset, dose_tol: float =
       - If exact set equality -> 1.0
       - Otherwise count drug-level matches where unit matches and dose within tolerance
       - Score = matched_count / max(len(a), len(b))
+    Signatures hold a few items, so comparing every pair is cheapest here;
+    rank_candidates counts matches for a whole candidate list through the
+    dose index instead (see dose_index.dose_matches).
     """
-    a = set(sig_a)
-    b = set(sig_b)
-    if a == b:
+    if sig_a == sig_b:
         return 1.0
     matches = 0
-    for da in a:
-        for db in b:
+    for da in sig_a:
+        for db in sig_b:
             if da[0] == db[0] and da[2] == db[2]:
                 da_amt = da[1]
                 db_amt = db[1]
-                if max(da_amt, db_amt, 1e-9) == 0:
-                    continue
                 if abs(da_amt - db_amt) <= dose_tol * max(da_amt, db_amt, 1e-9):
                     matches += 1
-    denom = max(len(a), len(b))
+    denom = max(len(sig_a), len(sig_b))
     return matches / denom if denom > 0 else 0.0
 
 
@@ -60,37 +70,86 @@ def find_candidates_by_ingredients(drug_index: Dict[int, List[Medicine]], query_
     med_ids = set()
     med_by_id: Dict[int, Medicine] = {}
     for c in query_comp:
-        for m in drug_index.get(c.drug_id, []):
+        for m in drug_index.get(c.canonical_id, []):
             if m.medicine_id not in med_ids:
                 med_ids.add(m.medicine_id)
                 med_by_id[m.medicine_id] = m
     return list(med_by_id.values())
 
 
-def rank_candidates(ref_med: Medicine, candidates: List[Medicine], weights: Dict[str, float] = None, top_k: int = 10) -> List[CandidateScore]:
+def relative_price(candidate: Medicine, ref_med: Medicine, price_basis: str = 'pack') -> float:
+    """candidate / reference price; with price_basis='unit', per pack unit when both pack sizes are comparable"""
+    if (price_basis == 'unit' and candidate.unit_price is not None and ref_med.unit_price is not None
+            and candidate.pack_unit == ref_med.pack_unit):
+        return candidate.unit_price / max(ref_med.unit_price, 1e-9)
+    return candidate.price / max(ref_med.price, 1e-9)
+
+
+def composition_scorer(ref_med: Medicine, dose_index: Optional[DoseIndex] = None,
+                       dose_tol: float = 0.05) -> Callable[[Medicine], float]:
+    """composition_similarity of ref_med against a candidate, as a function of the candidate.
+
+    With the catalog's `dose_index` the reference's dose matches for every
+    medicine are looked up once (one bisect window per reference item), so
+    each candidate costs a dict lookup instead of building its signature and
+    comparing every item pair.
+    """
+    ref_sig = composition_signature(ref_med.composition)
+    if dose_index is None or not ref_sig:
+        return lambda c: composition_similarity(ref_sig, composition_signature(c.composition), dose_tol)
+    matched = dose_matches(dose_index, ref_sig, dose_tol)
+
+    def score(c: Medicine) -> float:
+        hits = matched.get(c.medicine_id, 0)
+        if hits > len(ref_sig):
+            # near-equal doses of one drug matched twice: let the pairwise rule decide
+            return composition_similarity(ref_sig, composition_signature(c.composition), dose_tol)
+        # equal signatures match every item, so they score 1.0 here too
+        return hits / max(len(ref_sig), signature_size(c.composition))
+    return score
+
+
+def rank_candidates(ref_med: Medicine, candidates: List[Medicine], weights: Dict[str, float] = None, top_k: int = 10,
+                    deadline: Optional[Deadline] = None, price_basis: str = 'pack',
+                    dose_index: Optional[DoseIndex] = None) -> List[CandidateScore]:
+    """Score and rank candidates; stops early (ranking what was scored) once `deadline` expires.
+
+    price_basis='unit' compares price per tablet/ml/g/dose instead of pack MRP
+    (falling back to pack MRP when pack sizes are unknown or not comparable).
+    `dose_index` (built from the same catalog) speeds up composition
+    scoring, see composition_scorer.
+    """
     if weights is None:
         weights = {'comp': 0.7, 'price': 0.3}
-    ref_sig = composition_signature(ref_med.composition)
+    comp_score = composition_scorer(ref_med, dose_index)
     scored: List[CandidateScore] = []
-    for c in candidates:
-        c_sig = composition_signature(c.composition)
-        s_comp = composition_similarity(ref_sig, c_sig)
+    for i, c in enumerate(candidates):
+        if deadline is not None and i % 64 == 0 and deadline.expired():
+            break
+        s_comp = comp_score(c)
         # price_score: lower price -> higher score, bounded [0,1]
-        price_score = 1.0 - min(1.0, (c.price / max(ref_med.price, 1e-9)))
+        price_score = 1.0 - min(1.0, relative_price(c, ref_med, price_basis))
         score = weights['comp'] * s_comp + weights['price'] * price_score
         scored.append(CandidateScore(medicine=c, score=score, comp_similarity=s_comp, price_score=price_score))
     scored.sort(key=lambda x: x.score, reverse=True)
     return scored[:top_k]
 
 
-def find_substitutes(medicine_id: int, medicines: Dict[int, Medicine], drug_index: Dict[int, List[Medicine]], top_k: int = 10) -> List[CandidateScore]:
+def find_substitutes(medicine_id: int, medicines: Dict[int, Medicine], drug_index: Dict[int, List[Medicine]], top_k: int = 10,
+                     deadline: Optional[Deadline] = None, allowed: Optional[Set[int]] = None,
+                     price_basis: str = 'pack', dose_index: Optional[DoseIndex] = None) -> List[CandidateScore]:
+    """Ranked substitutes; `allowed` (e.g. from a price filter) restricts candidates before scoring.
+
+    `dose_index` must be built from `medicines` (see rank_candidates).
+    """
     if medicine_id not in medicines:
         return []
     ref = medicines[medicine_id]
     candidates = find_candidates_by_ingredients(drug_index, ref.composition)
     # exclude the reference itself
-    candidates = [c for c in candidates if c.medicine_id != ref.medicine_id]
-    ranked = rank_candidates(ref, candidates, top_k=top_k)
+    candidates = [c for c in candidates if c.medicine_id != ref.medicine_id and (allowed is None or c.medicine_id in allowed)]
+    ranked = rank_candidates(ref, candidates, top_k=top_k, deadline=deadline, price_basis=price_basis,
+                             dose_index=dose_index)
     return ranked
 
 
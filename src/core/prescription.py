@@ -0,0 +1,53 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+try:
+    from .etl import Medicine
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import Medicine
+
+
+@dataclass
+class IngredientTotal:
+    canonical_id: int
+    unit: str
+    total_amount: float
+    lines: List[str] = field(default_factory=list)
+    positions: List[int] = field(default_factory=list)
+    medicine_ids: List[int] = field(default_factory=list)
+
+
+def ingredient_totals(resolved: Dict[Tuple[int, str], Medicine]) -> List[IngredientTotal]:
+    """Build the prescription's ingredient multiset in one pass over its compositions.
+
+    - resolved: (position, prescription line) -> matched medicine; keying on the
+      position keeps a medicine listed twice as two lines
+    Items are keyed on (canonical_id, unit), the same canonical ids drug_index
+    uses, so "Diclofenac Sodium" and "Diclofenac" lines land on one key. Cost
+    is linear in the prescription's total ingredients.
+    """
+    totals: Dict[Tuple[int, str], IngredientTotal] = {}
+    for (position, line), med in resolved.items():
+        for c in med.composition:
+            key = (c.canonical_id, c.unit or '')
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = IngredientTotal(canonical_id=c.canonical_id, unit=c.unit or '', total_amount=0.0)
+            entry.total_amount += float(c.amount)
+            if not entry.positions or entry.positions[-1] != position:
+                entry.positions.append(position)
+                entry.lines.append(line)
+                entry.medicine_ids.append(med.medicine_id)
+    return list(totals.values())
+
+
+def duplicate_ingredients(totals: List[IngredientTotal]) -> List[IngredientTotal]:
+    """Ingredients (any unit) supplied by more than one prescription line."""
+    lines_by_drug: Dict[int, set] = {}
+    for t in totals:
+        lines_by_drug.setdefault(t.canonical_id, set()).update(t.positions)
+    return [t for t in totals if len(lines_by_drug[t.canonical_id]) > 1]
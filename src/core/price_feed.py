@@ -0,0 +1,27 @@
+import csv
+import math
+from typing import Iterable, List, Tuple
+
+
+def parse_price_feed(lines: Iterable[str]) -> Tuple[List[Tuple[int, float]], List[str]]:
+    """Parse a `medicine_id,mrp` CSV delta feed (header optional) into (updates, errors).
+
+    Later rows for the same medicine win. Malformed rows are reported by
+    line number and skipped rather than failing the whole feed.
+    """
+    updates = {}
+    errors = []
+    for lineno, row in enumerate(csv.reader(lines), start=1):
+        if not row or not ''.join(row).strip():
+            continue
+        if lineno == 1 and row[0].strip().lower() == 'medicine_id':
+            continue
+        try:
+            mid, mrp = int(row[0]), float(row[1])
+            if not math.isfinite(mrp) or mrp < 0:
+                raise ValueError('mrp must be a non-negative number')
+        except (ValueError, IndexError) as e:
+            errors.append(f'line {lineno}: {e}')
+            continue
+        updates[mid] = mrp
+    return list(updates.items()), errors
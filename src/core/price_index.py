@@ -0,0 +1,148 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+try:
+    from .etl import Medicine
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import Medicine
+
+
+PACK_UNITS = ('unit', 'ml', 'g', 'dose')
+
+
+@dataclass
+class PriceIndex:
+    """Medicine ids sorted by pack price, and per pack unit by quantity and by price per unit."""
+    prices: List[float]
+    price_ids: List[int]
+    pack_quantities: Dict[str, List[float]]
+    pack_ids: Dict[str, List[int]]
+    unit_prices: Dict[str, List[float]]
+    unit_price_ids: Dict[str, List[int]]
+
+
+@dataclass
+class PriceFilter:
+    """Optional bounds (inclusive) on pack price, price per unit and pack size.
+
+    Pack-size and per-unit bounds need pack_unit, since 10 tablets and
+    10 ml are not comparable.
+    """
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    pack_unit: Optional[str] = None
+    min_pack: Optional[float] = None
+    max_pack: Optional[float] = None
+    min_unit_price: Optional[float] = None
+    max_unit_price: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional['PriceFilter']:
+        """Build from a request's 'filters' object; None when no filter is given. Raises ValueError."""
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError('filters must be an object')
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f'Unknown filter(s): {", ".join(sorted(unknown))}')
+        bounds = {k: float(v) for k, v in data.items() if k != 'pack_unit' and v is not None}
+        pack_unit = data.get('pack_unit')
+        if pack_unit is not None and pack_unit not in PACK_UNITS:
+            raise ValueError(f'pack_unit must be one of: {", ".join(PACK_UNITS)}')
+        f = cls(pack_unit=pack_unit, **bounds)
+        if pack_unit is None and any(v is not None for v in (f.min_pack, f.max_pack, f.min_unit_price, f.max_unit_price)):
+            raise ValueError('pack and unit price filters require pack_unit')
+        return f
+
+    def key(self) -> tuple:
+        """Hashable form, for request coalescing keys"""
+        return tuple(getattr(self, k) for k in self.__dataclass_fields__)
+
+
+def _sorted_pairs(pairs: List[Tuple[float, int]]) -> Tuple[List[float], List[int]]:
+    pairs.sort()
+    return [v for v, _ in pairs], [m for _, m in pairs]
+
+
+def build_price_index(medicines: Dict[int, Medicine]) -> PriceIndex:
+    """Build the sorted price arrays at catalog load (and after price updates)."""
+    by_price = []
+    by_pack: Dict[str, List[Tuple[float, int]]] = {}
+    by_unit_price: Dict[str, List[Tuple[float, int]]] = {}
+    for med in medicines.values():
+        by_price.append((med.price, med.medicine_id))
+        if med.pack_quantity:
+            by_pack.setdefault(med.pack_unit, []).append((med.pack_quantity, med.medicine_id))
+            by_unit_price.setdefault(med.pack_unit, []).append((med.unit_price, med.medicine_id))
+
+    prices, price_ids = _sorted_pairs(by_price)
+    pack_quantities, pack_ids, unit_prices, unit_price_ids = {}, {}, {}, {}
+    for unit, pairs in by_pack.items():
+        pack_quantities[unit], pack_ids[unit] = _sorted_pairs(pairs)
+    for unit, pairs in by_unit_price.items():
+        unit_prices[unit], unit_price_ids[unit] = _sorted_pairs(pairs)
+    return PriceIndex(prices=prices, price_ids=price_ids, pack_quantities=pack_quantities, pack_ids=pack_ids,
+                      unit_prices=unit_prices, unit_price_ids=unit_price_ids)
+
+
+def _move(values: List[float], ids: List[int], old: float, new: float, medicine_id: int) -> None:
+    """Move (old, medicine_id) to (new, medicine_id) in parallel arrays sorted by (value, id)"""
+    i = bisect_left(values, old)
+    while ids[i] != medicine_id:
+        i += 1
+    del values[i], ids[i]
+    j = bisect_left(values, new)
+    while j < len(values) and values[j] == new and ids[j] < medicine_id:
+        j += 1
+    values.insert(j, new)
+    ids.insert(j, medicine_id)
+
+
+def update_prices(index: PriceIndex, changes: Iterable[Tuple[Medicine, float]]) -> None:
+    """Re-sort the pack and unit price entries of (medicine, old price) pairs whose medicine's price was patched.
+
+    Each change moves one entry per array, so the cost grows with the number
+    of changes; pack quantities do not depend on price and are left alone.
+    """
+    for med, old_price in changes:
+        _move(index.prices, index.price_ids, old_price, med.price, med.medicine_id)
+        if med.pack_quantity:
+            _move(index.unit_prices[med.pack_unit], index.unit_price_ids[med.pack_unit],
+                  old_price / med.pack_quantity, med.unit_price, med.medicine_id)
+
+
+def _in_range(values: List[float], ids: List[int], lo: Optional[float], hi: Optional[float]) -> List[int]:
+    i = 0 if lo is None else bisect_left(values, lo)
+    j = len(values) if hi is None else bisect_right(values, hi)
+    return ids[i:j]
+
+
+def allowed_ids(index: PriceIndex, price_filter: Optional[PriceFilter]) -> Optional[Set[int]]:
+    """Medicine ids passing every bound in price_filter (None when there is nothing to filter on)."""
+    if price_filter is None:
+        return None
+    f = price_filter
+    ranges = []
+    if f.min_price is not None or f.max_price is not None:
+        ranges.append(_in_range(index.prices, index.price_ids, f.min_price, f.max_price))
+    if f.pack_unit is not None:
+        ranges.append(_in_range(index.pack_quantities.get(f.pack_unit, []), index.pack_ids.get(f.pack_unit, []),
+                                f.min_pack, f.max_pack))
+    if f.min_unit_price is not None or f.max_unit_price is not None:
+        ranges.append(_in_range(index.unit_prices.get(f.pack_unit, []), index.unit_price_ids.get(f.pack_unit, []),
+                                f.min_unit_price, f.max_unit_price))
+    if not ranges:
+        return None
+    ranges.sort(key=len)
+    result = set(ranges[0])
+    for ids in ranges[1:]:
+        result.intersection_update(ids)
+        if not result:
+            break
+    return result
@@ -0,0 +1,186 @@
+"""
+Opt-in request profiling for the API.
+
+When enabled (RXLENS_PROFILE=1) the WSGI app is wrapped in a
+ProfilingMiddleware that runs cProfile around selected requests: those sent
+with an authorised `X-Profile: 1` header, plus a random sample
+(RXLENS_PROFILE_SAMPLE, 0..1). The profile covers the whole handler, body
+serialization and streamed chunks included. Profiles go to a bounded
+on-disk ring (ProfileStore). When disabled nothing is installed, so
+requests take exactly the unprofiled path.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+PROFILING_ENABLED = os.getenv('RXLENS_PROFILE', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.getenv('RXLENS_PROFILE_SAMPLE', '0') or 0)
+PROFILE_DIR = os.getenv('RXLENS_PROFILE_DIR', os.path.join('.cache', 'profiles'))
+PROFILE_KEEP = int(os.getenv('RXLENS_PROFILE_KEEP', '50'))
+
+_PROFILE_ID_RE = re.compile(r'^\d+-\d+$')
+
+
+class ProfileStore:
+    """Ring of the last `keep` profiles in `directory`: <id>.prof (pstats dump) plus <id>.json metadata."""
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            self._seq += 1
+            return '%d-%d' % (time.time() * 1000, self._seq)
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, meta: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, profile_id + '.prof'))
+        with open(os.path.join(self.directory, profile_id + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, id=profile_id), f)
+        with self._lock:
+            for old in self._ids()[self.keep:]:
+                for ext in ('.prof', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, old + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def _ids(self) -> List[str]:
+        """Stored profile ids, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        ids = [name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')]
+        return sorted(ids, key=lambda i: tuple(int(p) for p in i.split('-')), reverse=True)
+
+    def list(self) -> List[dict]:
+        entries = []
+        for profile_id in self._ids():
+            try:
+                with open(os.path.join(self.directory, profile_id + '.json'), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def path(self, profile_id: str) -> Optional[str]:
+        """The .prof file for profile_id, or None (ids are validated, never joined as given)"""
+        if not _PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        path = os.path.join(self.directory, profile_id + '.prof')
+        return path if os.path.exists(path) else None
+
+    def summary(self, profile_id: str, sort: str = 'cumulative', limit: int = 40) -> Optional[str]:
+        """pstats text report of a stored profile"""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class _ProfiledBody:
+    """Response iterable that keeps profiling while the body is produced, and saves on close()"""
+
+    def __init__(self, body, profiler: cProfile.Profile, finish: Callable[[], None]):
+        self._body = body
+        self._it = iter(body)
+        self._profiler = profiler
+        self._finish = finish
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._profiler.enable()
+        try:
+            return next(self._it)
+        finally:
+            self._profiler.disable()
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._finish()
+
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling requests chosen by header or sampling; one profile at a time.
+
+    `allow_header(environ)` decides whether a request may ask for a profile
+    with `X-Profile: 1` (e.g. an admin token check). Paths under
+    `skip_prefix` are never profiled. Profiled responses carry an
+    X-Profile-Id header naming the stored profile.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = 0.0,
+                 allow_header: Callable[[dict], bool] = lambda environ: True, skip_prefix: str = '/api/admin/'):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.skip_prefix = skip_prefix
+        # cProfile hooks are per thread, but keep profiles from piling up under load
+        self._busy = threading.Lock()
+
+    def _trigger(self, environ) -> Optional[str]:
+        """'header', 'sample' or None (not profiled)"""
+        if environ.get('PATH_INFO', '').startswith(self.skip_prefix):
+            return None
+        if environ.get('HTTP_X_PROFILE') == '1' and self.allow_header(environ):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            return self.app(environ, start_response)
+
+        profile_id = self.store.new_id()
+        started = time.perf_counter()
+        status = []
+
+        def profiled_start_response(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return start_response(status_line, list(headers) + [('X-Profile-Id', profile_id)], exc_info)
+
+        def finish():
+            try:
+                self.store.save(profile_id, profiler, {
+                    'method': environ.get('REQUEST_METHOD', ''),
+                    'path': environ.get('PATH_INFO', ''),
+                    'query': environ.get('QUERY_STRING', ''),
+                    'status': status[0] if status else None,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'timestamp': time.time(),
+                    'trigger': trigger
+                })
+            finally:
+                self._busy.release()
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            body = self.app(environ, profiled_start_response)
+        except BaseException:
+            profiler.disable()
+            self._busy.release()
+            raise
+        profiler.disable()
+        return _ProfiledBody(body, profiler, finish)
@@ -0,0 +1,71 @@
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+try:
+    from .dosage import extract_dosage_endpoints, normalize_dosage_text, normalize_drug_name
+    from .etl import _parse_fraction, _normalize_unit
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from dosage import extract_dosage_endpoints, normalize_dosage_text, normalize_drug_name
+    from etl import _parse_fraction, _normalize_unit
+
+
+# A number with no unit after it ('Paracetamol 650'): prescriptions mean mg
+BARE_AMOUNT_RE = re.compile(r'(?<![\w./])(\d+(?:\.\d+)?)(?![\w.%/]|\s*(?:mg|mcg|gm|g|kg|ml|l|iu|billion|%)(?![a-z]))',
+                            re.IGNORECASE)
+# Ingredients listed without their own dose ('Amoxicillin + Clavulanic Acid')
+INGREDIENT_SEPARATOR_RE = re.compile(r'\s*[+,&]\s*')
+
+# the cleaner's grammar accepts 'gm', the catalog only stores 'g'
+_UNIT_ALIASES = {'gm': 'g'}
+
+
+@dataclass
+class QueryTerm:
+    """One ingredient named in a query, with its dose normalized like catalog compositions (None if not given)."""
+    name: str
+    amount: Optional[float] = None
+    unit: str = ''
+
+
+def _dose(amount: str, unit: str):
+    try:
+        return _normalize_unit(_parse_fraction(amount), _UNIT_ALIASES.get(unit, unit))
+    except (ValueError, ZeroDivisionError):
+        return None, ''
+
+
+def _names(text: str) -> List[str]:
+    return [n for n in (normalize_drug_name(part) for part in INGREDIENT_SEPARATOR_RE.split(text)) if n]
+
+
+def parse_query(text: str) -> List[QueryTerm]:
+    """Ingredient and dose terms of a free-text medicine query.
+
+    'Metformin 500 mg SR' -> [QueryTerm('Metformin', 500.0, 'mg')]; words after
+    the last dose ('SR') are modifiers, not ingredients. Without any dose the
+    whole text is read as ingredient names separated by '+', ',' or '&'.
+    """
+    t = BARE_AMOUNT_RE.sub(r'\1 mg', normalize_dosage_text(text or ''))
+
+    endpoints = extract_dosage_endpoints(t)
+    if not endpoints:
+        return [QueryTerm(name) for name in _names(t)]
+
+    terms = []
+    prev = 0
+    for end, amount, unit in endpoints:
+        names = _names(t[prev:end])
+        prev = end
+        if not names:
+            continue
+        amount, unit = _dose(amount, unit)
+        terms.extend(QueryTerm(name) for name in names[:-1])
+        # a shared dose ('Paracetamol + Caffeine 500 mg') belongs to the nearest name
+        terms.append(QueryTerm(names[-1], amount, unit if amount is not None else ''))
+    return terms
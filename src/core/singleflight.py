@@ -0,0 +1,66 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent identical computations into one in-flight call.
+
+    The first caller for a key runs `fn`; callers arriving while it runs wait
+    and receive the same result (or exception). Nothing is cached once the
+    call finishes, so results are never stale. Keys are tuples whose first
+    element names the endpoint, which is how counts are grouped in `stats()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        group = key[0] if isinstance(key, tuple) and key else str(key)
+        with self._lock:
+            counts = self._stats.setdefault(group, {'executed': 0, 'coalesced': 0})
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                counts['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                counts['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint executed/coalesced counts plus the number of calls in flight."""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'endpoints': {group: dict(counts) for group, counts in self._stats.items()},
+            }
@@ -0,0 +1,442 @@
+import csv
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+try:
+    from .etl import CompositionItem, DrugDictionary, Medicine, normalize_name, parse_unit_size, _parse_fraction, _normalize_unit
+    from .suggest import Suggestion
+    from .price_index import PriceFilter
+    from .facets import FACET_FIELDS, Facets, facet_key
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import CompositionItem, DrugDictionary, Medicine, normalize_name, parse_unit_size, _parse_fraction, _normalize_unit
+    from suggest import Suggestion
+    from price_index import PriceFilter
+    from facets import FACET_FIELDS, Facets, facet_key
+
+
+# bump when SCHEMA changes; older files are rebuilt (see sqlite_store_is_stale)
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE medicines (
+    medicine_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    unit_size TEXT,
+    group_name TEXT,
+    category TEXT,
+    popularity INTEGER NOT NULL DEFAULT 0,
+    pack_quantity REAL,
+    pack_unit TEXT NOT NULL DEFAULT '',
+    category_key TEXT NOT NULL DEFAULT '',
+    group_name_key TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE composition (
+    medicine_id INTEGER NOT NULL,
+    drug_id INTEGER NOT NULL,
+    canonical_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    unit TEXT NOT NULL
+);
+CREATE TABLE ingredients (
+    canonical_id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    medicine_count INTEGER NOT NULL
+);
+CREATE INDEX idx_composition_drug ON composition (canonical_id, medicine_id);
+CREATE INDEX idx_composition_medicine ON composition (medicine_id);
+CREATE INDEX idx_composition_dose ON composition (canonical_id, unit, amount, medicine_id);
+CREATE INDEX idx_medicines_price ON medicines (price);
+CREATE INDEX idx_medicines_pack ON medicines (pack_unit, pack_quantity);
+CREATE INDEX idx_medicines_unit_price ON medicines (pack_unit, price / pack_quantity);
+CREATE INDEX idx_medicines_category ON medicines (category_key);
+CREATE INDEX idx_medicines_group_name ON medicines (group_name_key);
+CREATE VIRTUAL TABLE medicine_fts USING fts5 (name, content='medicines', content_rowid='medicine_id');
+CREATE VIRTUAL TABLE ingredient_fts USING fts5 (name, canonical_id UNINDEXED);
+"""
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_MAX_PARAMS = 900
+
+
+def _chunks(items: List, size: int = _MAX_PARAMS) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _fts_tokens(text: str) -> List[str]:
+    return normalize_name(text).split()
+
+
+def build_sqlite_store(db_path: str, medicines_csv: str, composition_csv: str, drugs: DrugDictionary):
+    """Build the SQLite catalog from the refined CSVs, streaming rows (nothing is held per medicine).
+
+    Amounts are stored normalized (g/mcg -> mg) and composition rows carry
+    canonical ids, exactly as load_data produces them. The database is built
+    next to db_path and moved into place, so readers never see a partial file.
+    """
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            with open(medicines_csv, newline='', encoding='utf-8') as f:
+                conn.executemany(
+                    "INSERT INTO medicines (medicine_id, name, price, unit_size, group_name, category, pack_quantity, pack_unit, "
+                    "category_key, group_name_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (int(r['medicine_id']), r['medicine_name'] or '', float(r['mrp']) if r['mrp'] else 0.0,
+                         r['unit_size'] or '', r['group_name'] or '', r['category'] or '', *parse_unit_size(r['unit_size']),
+                         facet_key(r['category']), facet_key(r['group_name']))
+                        for r in csv.DictReader(f)
+                    )
+                )
+
+            def composition_rows():
+                with open(composition_csv, newline='', encoding='utf-8') as f:
+                    for r in csv.DictReader(f):
+                        try:
+                            amount, unit = _normalize_unit(_parse_fraction(r['amount']), r['unit'])
+                            did = int(r['drug_id'])
+                        except Exception:
+                            # skip malformed composition rows
+                            continue
+                        yield int(r['medicine_id']), did, drugs.canonical_id(did), amount, unit
+
+            conn.executemany(
+                "INSERT INTO composition (medicine_id, drug_id, canonical_id, amount, unit) VALUES (?, ?, ?, ?, ?)",
+                composition_rows()
+            )
+            # drop composition rows of unknown medicines, as load_data never attaches them
+            conn.execute("DELETE FROM composition WHERE medicine_id NOT IN (SELECT medicine_id FROM medicines)")
+
+            # popularity as in build_suggest_index: medicines per ingredient, medicine = its most common ingredient
+            counts = dict(conn.execute(
+                "SELECT canonical_id, COUNT(DISTINCT medicine_id) FROM composition GROUP BY canonical_id"
+            ))
+            variants: Dict[int, List[str]] = {}
+            for did, dname in enumerate(drugs.names):
+                if normalize_name(dname):
+                    variants.setdefault(drugs.canonical_id(did), []).append(dname)
+            conn.executemany(
+                "INSERT INTO ingredients (canonical_id, label, medicine_count) VALUES (?, ?, ?)",
+                ((cid, drugs.name(cid) or names[0], counts[cid]) for cid, names in variants.items() if counts.get(cid))
+            )
+            conn.executemany(
+                "INSERT INTO ingredient_fts (name, canonical_id) VALUES (?, ?)",
+                ((name, cid) for cid, names in variants.items() if counts.get(cid) for name in names)
+            )
+            conn.execute("""
+                UPDATE medicines SET popularity = COALESCE((
+                    SELECT MAX(i.medicine_count) FROM composition c JOIN ingredients i ON i.canonical_id = c.canonical_id
+                    WHERE c.medicine_id = medicines.medicine_id
+                ), 0)
+            """)
+            conn.execute("INSERT INTO medicine_fts (medicine_fts) VALUES ('rebuild')")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+
+def sqlite_store_is_stale(db_path: str, *sources: str) -> bool:
+    """True if db_path is missing, has an older schema, or is older than any existing source file."""
+    if not os.path.exists(db_path):
+        return True
+    conn = sqlite3.connect('file:%s?mode=ro' % db_path, uri=True)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            return True
+    finally:
+        conn.close()
+    built = os.path.getmtime(db_path)
+    return any(os.path.exists(s) and os.path.getmtime(s) > built for s in sources)
+
+
+class MedicineTable(Mapping):
+    """Read-only dict-like view of the medicines table (medicine_id -> Medicine)."""
+
+    def __init__(self, store: 'SqliteStore'):
+        self._store = store
+
+    def __getitem__(self, medicine_id) -> Medicine:
+        meds = self._store.get_many([medicine_id])
+        if not meds:
+            raise KeyError(medicine_id)
+        return meds[0]
+
+    def __contains__(self, medicine_id) -> bool:
+        if not isinstance(medicine_id, int):
+            return False
+        return self._store.execute("SELECT 1 FROM medicines WHERE medicine_id = ?", (medicine_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._store.execute("SELECT COUNT(*) FROM medicines").fetchone()[0]
+
+    def __iter__(self) -> Iterator[int]:
+        for page in self._store.iter_pages():
+            for med in page:
+                yield med.medicine_id
+
+    def values(self) -> Iterator[Medicine]:
+        """Medicines in id order, loaded one page at a time"""
+        for page in self._store.iter_pages():
+            yield from page
+
+
+class DrugIndexView(Mapping):
+    """Read-only view with the shape of load_data's drug index (canonical id -> medicines)."""
+
+    def __init__(self, store: 'SqliteStore'):
+        self._store = store
+
+    def __getitem__(self, canonical_id) -> List[Medicine]:
+        meds = self._store.medicines_with_ingredients([canonical_id])
+        if not meds:
+            raise KeyError(canonical_id)
+        return meds
+
+    def __contains__(self, canonical_id) -> bool:
+        return self._store.execute(
+            "SELECT 1 FROM composition WHERE canonical_id = ? LIMIT 1", (canonical_id,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._store.execute("SELECT COUNT(DISTINCT canonical_id) FROM composition").fetchone()[0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (cid,) in self._store.execute("SELECT DISTINCT canonical_id FROM composition ORDER BY canonical_id").fetchall():
+            yield cid
+
+
+class SqliteStore:
+    """Catalog served from a SQLite file through indexed queries instead of in-memory dicts.
+
+    `medicines` and `drug_index` are drop-in, read-only stand-ins for the
+    dicts load_data returns, so matching/basket code runs unchanged; name
+    search and suggestions go through FTS5, dose ranges through a B-tree
+    range scan. One read-only connection per thread.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.medicines = MedicineTable(self)
+        self.drug_index = DrugIndexView(self)
+        self._facet_labels: Optional[Dict[str, Dict[str, str]]] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect('file:%s?mode=ro' % self.db_path, uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params: Tuple = ()) -> sqlite3.Cursor:
+        return self._conn().execute(sql, params)
+
+    # ----- medicines -----
+
+    def get_many(self, medicine_ids: Iterable[int]) -> List[Medicine]:
+        """Medicines with their composition for the given ids, in the given order (unknown ids skipped)"""
+        ids = list(dict.fromkeys(medicine_ids))
+        rows: Dict[int, tuple] = {}
+        comps: Dict[int, List[CompositionItem]] = {}
+        for chunk in _chunks(ids):
+            marks = ','.join('?' * len(chunk))
+            for row in self.execute(
+                f"SELECT medicine_id, name, price, unit_size, group_name, category, pack_quantity, pack_unit "
+                f"FROM medicines WHERE medicine_id IN ({marks})",
+                tuple(chunk)
+            ):
+                rows[row[0]] = row
+            for mid, did, cid, amount, unit in self.execute(
+                f"SELECT medicine_id, drug_id, canonical_id, amount, unit FROM composition WHERE medicine_id IN ({marks}) ORDER BY rowid",
+                tuple(chunk)
+            ):
+                comps.setdefault(mid, []).append(CompositionItem(did, amount, unit, cid))
+        return [
+            Medicine(medicine_id=mid, name=rows[mid][1], price=rows[mid][2], unit_size=rows[mid][3],
+                     group_name=rows[mid][4], category=rows[mid][5], composition=comps.get(mid, []),
+                     pack_quantity=rows[mid][6], pack_unit=rows[mid][7])
+            for mid in ids if mid in rows
+        ]
+
+    def page_ids(self, offset: int, limit: int) -> List[int]:
+        return [mid for (mid,) in self.execute(
+            "SELECT medicine_id FROM medicines ORDER BY medicine_id LIMIT ? OFFSET ?", (max(0, limit), max(0, offset))
+        )]
+
+    def page(self, offset: int, limit: int) -> List[Medicine]:
+        return self.get_many(self.page_ids(offset, limit))
+
+    def iter_pages(self, page_size: int = 500) -> Iterator[List[Medicine]]:
+        """All medicines in id order (keyset pagination, one page in memory at a time)"""
+        last = None
+        while True:
+            if last is None:
+                cur = self.execute("SELECT medicine_id FROM medicines ORDER BY medicine_id LIMIT ?", (page_size,))
+            else:
+                cur = self.execute(
+                    "SELECT medicine_id FROM medicines WHERE medicine_id > ? ORDER BY medicine_id LIMIT ?", (last, page_size)
+                )
+            ids = [mid for (mid,) in cur]
+            if not ids:
+                return
+            yield self.get_many(ids)
+            last = ids[-1]
+
+    def ids_with_ingredients(self, canonical_ids: Iterable[int]) -> Set[int]:
+        """Ids of medicines containing any of the canonical ids (idx_composition_drug)"""
+        cids = list(dict.fromkeys(canonical_ids))
+        ids = set()
+        for chunk in _chunks(cids):
+            marks = ','.join('?' * len(chunk))
+            ids.update(mid for (mid,) in self.execute(
+                f"SELECT DISTINCT medicine_id FROM composition WHERE canonical_id IN ({marks})", tuple(chunk)
+            ))
+        return ids
+
+    def medicines_with_ingredients(self, canonical_ids: Iterable[int]) -> List[Medicine]:
+        """Medicines containing any of the canonical ids, in id order"""
+        return self.get_many(sorted(self.ids_with_ingredients(canonical_ids)))
+
+    def update_prices(self, updates: List[Tuple[int, float]]):
+        """Write (medicine_id, price) changes in one transaction on a short-lived writable connection"""
+        if not updates:
+            return
+        conn = sqlite3.connect('file:%s?mode=rw' % self.db_path, uri=True)
+        try:
+            with conn:
+                conn.executemany("UPDATE medicines SET price = ? WHERE medicine_id = ?", [(p, mid) for mid, p in updates])
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _filter_clauses(price_filter: Optional[PriceFilter], facets: Optional[Facets]) -> Tuple[List[str], List]:
+        """WHERE clauses (on the price / pack / facet indexes) and their parameters"""
+        clauses, params = [], []
+        if price_filter is not None:
+            f = price_filter
+            for column, lo, hi in (('price', f.min_price, f.max_price),
+                                   ('pack_quantity', f.min_pack, f.max_pack),
+                                   ('price / pack_quantity', f.min_unit_price, f.max_unit_price)):
+                if lo is not None:
+                    clauses.append(f"{column} >= ?")
+                    params.append(lo)
+                if hi is not None:
+                    clauses.append(f"{column} <= ?")
+                    params.append(hi)
+            if f.pack_unit is not None:
+                clauses.append("pack_unit = ? AND pack_quantity > 0")
+                params.append(f.pack_unit)
+        for field in FACET_FIELDS:
+            keys = (facets or {}).get(field)
+            if keys:
+                clauses.append(f"{field}_key IN ({','.join('?' * len(keys))})")
+                params.extend(keys)
+        return clauses, params
+
+    def allowed_ids(self, price_filter: Optional[PriceFilter], facets: Optional[Facets] = None) -> Optional[set]:
+        """engine allowed_ids as indexed lookups on the price / pack / facet columns"""
+        clauses, params = self._filter_clauses(price_filter, facets)
+        if not clauses:
+            return None
+        return {mid for (mid,) in self.execute(
+            "SELECT medicine_id FROM medicines WHERE " + ' AND '.join(clauses), tuple(params)
+        )}
+
+    def facet_counts(self, price_filter: Optional[PriceFilter] = None, facets: Optional[Facets] = None) -> Dict[str, List[dict]]:
+        """facets.facet_counts with GROUP BY over the filtered medicines"""
+        if self._facet_labels is None:
+            labels: Dict[str, Dict[str, str]] = {f: {} for f in FACET_FIELDS}
+            for field in FACET_FIELDS:
+                for key, value in self.execute(f"SELECT DISTINCT {field}_key, {field} FROM medicines WHERE {field}_key != ''"):
+                    label = ' '.join(value.split())
+                    labels[field][key] = min(labels[field].get(key, label), label)
+            self._facet_labels = labels
+        clauses, params = self._filter_clauses(price_filter, facets)
+        where = (" AND " + ' AND '.join(clauses)) if clauses else ''
+        counts = {}
+        for field in FACET_FIELDS:
+            labels = self._facet_labels[field]
+            values = [{'value': labels[key], 'count': n} for key, n in self.execute(
+                f"SELECT {field}_key, COUNT(*) FROM medicines WHERE {field}_key != ''{where} GROUP BY {field}_key",
+                tuple(params)
+            )]
+            values.sort(key=lambda v: (-v['count'], v['value']))
+            counts[field] = values
+        return counts
+
+    # ----- search -----
+
+    def name_candidates(self, query: str, limit: int = 200, allowed: Optional[set] = None) -> List[Medicine]:
+        """The `limit` best FTS-ranked medicines sharing a word prefix with query, in id order
+
+        Id order keeps fuzzy-score ties resolving as in a full catalog scan.
+        With `allowed`, only those ids are candidates.
+        """
+        tokens = _fts_tokens(query)
+        if not tokens:
+            return []
+        match = ' OR '.join('"%s" *' % t for t in tokens)
+        if allowed is None:
+            ids = [mid for (mid,) in self.execute(
+                "SELECT rowid FROM medicine_fts WHERE medicine_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)
+            )]
+        else:
+            ids = []
+            for (mid,) in self.execute("SELECT rowid FROM medicine_fts WHERE medicine_fts MATCH ? ORDER BY rank", (match,)):
+                if mid in allowed:
+                    ids.append(mid)
+                    if len(ids) >= limit:
+                        break
+        return self.get_many(sorted(ids))
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """Completions ranked like suggest.suggest: popularity, drugs before medicines, price, label"""
+        tokens = _fts_tokens(prefix)
+        if not tokens or limit <= 0:
+            return []
+        # a phrase prefix: consecutive words, the last one possibly incomplete
+        match = '"%s" *' % ' '.join(tokens)
+        ranked = []
+        for cid, label, count in self.execute(
+            "SELECT DISTINCT i.canonical_id, i.label, i.medicine_count FROM ingredient_fts f "
+            "JOIN ingredients i ON i.canonical_id = f.canonical_id WHERE ingredient_fts MATCH ? "
+            "ORDER BY i.medicine_count DESC, i.label LIMIT ?", (match, limit)
+        ):
+            ranked.append((-count, 0, 0.0, label, Suggestion('drug', cid, label, float(count))))
+        for mid, name, price, popularity in self.execute(
+            "SELECT m.medicine_id, m.name, m.price, m.popularity FROM medicine_fts f "
+            "JOIN medicines m ON m.medicine_id = f.rowid WHERE medicine_fts MATCH ? "
+            "ORDER BY m.popularity DESC, m.price, m.name LIMIT ?", (match, limit)
+        ):
+            ranked.append((-popularity, 1, price, name, Suggestion('medicine', mid, name, float(popularity))))
+        ranked.sort(key=lambda r: r[:4])
+        return [r[4] for r in ranked[:limit]]
+
+    def medicines_matching_all(self, terms: Iterable[Tuple[Iterable[int], str, float, float]]) -> List[int]:
+        """dose_index.medicines_matching_all as range scans on idx_composition_dose"""
+        result = None
+        for drug_ids, unit, lo, hi in terms:
+            ids = set()
+            for did in drug_ids:
+                ids.update(mid for (mid,) in self.execute(
+                    "SELECT medicine_id FROM composition WHERE canonical_id = ? AND unit = ? AND amount BETWEEN ? AND ?",
+                    (did, unit or '', lo, hi)
+                ))
+            result = ids if result is None else result & ids
+            if not result:
+                return []
+        return sorted(result) if result else []
@@ -0,0 +1,230 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+try:
+    from .etl import DrugDictionary, Medicine, normalize_name
+except Exception:
+    # allow running as a script (no package) by adding the current package dir to sys.path
+    import sys, os
+    pkg_dir = os.path.abspath(os.path.dirname(__file__))
+    if pkg_dir not in sys.path:
+        sys.path.insert(0, pkg_dir)
+    from etl import DrugDictionary, Medicine, normalize_name
+
+
+@dataclass
+class Suggestion:
+    kind: str  # 'medicine' or 'drug'
+    id: int
+    label: str
+    weight: float
+
+
+@dataclass
+class SuggestIndex:
+    """Prefix index over normalized medicine and drug names.
+
+    Every word-suffix of a normalized label ('paracetamol 325mg tablets',
+    '325mg tablets', 'tablets') is a key in a sorted array, so a prefix of
+    any word (or run of words) is a bisect range. `postings` holds each
+    key's entry and `order` each entry's sort key (best first). Short
+    prefixes match huge ranges; their top-N entries are precomputed in
+    `top`. Longer ones take the N best of their range from `tree`, a
+    segment tree holding the best entry of every aligned block of keys, so
+    lookups cost the same regardless of catalog size or range width.
+    `medicine_entries` maps medicine ids to their entry, for price updates.
+    """
+    entries: List[Suggestion]
+    order: List[tuple]
+    keys: List[str]
+    postings: List[int]
+    tree: List[int]
+    top: Dict[str, List[int]]
+    limit: int
+    max_precomputed: int
+    medicine_entries: Dict[int, int]
+
+
+def build_suggest_index(medicines: Dict[int, Medicine], drug_index: Dict[int, List[Medicine]], drugs: DrugDictionary,
+                        limit: int = 10, max_precomputed: int = 6) -> SuggestIndex:
+    """Build the prefix index at catalog load.
+
+    Weights are catalog popularity: a drug weighs the number of medicines
+    containing it, a medicine the popularity of its most common ingredient.
+    Ties go to drugs before medicines, then the cheaper medicine, then
+    alphabetically.
+    """
+    ranked = []
+    for med in medicines.values():
+        if not med.name or not isinstance(med.name, str):
+            continue
+        popularity = max((len(drug_index.get(c.canonical_id, [])) for c in med.composition), default=0)
+        ranked.append((-popularity, 1, med.price, med.name, Suggestion('medicine', med.medicine_id, med.name, float(popularity)), [med.name]))
+
+    # one entry per canonical ingredient, reachable through every variant spelling
+    variants: Dict[int, List[str]] = {}
+    for did, dname in enumerate(drugs.names):
+        if normalize_name(dname):
+            variants.setdefault(drugs.canonical_id(did), []).append(dname)
+    for cid, names in variants.items():
+        count = len(drug_index.get(cid, []))
+        if count == 0:
+            continue
+        label = drugs.name(cid) or names[0]
+        ranked.append((-count, 0, 0.0, label, Suggestion('drug', cid, label, float(count)), names))
+
+    # the build position breaks remaining ties, as the stable sort does
+    ranked = [r[:4] + (seq,) + r[4:] for seq, r in enumerate(ranked)]
+    ranked.sort(key=lambda r: r[:5])
+    entries = [r[5] for r in ranked]
+    order = [r[:5] for r in ranked]
+
+    pairs = set()
+    for rank, r in enumerate(ranked):
+        for label in r[6]:
+            for key in _label_keys(label):
+                pairs.add((key, rank))
+    pairs = sorted(pairs)
+
+    # walk in rank order so each prefix list fills with its best ranks first
+    top: Dict[str, List[int]] = {}
+    for key, rank in sorted(pairs, key=lambda p: p[1]):
+        for n in range(1, min(len(key), max_precomputed) + 1):
+            best = top.setdefault(key[:n], [])
+            if len(best) < limit and (not best or best[-1] != rank):
+                best.append(rank)
+
+    postings = [r for _, r in pairs]
+    return SuggestIndex(
+        entries=entries,
+        order=order,
+        keys=[k for k, _ in pairs],
+        postings=postings,
+        tree=_build_tree(postings, order),
+        top=top,
+        limit=limit,
+        max_precomputed=max_precomputed,
+        medicine_entries={e.id: rank for rank, e in enumerate(entries) if e.kind == 'medicine'},
+    )
+
+
+def _label_keys(label: str) -> List[str]:
+    """Word-suffixes of a normalized label, the keys it is found under"""
+    words = normalize_name(label).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def update_medicine_prices(index: SuggestIndex, medicines: Iterable[Medicine]) -> None:
+    """Re-rank medicines whose price changed, touching only their own keys.
+
+    Price only breaks ties, so each changed medicine gets a new sort key and
+    its leaves' paths in the tree are recomputed. The precomputed lists of
+    the short prefixes it is found under are re-sorted in place, and only
+    re-read from the tree when the medicine drops out of one. Cost grows
+    with the number of changed medicines, not with the catalog.
+    """
+    tree, order = index.tree, index.order
+    size = len(tree) // 2
+    for med in medicines:
+        entry = index.medicine_entries.get(med.medicine_id)
+        if entry is None or order[entry][2] == med.price:
+            continue
+        old = order[entry]
+        order[entry] = old[:2] + (med.price,) + old[3:]
+        prefixes = set()
+        for key in _label_keys(index.entries[entry].label):
+            lo = bisect_left(index.keys, key)
+            leaf = bisect_left(index.postings, entry, lo, bisect_right(index.keys, key, lo))
+            node = (leaf + size) // 2
+            while node:
+                tree[node] = _better(tree[2 * node], tree[2 * node + 1], order)
+                node //= 2
+            prefixes.update(key[:n] for n in range(1, min(len(key), index.max_precomputed) + 1))
+        for prefix in prefixes:
+            _rerank_top(index, prefix, entry, moved_up=order[entry] < old)
+
+
+def _rerank_top(index: SuggestIndex, prefix: str, entry: int, moved_up: bool) -> None:
+    """Fix the precomputed list of `prefix` (which `entry` matches) after entry's sort key changed"""
+    best = index.top.get(prefix, [])
+    key = index.order.__getitem__
+    if entry not in best:
+        # a list shorter than the limit holds every match, so this one is full: entry may displace its last
+        if key(entry) < key(best[-1]):
+            index.top[prefix] = sorted(best + [entry], key=key)[:index.limit]
+    elif moved_up:
+        index.top[prefix] = sorted(best, key=key)
+    else:
+        # it may now fall behind a match outside the list: re-read the tree
+        lo = bisect_left(index.keys, prefix)
+        hi = bisect_left(index.keys, prefix + '\uffff', lo)
+        index.top[prefix] = _best_in_range(index, lo, hi, index.limit)
+
+
+def _build_tree(postings: List[int], order: List[tuple]) -> List[int]:
+    """Segment tree over postings: node i holds the best entry of its block, leaves start at len(tree) // 2"""
+    size = 1
+    while size < len(postings):
+        size *= 2
+    tree = [-1] * size + postings + [-1] * (size - len(postings))
+    for i in range(size - 1, 0, -1):
+        tree[i] = _better(tree[2 * i], tree[2 * i + 1], order)
+    return tree
+
+
+def _better(a: int, b: int, order: List[tuple]) -> int:
+    if a < 0:
+        return b
+    if b < 0 or order[a] < order[b]:
+        return a
+    return b
+
+
+def _best_in_range(index: SuggestIndex, lo: int, hi: int, n: int) -> List[int]:
+    """The n best distinct entries among postings[lo:hi], best first.
+
+    A heap over tree nodes: the range splits into O(log K) aligned blocks;
+    popping a block walks down to the leaf holding its best entry and pushes
+    the sibling blocks passed on the way, so only the paths to the n winners
+    (and their repeats) are visited.
+    """
+    tree, order = index.tree, index.order
+    size = len(tree) // 2
+    heap = []
+    l, r = lo + size, hi + size
+    while l < r:
+        if l & 1:
+            heap.append((order[tree[l]], l))
+            l += 1
+        if r & 1:
+            r -= 1
+            heap.append((order[tree[r]], r))
+        l //= 2
+        r //= 2
+    heapq.heapify(heap)
+    best: List[int] = []
+    while heap and len(best) < n:
+        _, node = heapq.heappop(heap)
+        while node < size:
+            node, sibling = (2 * node, 2 * node + 1) if tree[2 * node] == tree[node] else (2 * node + 1, 2 * node)
+            if tree[sibling] >= 0:
+                heapq.heappush(heap, (order[tree[sibling]], sibling))
+        if tree[node] not in best:
+            best.append(tree[node])
+    return best
+
+
+def suggest(index: SuggestIndex, prefix: str, limit: Optional[int] = None) -> List[Suggestion]:
+    """Return up to `limit` completions for `prefix`, best weight first."""
+    key = normalize_name(prefix)
+    if not key:
+        return []
+    n = index.limit if limit is None else max(0, min(limit, index.limit))
+    if len(key) <= index.max_precomputed:
+        ranks = index.top.get(key, [])[:n]
+    else:
+        lo = bisect_left(index.keys, key)
+        hi = bisect_left(index.keys, key + '\uffff', lo)
+        ranks = _best_in_range(index, lo, hi, n) if n else []
+    return [index.entries[r] for r in ranks]
@@ -1,57 +1,395 @@
+import hashlib
+import json
 import os
-import google.generativeai as genai
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
+try:
+    import google.generativeai as genai  # optional: only the Gemini backend needs it
+except ImportError:
+    genai = None
+
 load_dotenv()
 
 # Initialize Gemini
 api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
+if api_key and genai is not None:
     genai.configure(api_key=api_key)
 
-class RxLensChatbot:
-    def __init__(self):
-        # Configure the model
-        # Using Gemini 1.5 Flash for fast, conversational responses
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=(
-                "You are an expert pharmacist assistant integrated into the 'RxLens' application. "
-                "RxLens helps users analyze their medical prescriptions, understand active ingredients, "
-                "and find cheaper generic alternatives. "
-                "\n\nYour job is to act as an 'Explanation Engine'. "
-                "When a user asks about a specific medicine, active ingredient, or medical condition, "
-                "you should explain it in simple, easy-to-understand language. "
-                "\n\nGuidelines:"
-                "\n1. Be concise but informative."
-                "\n2. Avoid using overly complex medical jargon where possible."
-                "\n3. Clearly state that you are an AI assistant and your advice DOES NOT REPLACE professional medical consultation."
-                "\n4. If a user asks a question unrelated to medicines, health, or prescriptions, politely redirect them back to the topic."
+SYSTEM_INSTRUCTION = (
+    "You are an expert pharmacist assistant integrated into the 'RxLens' application. "
+    "RxLens helps users analyze their medical prescriptions, understand active ingredients, "
+    "and find cheaper generic alternatives. "
+    "\n\nYour job is to act as an 'Explanation Engine'. "
+    "When a user asks about a specific medicine, active ingredient, or medical condition, "
+    "you should explain it in simple, easy-to-understand language. "
+    "\n\nGuidelines:"
+    "\n1. Be concise but informative."
+    "\n2. Avoid using overly complex medical jargon where possible."
+    "\n3. Clearly state that you are an AI assistant and your advice DOES NOT REPLACE professional medical consultation."
+    "\n4. If a user asks a question unrelated to medicines, health, or prescriptions, politely redirect them back to the topic."
+)
+
+# Persistent answer cache, shared by every chat session on this machine
+CHAT_CACHE_PATH = os.getenv(
+    "RXLENS_CHAT_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "chat_responses.sqlite3")
+)
+CHAT_CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Prompt used to prefetch one ingredient's explanation after an analysis
+EXPLANATION_PROMPT = (
+    "Explain {ingredient} in simple terms: what it is used for, its common side effects, "
+    "and important precautions."
+)
+# Questions that a prefetched explanation answers ("side effects of paracetamol", "what is metformin")
+EXPLANATION_INTENT = re.compile(r"\b(side effects?|what is|what are|used for|uses?|explain|tell me about|precautions?)\b")
+
+# Per-turn payload bounds (estimated tokens): recent verbatim turns, folded older turns, analysis digest
+HISTORY_TOKEN_BUDGET = 1200
+SUMMARY_TOKEN_BUDGET = 200
+DIGEST_MAX_LINES = 12
+DIGEST_LINE_CHARS = 200
+
+
+def normalize_prompt(text: str) -> str:
+    """Cache form of a prompt: lowercase words, punctuation and extra whitespace dropped"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); good enough for budgeting"""
+    return len(text or "") // 4 + 1
+
+
+def _first_sentence(text: str, max_chars: int = 160) -> str:
+    text = " ".join((text or "").split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + "..."
+
+
+def summarize_turns(summary: str, turns: List[Dict[str, str]], budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """Fold turns into a running summary of one line per turn, oldest lines dropped to stay within budget"""
+    lines = summary.split("\n") if summary else []
+    for msg in turns:
+        who = "User asked" if msg["role"] == "user" else "Assistant answered"
+        lines.append(f"- {who}: {_first_sentence(msg['content'])}")
+    while lines and estimate_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def analysis_digest(results: Iterable[dict], duplicate_ingredients: Iterable[dict] = ()) -> str:
+    """Compact, size-bounded text of an analysis: resolved medicine, ingredients and cheapest substitute per line.
+
+    `results` and `duplicate_ingredients` have the shape returned by /api/analyze-prescription.
+    """
+    lines = []
+    for record in results:
+        query, result = record["query"], record["result"]
+        if result.get("status") != "found":
+            lines.append(f"{query}: not found")
+            continue
+        med = result["original_medicine"]
+        composition = ", ".join(
+            f"{c.get('drug_name') or c['drug_id']} {c['amount']:g}{c.get('unit') or ''}"
+            for c in med.get("composition", [])
+        )
+        line = f"{query} -> {med['name']} (Rs {med['price']:.2f}; {composition})"
+        substitutes = result.get("substitutes") or []
+        if substitutes:
+            cheapest = min((s["medicine"] for s in substitutes), key=lambda m: m["price"])
+            line += f"; cheapest alternative {cheapest['name']} Rs {cheapest['price']:.2f}"
+        lines.append(line[:DIGEST_LINE_CHARS])
+    if len(lines) > DIGEST_MAX_LINES:
+        lines = lines[:DIGEST_MAX_LINES] + [f"... and {len(lines) - DIGEST_MAX_LINES} more lines"]
+    duplicates = sorted({d["drug_name"] for d in duplicate_ingredients})
+    if duplicates:
+        lines.append(("Same ingredient on several lines: " + ", ".join(duplicates))[:DIGEST_LINE_CHARS])
+    return "\n".join(lines)
+
+
+class LLMBackend:
+    """Interface for chat model backends.
+
+    `generate` gets the prior turns as [{'role': 'user'|'assistant', 'content': str}],
+    the new prompt and a context block (analysis digest and summary of older
+    turns, possibly empty) to send with it, and returns the reply text. It
+    raises on failure so the caller never caches an error message.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def generate(self, history: List[Dict[str, str]], prompt: str, context: str = "") -> str:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", system_instruction: str = SYSTEM_INSTRUCTION):
+        # Using Gemini Flash for fast, conversational responses
+        self.model = None
+        if genai is not None:
+            self.model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+
+    @property
+    def available(self) -> bool:
+        return bool(api_key) and self.model is not None
+
+    def generate(self, history: List[Dict[str, str]], prompt: str, context: str = "") -> str:
+        contents = [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+            for msg in history
+        ]
+        contents.append({"role": "user", "parts": [context, prompt] if context else [prompt]})
+        return self.model.generate_content(contents).text
+
+
+class StubBackend(LLMBackend):
+    """Deterministic local backend for tests and offline development; records every call."""
+
+    name = "stub"
+
+    def __init__(self, reply: str = "[stub] {prompt}"):
+        self.reply = reply
+        self.calls: List[Tuple[int, str]] = []
+        # estimated tokens sent per call (history + context + prompt)
+        self.payload_tokens: List[int] = []
+        self._lock = threading.Lock()
+
+    def generate(self, history: List[Dict[str, str]], prompt: str, context: str = "") -> str:
+        with self._lock:
+            self.calls.append((len(history), prompt))
+            self.payload_tokens.append(
+                sum(estimate_tokens(m["content"]) for m in history) + estimate_tokens(context) + estimate_tokens(prompt)
             )
+        return self.reply.format(prompt=prompt)
+
+
+def make_backend(name: Optional[str] = None) -> LLMBackend:
+    """Backend named by `name` or RXLENS_LLM_BACKEND ('gemini' by default, or 'stub')"""
+    name = (name or os.getenv("RXLENS_LLM_BACKEND", "gemini")).lower()
+    if name == "stub":
+        return StubBackend()
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+class ResponseCache:
+    """SQLite-backed answer cache keyed on normalized prompt plus ingredient context.
+
+    Safe to share between threads (chat turns and background prefetch).
+    """
+
+    def __init__(self, path: str = CHAT_CACHE_PATH, max_age: float = CHAT_CACHE_MAX_AGE):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
         )
-        self.chat_session = None
-        
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(prompt: str, context: Iterable[str] = (), conversation: str = "") -> str:
+        """`conversation` is the per-session context sent with the prompt (analysis digest, summary);
+        answers that saw one are only reused under exactly the same one"""
+        payload = json.dumps([normalize_prompt(prompt), sorted({normalize_prompt(c) for c in context}),
+                              hashlib.sha1(conversation.encode("utf-8")).hexdigest() if conversation else ""])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            self._conn.commit()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+            return row is not None and time.time() - row[0] <= self.max_age
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_cache_lock = threading.Lock()
+
+# Background explanation prefetch; small so it never competes with interactive turns
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rxlens-prefetch")
+_prefetch_in_flight = set()
+_prefetch_lock = threading.Lock()
+
+
+def shared_cache() -> ResponseCache:
+    """Process-wide cache at CHAT_CACHE_PATH, opened on first use"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
+
+
+class RxLensChatbot:
+    """Explanation Engine chat.
+
+    Only the most recent turns (within `history_budget` estimated tokens) are
+    sent verbatim; older turns are folded into a short summary, and the
+    current analysis travels as a precomputed digest, so the per-turn payload
+    stays bounded however long the conversation runs.
+    """
+
+    def __init__(self, backend: Optional[LLMBackend] = None, cache: Optional[ResponseCache] = None,
+                 history_budget: int = HISTORY_TOKEN_BUDGET):
+        self.backend = backend or make_backend()
+        self.cache = cache or shared_cache()
+        self.history_budget = history_budget
+        self.history: List[Dict[str, str]] = []
+        self.summary = ""
+        self.digest = ""
+        # Normalized ingredient names from the current analysis
+        self.ingredients: List[str] = []
+
     def start_chat(self, history=None):
         """Initializes a new chat session, optionally with previous history."""
+        self.history = [{"role": msg["role"], "content": msg["content"]} for msg in (history or [])]
+        self.summary = ""
+        self._trim()
+
+    def set_analysis(self, results: Iterable[dict], ingredients: Iterable[dict] = (),
+                     duplicate_ingredients: Iterable[dict] = ()):
+        """Adopt an analysis (shapes as returned by /api/analyze-prescription) as chat context"""
+        self.set_ingredients(i["drug_name"] for i in ingredients)
+        self.digest = analysis_digest(results, duplicate_ingredients)
+
+    def set_ingredients(self, ingredients: Iterable[str]):
+        """Ingredients of the analyzed prescription, used as cache context"""
+        self.ingredients = sorted({normalize_prompt(i) for i in ingredients if i and normalize_prompt(i)})
+
+    def mentioned_ingredients(self, prompt: str) -> List[str]:
+        """Analyzed ingredients named (as whole words) in prompt"""
+        padded = f" {normalize_prompt(prompt)} "
+        return [i for i in self.ingredients if f" {i} " in padded]
 
-        gemini_history = []
-        if history:
-            for msg in history:
-                role = "user" if msg["role"] == "user" else "model"
-                gemini_history.append({"role": role, "parts": [msg["content"]]})
-                
-        self.chat_session = self.model.start_chat(history=gemini_history)
+    def _cache_keys(self, prompt: str) -> List[str]:
+        """Keys under which prompt may be answered; empty when the answer depends on the conversation.
+
+        Only prompts naming an analyzed ingredient are self-contained enough to
+        cache, and the answer is keyed on the session context it was generated
+        with (prescription digest and summary), so it is never replayed to a
+        session with a different prescription. A short explanation question
+        about exactly one ingredient also accepts that ingredient's prefetched,
+        context-free explanation.
+        """
+        mentioned = self.mentioned_ingredients(prompt)
+        if not mentioned:
+            return []
+        keys = [ResponseCache.key(prompt, mentioned, self.context())]
+        if len(mentioned) == 1 and EXPLANATION_INTENT.search(normalize_prompt(prompt)) \
+                and len(normalize_prompt(prompt).split()) <= len(mentioned[0].split()) + 8:
+            keys.append(self._explanation_key(mentioned[0]))
+        return keys
+
+    @staticmethod
+    def _explanation_key(ingredient: str) -> str:
+        return ResponseCache.key(EXPLANATION_PROMPT.format(ingredient=ingredient), [ingredient])
 
     def generate_response(self, prompt):
-        """Sends a message to the model and returns the text response."""
-        if not api_key:
-             return "API Key Error: Please set the GEMINI_API_KEY in your .env file to use the Explanation Engine."
-             
-        if not self.chat_session:
-            self.start_chat()
-            
+        """Answers prompt from the cache when possible, otherwise from the backend; records the turn."""
+        keys = self._cache_keys(prompt)
+        for key in keys:
+            response = self.cache.get(key)
+            if response is not None:
+                self._record(prompt, response)
+                return response
+
+        if not self.backend.available:
+            return "API Key Error: Please set the GEMINI_API_KEY in your .env file to use the Explanation Engine."
+
+        try:
+            response = self.backend.generate(self.history, prompt, self.context())
+        except Exception as e:
+            return f"An error occurred while communicating with the AI: {e}"
+
+        if keys:
+            self.cache.put(keys[0], response)
+        self._record(prompt, response)
+        return response
+
+    def context(self) -> str:
+        """Digest of the current analysis plus the summary of turns no longer sent verbatim"""
+        parts = []
+        if self.digest:
+            parts.append("Current prescription analysis:\n" + self.digest)
+        if self.summary:
+            parts.append("Earlier in this conversation:\n" + self.summary)
+        return "\n\n".join(parts)
+
+    def _record(self, prompt: str, response: str):
+        self.history.append({"role": "user", "content": prompt})
+        self.history.append({"role": "assistant", "content": response})
+        self._trim()
+
+    def _trim(self):
+        """Fold the oldest turns into the summary until the verbatim window fits the budget"""
+        folded = []
+        while len(self.history) > 2 and sum(estimate_tokens(m["content"]) for m in self.history) > self.history_budget:
+            folded.extend(self.history[:2])
+            del self.history[:2]
+        if folded:
+            self.summary = summarize_turns(self.summary, folded)
+
+    def prefetch_explanations(self, ingredients: Optional[Iterable[str]] = None) -> List:
+        """Warm the cache with explanations of each ingredient in the background.
+
+        Already cached or in-flight ingredients are skipped; returns the futures
+        submitted (tests wait on them, the UI does not).
+        """
+        if not self.backend.available:
+            return []
+        names = self.ingredients if ingredients is None else sorted({normalize_prompt(i) for i in ingredients if i})
+        futures = []
+        for ingredient in names:
+            key = self._explanation_key(ingredient)
+            with _prefetch_lock:
+                if key in _prefetch_in_flight or key in self.cache:
+                    continue
+                _prefetch_in_flight.add(key)
+            futures.append(_prefetch_pool.submit(self._prefetch_one, ingredient, key))
+        return futures
+
+    def _prefetch_one(self, ingredient: str, key: str):
         try:
-            response = self.chat_session.send_message(prompt)
-            return response.text
+            response = self.backend.generate([], EXPLANATION_PROMPT.format(ingredient=ingredient))
+            self.cache.put(key, response)
         except Exception as e:
-             return f"An error occurred while communicating with the AI: {e}"
+            print(f"Explanation prefetch failed for {ingredient}: {e}")
+        finally:
+            with _prefetch_lock:
+                _prefetch_in_flight.discard(key)
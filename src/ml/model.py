@@ -33,13 +33,15 @@ class MedicineMatcher:
         print("Building search index...")
         self.tfidf_matrix = self.embedder.transform(self.medicines_df[text_column])
         
-    def find_matches(self, query, top_k=5):
+    def find_matches(self, query, top_k=5, rows=None):
         """
         Finds the most similar medicines to the query.
         
         Args:
             query (str): The search text (e.g., brand name or composition).
             top_k (int): Number of results to return.
+            rows (array-like, optional): Row positions in medicines_df to score;
+                only these rows are compared (e.g. a facet selection).
             
         Returns:
             pd.DataFrame: Top k matches with similarity scores.
@@ -50,14 +52,19 @@ class MedicineMatcher:
         # Vectorise query
         query_vec = self.embedder.transform(query)
         
-        # Calculate cosine similarity
-        cosine_sim = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
+        # Calculate cosine similarity (against the selected rows only, if given)
+        if rows is None:
+            rows = np.arange(self.tfidf_matrix.shape[0])
+            cosine_sim = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+            cosine_sim = cosine_similarity(query_vec, self.tfidf_matrix[rows]).flatten()
         
         # Get top k indices
         top_indices = cosine_sim.argsort()[-top_k:][::-1]
         
         # Retrieve results
-        results = self.medicines_df.iloc[top_indices].copy()
+        results = self.medicines_df.iloc[rows[top_indices]].copy()
         results['similarity_score'] = cosine_sim[top_indices]
         
         # Filter out zero-similarity matches
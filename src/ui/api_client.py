@@ -0,0 +1,171 @@
+"""
+HTTP client for the RxLens backend used by the Streamlit UI.
+
+One pooled keep-alive requests.Session per Streamlit server process, with
+retry/backoff on transient failures. Health checks are cached for a few
+seconds only (a down backend is re-checked soon after it comes back), and
+analyses are cached on the normalized prescription so reruns are instant.
+Analyses use the NDJSON streaming endpoint so each line can be rendered as
+soon as the backend has it.
+
+With RXLENS_MODE=embedded the UI skips HTTP entirely and calls an in-process
+RxLensEngine, loaded once per Streamlit server process.
+"""
+
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv('API_URL', 'http://127.0.0.1:5000')
+# 'http' (default) talks to the Flask API; 'embedded' runs the engine in this process
+EMBEDDED = os.getenv('RXLENS_MODE', 'http').lower() == 'embedded'
+API_TIMEOUT = 30
+HEALTH_TTL_SECONDS = 10
+ANALYSIS_TTL_SECONDS = 600
+
+
+class RxLensClient:
+    def __init__(self, base_url: str = API_BASE_URL, timeout: float = API_TIMEOUT,
+                 retries: int = 3, backoff: float = 0.3, pool_size: int = 10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            # every endpoint we call is read-only, so POSTs are safe to retry
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def health(self) -> bool:
+        """Check if backend API is running (single attempt, short timeout)"""
+        try:
+            response = self.session.get(f'{self.base_url}/api/health', timeout=5)
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            print(f"API health check failed: {e}")
+            return False
+
+    def analyze_prescription(self, medicines_list: List[str], top_k: int = 5) -> Dict:
+        """POST the prescription to the backend; raises on transport or HTTP errors"""
+        response = self.session.post(
+            f'{self.base_url}/api/analyze-prescription',
+            json={'medicines': medicines_list, 'top_k': top_k},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_prescription(self, medicines_list: List[str], top_k: int = 5) -> Iterator[Dict]:
+        """Yield NDJSON records from the streaming endpoint: one per line, then a summary"""
+        with self.session.post(
+            f'{self.base_url}/api/analyze-prescription/stream',
+            json={'medicines': medicines_list, 'top_k': top_k},
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for raw in response.iter_lines():
+                if raw:
+                    yield json.loads(raw)
+
+
+@st.cache_resource
+def get_client() -> RxLensClient:
+    """Process-wide client so every session shares the connection pool"""
+    return RxLensClient()
+
+
+@st.cache_resource(show_spinner='Loading medicine catalog...')
+def get_engine():
+    """Process-wide in-process engine for embedded mode"""
+    core_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'core')
+    if core_dir not in sys.path:
+        sys.path.insert(0, core_dir)
+    from engine import RxLensEngine
+    engine = RxLensEngine()
+    engine.load()
+    return engine
+
+
+@st.cache_data(ttl=HEALTH_TTL_SECONDS, show_spinner=False)
+def api_health_check() -> bool:
+    """Check if backend API is running; the answer is reused for a few seconds"""
+    if EMBEDDED:
+        try:
+            return get_engine().loaded
+        except Exception as e:
+            print(f"Embedded engine failed to load: {e}")
+            return False
+    return get_client().health()
+
+
+def normalize_prescription(lines: List[str]) -> Tuple[str, ...]:
+    """Cache key for a prescription: trimmed, whitespace-collapsed, non-empty lines in order"""
+    return tuple(' '.join(line.split()) for line in lines if line and line.strip())
+
+
+class _UncacheableAnalysis(Exception):
+    """Carries a failed or deadline-truncated analysis out of _analyze_cached so it is returned, not cached"""
+
+    def __init__(self, result: Dict):
+        super().__init__(result.get('error') or 'Analysis incomplete')
+        self.result = result
+
+
+@st.cache_data(ttl=ANALYSIS_TTL_SECONDS, show_spinner=False)
+def _analyze_cached(prescription: Tuple[str, ...], top_k: int, _on_line: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    # elements _on_line draws are replayed by Streamlit on a cache hit
+    result = {'success': False, 'results': []}
+    if EMBEDDED:
+        records = get_engine().iter_analyze_prescription(list(prescription), top_k=top_k)
+    else:
+        records = get_client().stream_prescription(list(prescription), top_k=top_k)
+    for record in records:
+        if record.get('type') == 'line':
+            result['results'].append({k: v for k, v in record.items() if k != 'type'})
+            if _on_line is not None:
+                _on_line(record['query'], record['result'])
+        elif record.get('type') == 'summary':
+            result.update({k: v for k, v in record.items() if k != 'type'})
+    if not result.get('success') or result.get('partial'):
+        # exceptions are not cached, so failed or partial analyses are shown now and retried next time
+        raise _UncacheableAnalysis(result)
+    return result
+
+
+def analyze_prescription_api(medicines_list: List[str], top_k: int = 5,
+                             on_line: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Analyze prescription by calling the backend API
+
+    Args:
+        medicines_list: List of medicine names
+        top_k: Number of top alternatives to return
+        on_line: Called with (line, result) as each line's result arrives
+
+    Returns:
+        Dictionary with analysis results (same shape as /api/analyze-prescription);
+        'partial' is True when the backend deadline cut the analysis short
+    """
+    try:
+        return _analyze_cached(normalize_prescription(medicines_list), top_k, _on_line=on_line)
+    except requests.exceptions.RequestException as e:
+        return {
+            'success': False,
+            'error': f'API Error: {str(e)}. Make sure the backend server is running on {API_BASE_URL}'
+        }
+    except _UncacheableAnalysis as e:
+        return e.result
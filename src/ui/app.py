@@ -5,7 +5,6 @@ import time
 import os
 import sys
 import pandas as pd
-import requests
 from typing import Dict, Optional
 
 # Add src to python path to allow imports
@@ -13,13 +12,10 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 from ml.chat import RxLensChatbot
+from api_client import API_BASE_URL, EMBEDDED, api_health_check, analyze_prescription_api
 
 st.set_page_config(layout="wide", page_title="RxLens")
 
-# API Configuration
-API_BASE_URL = os.getenv('API_URL', 'http://127.0.0.1:5000')
-API_TIMEOUT = 30
-
 # Get the directory of the current script
 # SCRIPT_DIR is already defined above
 
@@ -28,41 +24,19 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(SCRIPT_DIR)), 'data', 'r
 MEDICINES_CSV = os.path.join(DATA_DIR, 'jan_aushadhi_medicines.csv')
 COMPOSITION_CSV = os.path.join(DATA_DIR, 'jan_aushadhi_composition.csv')
 
-@st.cache_resource
-def api_health_check():
-    """Check if backend API is running"""
-    try:
-        response = requests.get(f'{API_BASE_URL}/api/health', timeout=5)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"API health check failed: {e}")
-        return False
-
-
-def analyze_prescription_api(medicines_list: list, top_k: int = 5) -> Dict:
-    """
-    Analyze prescription by calling the backend API
-    
-    Args:
-        medicines_list: List of medicine names
-        top_k: Number of top alternatives to return
-    
-    Returns:
-        Dictionary with analysis results
-    """
-    try:
-        response = requests.post(
-            f'{API_BASE_URL}/api/analyze-prescription',
-            json={'medicines': medicines_list, 'top_k': top_k},
-            timeout=API_TIMEOUT
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {
-            'success': False,
-            'error': f'API Error: {str(e)}. Make sure the backend server is running on {API_BASE_URL}'
-        }
+def render_line_progress(med_name: str, result: Dict):
+    """One-line preview of a prescription line, drawn as soon as its result streams in"""
+    if result.get('status') == 'found':
+        med = result['original_medicine']
+        subs = result.get('substitutes', [])
+        text = f"✅ **{med_name}** → {med['name']} (₹{med['price']:.2f}) · {len(subs)} alternatives"
+        if subs:
+            text += f", from ₹{min(s['medicine']['price'] for s in subs):.2f}"
+        st.markdown(text)
+    elif result.get('status') == 'not_found':
+        st.markdown(f"❌ **{med_name}**: {result.get('error', 'Not found')}")
+    else:
+        st.markdown(f"⏳ **{med_name}**: {result.get('error', 'Not analyzed')}")
 
 def local_css(file_name):
     file_path = os.path.join(SCRIPT_DIR, file_name)
@@ -231,6 +205,11 @@ if 'analyzed' not in st.session_state:
     st.session_state.analyzed = False
 if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
+if 'duplicate_ingredients' not in st.session_state:
+    st.session_state.duplicate_ingredients = []
+
+# Chat messages kept in session state for display
+MAX_CHAT_MESSAGES = 50
 
 if 'messages' not in st.session_state:
     st.session_state.messages = []
@@ -248,18 +227,32 @@ with col_btn1:
     if st.button("Analyze Prescription"):
         # Check if API is running
         if not api_health_check():
-            st.error(f"⚠️ Backend API is not running. Please start the backend server at {API_BASE_URL}")
-            st.info("To start the backend server, run: python src/core/api.py")
+            if EMBEDDED:
+                st.error("⚠️ The embedded RxLens engine could not load the medicine catalog. Check data/refined.")
+            else:
+                st.error(f"⚠️ Backend API is not running. Please start the backend server at {API_BASE_URL}")
+                st.info("To start the backend server, run: python src/core/api.py (or set RXLENS_MODE=embedded)")
         else:
             with st.spinner('Analyzing your prescription...'):
                 prescription_lines = [line.strip() for line in prescription_list.strip().split('\n') if line.strip()]
                 
-                # Call API to analyze prescription
-                api_response = analyze_prescription_api(prescription_lines, top_k=5)
+                # Call API to analyze prescription; lines render as they stream in
+                with st.container():
+                    api_response = analyze_prescription_api(prescription_lines, top_k=5, on_line=render_line_progress)
                 
                 if api_response.get('success'):
+                    if api_response.get('partial'):
+                        st.warning("The analysis hit the time limit; some medicines were skipped. Analyze again to complete it.")
                     st.session_state.analysis_results = api_response['results']
+                    st.session_state.duplicate_ingredients = api_response.get('duplicate_ingredients', [])
                     st.session_state.analyzed = True
+                    # Warm the Explanation Engine so the first question about an ingredient is instant
+                    st.session_state.chatbot.set_analysis(
+                        api_response['results'],
+                        api_response.get('ingredients', []),
+                        api_response.get('duplicate_ingredients', [])
+                    )
+                    st.session_state.chatbot.prefetch_explanations()
                 else:
                     st.error(f"Error analyzing prescription: {api_response.get('error', 'Unknown error')}")
                     st.session_state.analyzed = False
@@ -276,11 +269,11 @@ if st.session_state.analyzed and st.session_state.analysis_results:
     results = st.session_state.analysis_results
     
     # Count from API response if available, otherwise calculate
-    found_medicines = {k: v for k, v in results.items() if v.get('status') == 'found'}
-    not_found_medicines = {k: v for k, v in results.items() if v.get('status') == 'not_found'}
+    found_medicines = [(r['query'], r['result']) for r in results if r['result'].get('status') == 'found']
+    not_found_medicines = [(r['query'], r['result']) for r in results if r['result'].get('status') == 'not_found']
     
     successful_medicines = len(found_medicines)
-    total_alternatives = sum(len(v.get('substitutes', [])) for v in found_medicines.values())
+    total_alternatives = sum(len(v.get('substitutes', [])) for _, v in found_medicines)
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -300,13 +293,20 @@ if st.session_state.analyzed and st.session_state.analysis_results:
     
     style_metric_cards(border_left_color="#007bff")
 
+    # Duplicate salts across prescription lines
+    for dup in st.session_state.duplicate_ingredients:
+        st.warning(
+            f"⚠️ **{dup['drug_name'] or dup['canonical_id']}** appears in {len(dup['lines'])} medicines "
+            f"({', '.join(dup['lines'])}), total {dup['total_amount']:g} {dup['unit']}"
+        )
+
     st.write("\n" * 10) 
 
     # Branded Drugs Details
     st.markdown('<div id="branded-section"></div>', unsafe_allow_html=True)
     st.header("Input Medicines Details", anchor="branded-section")
     
-    for med_name, result in found_medicines.items():
+    for med_name, result in found_medicines:
         if result['status'] == 'found':
             med = result['original_medicine']
             match_similarity = result.get('similarity_score', 100)
@@ -328,7 +328,7 @@ if st.session_state.analyzed and st.session_state.analysis_results:
                 comp_data = []
                 for c in med['composition']:
                     comp_data.append({
-                        'Drug ID': c['drug_id'],
+                        'Ingredient': c.get('drug_name') or c['drug_id'],
                         'Amount': c['amount'],
                         'Unit': c['unit']
                     })
@@ -340,7 +340,7 @@ if st.session_state.analyzed and st.session_state.analysis_results:
     st.markdown('<div id="generics-section"></div>', unsafe_allow_html=True)
     st.header("Generic & Alternative Medicines", anchor="generics-section")
     
-    for med_name, result in found_medicines.items():
+    for med_name, result in found_medicines:
         if result['status'] == 'found' and result.get('substitutes'):
             st.subheader(f"Alternatives for {med_name}")
             
@@ -374,7 +374,7 @@ if st.session_state.analyzed and st.session_state.analysis_results:
                         comp_data = []
                         for c in top_alt['medicine']['composition']:
                             comp_data.append({
-                                'Drug ID': c['drug_id'],
+                                'Ingredient': c.get('drug_name') or c['drug_id'],
                                 'Amount': c['amount'],
                                 'Unit': c['unit']
                             })
@@ -386,7 +386,7 @@ if st.session_state.analyzed and st.session_state.analysis_results:
         st.write("\n" * 10)
         st.markdown('<div id="issues-section"></div>', unsafe_allow_html=True)
         st.header("Not Found", anchor="issues-section")
-        for med_name, result in not_found_medicines.items():
+        for med_name, result in not_found_medicines:
             st.warning(f"**{med_name}**: {result.get('error', 'Unknown error')}")
 
     st.write("\n" * 10)
@@ -399,7 +399,7 @@ if st.session_state.analyzed and st.session_state.analysis_results:
 
     chat_container = st.container()
     
-    # Display chat history (limit to last 10 messages for UI brevity if desired, but here we show all)
+    # Display chat history (the chatbot itself only sends a bounded window to the model)
     with chat_container:
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
@@ -420,5 +420,6 @@ if st.session_state.analyzed and st.session_state.analysis_results:
                 response = st.session_state.chatbot.generate_response(prompt)
                 st.markdown(response)
                 
-        # Add to session history
+        # Add to session history, keeping only the most recent messages on screen
         st.session_state.messages.append({"role": "assistant", "content": response})
+        del st.session_state.messages[:-MAX_CHAT_MESSAGES]
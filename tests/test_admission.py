@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+try:
+    from src.core.admission import AdmissionController, Deadline
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.matching import rank_candidates
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.admission import AdmissionController, Deadline
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.matching import rank_candidates
+
+
+def test_deadline_flags_partial_ranking():
+    assert not Deadline(None).expired()
+    ref = Medicine(1, 'ref', 10.0, "10's", '', 'tablet', [CompositionItem(2, 500.0, 'mg')])
+    cands = [Medicine(i, f'c{i}', 5.0, "10's", '', 'tablet', [CompositionItem(2, 500.0, 'mg')]) for i in range(2, 200)]
+    deadline = Deadline(0.0)
+    assert rank_candidates(ref, cands, deadline=deadline) == []
+    assert deadline.hit
+    assert len(rank_candidates(ref, cands, top_k=5, deadline=Deadline(10.0))) == 5
+
+
+def test_admission_sheds_when_queue_full():
+    ctl = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0.05)
+    assert ctl.acquire()
+    assert not ctl.acquire()  # no queue room: shed immediately
+    ctl.release()
+
+    ctl = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    assert ctl.acquire()
+    start = time.perf_counter()
+    assert not ctl.acquire()  # queued, then shed after the timeout
+    assert time.perf_counter() - start < 1.0
+    threading.Timer(0.01, ctl.release).start()
+    ctl.queue_timeout = 1.0
+    assert ctl.acquire()  # queued and admitted once the slot frees
+    ctl.release()
+    stats = ctl.stats()
+    assert stats['shed_timeout'] == 1 and stats['admitted'] == 2
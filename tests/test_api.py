@@ -0,0 +1,22 @@
+import os
+import sys
+
+# api.py runs as a script next to its modules (src/core is not imported as a package)
+CORE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'core'))
+if CORE_DIR not in sys.path:
+    sys.path.insert(0, CORE_DIR)
+import api
+
+
+def test_medicines_page_bounds_are_clamped():
+    client = api.app.test_client()
+    total = client.get('/api/medicines?limit=1').get_json()['total']
+
+    everything = client.get('/api/medicines?limit=-1').get_json()
+    assert everything['success'] and everything['count'] == total
+
+    first = client.get('/api/medicines?offset=-5&limit=2').get_json()
+    assert first['success'] and first['offset'] == 0 and first['count'] == 2
+
+    past_end = client.get('/api/medicines?offset=%d&limit=10' % (total + 10)).get_json()
+    assert past_end['success'] and past_end['count'] == 0
@@ -0,0 +1,48 @@
+import os
+try:
+    from src.ui import api_client
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.ui import api_client
+
+
+class _DeadlineEngine:
+    """Engine whose analysis always runs out of time after the first line"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def iter_analyze_prescription(self, lines, top_k=5):
+        self.calls += 1
+        yield {'type': 'line', 'position': 0, 'query': lines[0], 'result': {'status': 'found'}}
+        for position, line in enumerate(lines[1:], 1):
+            yield {'type': 'line', 'position': position, 'query': line, 'result': {'status': 'skipped'}}
+        yield {'type': 'summary', 'success': True, 'partial': True}
+
+
+def test_partial_analysis_is_returned_but_not_cached(monkeypatch):
+    engine = _DeadlineEngine()
+    monkeypatch.setattr(api_client, 'EMBEDDED', True)
+    monkeypatch.setattr(api_client, 'get_engine', lambda: engine)
+    api_client._analyze_cached.clear()
+
+    result = api_client.analyze_prescription_api(['Paracetamol 500', 'Metformin 500'])
+    assert result['success'] and result['partial']
+    assert [r['result']['status'] for r in result['results']] == ['found', 'skipped']
+
+    api_client.analyze_prescription_api(['Paracetamol 500', 'Metformin 500'])
+    assert engine.calls == 2
+
+
+def test_repeated_line_keeps_both_results(monkeypatch):
+    engine = _DeadlineEngine()
+    monkeypatch.setattr(api_client, 'EMBEDDED', True)
+    monkeypatch.setattr(api_client, 'get_engine', lambda: engine)
+    api_client._analyze_cached.clear()
+
+    result = api_client.analyze_prescription_api(['Dolo 650', 'Dolo 650'])
+    assert [(r['position'], r['query']) for r in result['results']] == [(0, 'Dolo 650'), (1, 'Dolo 650')]
@@ -0,0 +1,41 @@
+import os
+try:
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.basket import cheapest_basket
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.basket import cheapest_basket
+
+
+def _med(mid, price, items):
+    return Medicine(medicine_id=mid, name=f'med {mid}', price=price, unit_size="10's", group_name='', category='tablet',
+                    composition=[CompositionItem(did, amt, 'mg') for did, amt in items])
+
+
+def test_combination_product_covers_two_lines():
+    aceclofenac = _med(1, 7.5, [(1, 100.0)])
+    paracetamol = _med(2, 4.0, [(2, 325.0)])
+    combo = _med(3, 9.0, [(1, 100.0), (2, 325.0)])
+    combo_extra = _med(4, 1.0, [(1, 100.0), (2, 325.0), (9, 4.0)])  # adds an ingredient
+    wrong_dose = _med(5, 1.0, [(2, 650.0)])
+    no_price = _med(6, 0.0, [(1, 100.0)])
+    catalog = [aceclofenac, paracetamol, combo, combo_extra, wrong_dose, no_price]
+    drug_index = {}
+    for m in catalog:
+        for c in m.composition:
+            drug_index.setdefault(c.canonical_id, []).append(m)
+
+    basket = cheapest_basket({'Aceclo': aceclofenac, 'PCM': paracetamol}, drug_index)
+    assert basket.optimal
+    assert [m.medicine_id for m in basket.medicines] == [3]
+    assert basket.total_price == 9.0
+    assert basket.uncovered == []
+
+    # with no time budget the greedy seed is still a complete basket
+    rushed = cheapest_basket({'Aceclo': aceclofenac, 'PCM': paracetamol}, drug_index, time_budget=0.0)
+    assert not rushed.optimal and rushed.total_price <= 11.5
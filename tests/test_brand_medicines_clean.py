@@ -0,0 +1,43 @@
+import csv
+import os
+import sys
+
+# scripts/ingest/dataset_cleaning is not a package; import the script module directly
+CLEANING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts', 'ingest', 'dataset_cleaning'))
+if CLEANING_DIR not in sys.path:
+    sys.path.insert(0, CLEANING_DIR)
+from brand_medicines_clean import parse_salt_composition, refine_brand_medicines
+
+SALTS = ['Amoxycillin (500mg) + Clavulanic Acid (125mg)', 'Paracetamol (650mg)', 'Azithromycin (200mg/5ml)',
+         'Paracetamol (125mg/5ml)', 'Cetirizine (10mg)', 'Amoxycillin (250mg)', 'Vitamin D (60000IU)']
+
+
+def test_parse_salt_composition():
+    assert parse_salt_composition('Amoxycillin (500mg) + Clavulanic Acid (125mg)') == [
+        ('Amoxycillin', '500', 'mg'), ('Clavulanic Acid', '125', 'mg')
+    ]
+    assert parse_salt_composition('Azithromycin (200mg/5ml)') == [('Azithromycin', '200/5', 'mg/ml')]
+
+
+def test_streamed_output_is_identical_for_any_worker_count(tmp_path):
+    raw = tmp_path / 'brand_medicine.csv'
+    with open(raw, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'price', 'manufacturer_name', 'pack_size_label', 'salt_composition'])
+        for i in range(50):
+            writer.writerow([i, f'Brand {i}', f'{10 + i}.5', 'Acme', 'strip of 10', SALTS[i % len(SALTS)]])
+
+    outputs = []
+    for workers, batch_size in ((1, 1000), (3, 4)):
+        out = tmp_path / f'out_{workers}'
+        out.mkdir()
+        with open(out / 'drugs.csv', 'w', encoding='utf-8') as f:
+            f.write('drug_id,drug_name\n1,Paracetamol\n')
+        stats = refine_brand_medicines(raw, out / 'drugs.csv', out / 'brand.csv', out / 'comp.csv',
+                                       batch_size=batch_size, workers=workers)
+        assert stats == {'medicines': 50, 'compositions': 58, 'new_drugs': 5}
+        outputs.append([(out / name).read_text(encoding='utf-8') for name in ('drugs.csv', 'brand.csv', 'comp.csv')])
+
+    assert outputs[0] == outputs[1]
+    drugs = outputs[0][0].splitlines()
+    assert drugs[:3] == ['drug_id,drug_name', '1,Paracetamol', '2,Amoxycillin']
@@ -0,0 +1,58 @@
+import os
+try:
+    from src.core.canonical import canonical_key, cluster_drugs
+    from src.core.etl import load_data, load_drugs
+    from src.core.matching import find_substitutes
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.canonical import canonical_key, cluster_drugs
+    from src.core.etl import load_data, load_drugs
+    from src.core.matching import find_substitutes
+
+
+def test_canonical_key_strips_salt_and_modifiers():
+    assert canonical_key('Diclofenac Sodium Gastro-Resistant IP') == 'diclofenac'
+    assert canonical_key('Diclofenac Gastro-Resistant IP') == 'diclofenac'
+    assert canonical_key('Metformin Hydrochloride') == 'metformin'
+    # the salt is the ingredient here
+    assert canonical_key('Calcium Acetate') == 'calcium acetate'
+    assert canonical_key('Sodium Chloride IP') == 'sodium chloride'
+    mapping = cluster_drugs([(7, 'Diclofenac'), (12, 'Diclofenac Sodium IP'), (2, 'Paracetamol')])
+    assert mapping == {7: 7, 12: 7, 2: 2}
+
+
+def test_release_form_and_route_are_not_merged():
+    assert canonical_key('Diclofenac Sodium Prolonged Release IP') == 'diclofenac (modified release)'
+    assert canonical_key('Metformin Hydrochloride Sustained Release IP') == canonical_key('Metformin SR')
+    assert canonical_key('Metformin Hydrochloride Sustained Release IP') != canonical_key('Metformin Hydrochloride IP')
+    assert canonical_key('Metoprolol Succinate Extended Release IP') != canonical_key('Metoprolol Tartrate')
+    assert canonical_key('Ciprofloxacin Eye IP') != canonical_key('Ciprofloxacin')
+    assert canonical_key('Ofloxacin Infusion IP') != canonical_key('Ofloxacin')
+    assert canonical_key('Xylometazoline Nasal IP') != canonical_key('Xylometazoline')
+    mapping = cluster_drugs([(1, 'Metformin Hydrochloride IP'), (2, 'Metformin Hydrochloride Prolonged-release'),
+                             (3, 'Ciprofloxacin'), (4, 'Ciprofloxacin Eye IP')])
+    assert len(set(mapping.values())) == 4
+
+
+def test_substitutes_span_salt_variants():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    med_csv = os.path.join(base, 'jan_aushadhi_medicines.csv')
+    comp_csv = os.path.join(base, 'jan_aushadhi_composition.csv')
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, drug_index = load_data(med_csv, comp_csv, drugs)
+    # 10: Diclofenac Gastro-Resistant Tablets IP 50 mg; 7 contains Diclofenac Sodium 50mg
+    subs = find_substitutes(10, medicines, drug_index, top_k=50)
+    assert 7 in {s.medicine.medicine_id for s in subs}
+
+    # modified-release metformin is not offered as a substitute for immediate-release metformin
+    def release_forms(med):
+        return ['release' in drugs.name(c.drug_id).lower() for c in med.composition]
+    plain = next(m for m in medicines.values()
+                 if [drugs.name(c.drug_id).lower() for c in m.composition] == ['metformin hydrochloride ip'])
+    assert any(release_forms(m) == [True] and 'metformin' in m.name.lower() for m in medicines.values())
+    subs = find_substitutes(plain.medicine_id, medicines, drug_index, top_k=200)
+    assert subs and not any(any(release_forms(s.medicine)) for s in subs)
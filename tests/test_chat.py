@@ -0,0 +1,92 @@
+import os
+try:
+    from src.ml.chat import RxLensChatbot, ResponseCache, StubBackend, estimate_tokens
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.ml.chat import RxLensChatbot, ResponseCache, StubBackend, estimate_tokens
+
+
+def test_repeat_questions_are_served_from_cache(tmp_path):
+    backend = StubBackend()
+    cache = ResponseCache(str(tmp_path / 'chat.sqlite3'))
+    bot = RxLensChatbot(backend=backend, cache=cache)
+    bot.set_ingredients(['Paracetamol', 'Metformin'])
+
+    first = bot.generate_response('Is paracetamol safe with alcohol?')
+    # a new session on the same persistent cache, different spelling of the same prompt
+    other = RxLensChatbot(backend=backend, cache=ResponseCache(str(tmp_path / 'chat.sqlite3')))
+    other.set_ingredients(['paracetamol'])
+    assert other.generate_response('is Paracetamol safe with alcohol') == first
+    assert len(backend.calls) == 1
+    assert [m['role'] for m in other.history] == ['user', 'assistant']
+
+    # follow-ups that name no ingredient depend on the conversation and are never cached
+    bot.generate_response('And for children?')
+    bot.generate_response('And for children?')
+    assert len(backend.calls) == 3
+
+
+def test_answers_about_one_prescription_are_not_replayed_to_another(tmp_path):
+    backend = StubBackend()
+    path = str(tmp_path / 'chat.sqlite3')
+    results = [{'position': 0, 'query': 'Paracetamol 500',
+                'result': {'status': 'found', 'original_medicine': {'name': 'Paracetamol Tablets IP 500 mg', 'price': 10.0},
+                           'substitutes': []}}]
+    bot = RxLensChatbot(backend=backend, cache=ResponseCache(path))
+    bot.set_analysis(results, [{'drug_name': 'Paracetamol'}], [{'drug_name': 'Paracetamol', 'lines': ['a', 'b']}])
+    bot.generate_response('Is paracetamol duplicated in my prescription?')
+
+    other = RxLensChatbot(backend=backend, cache=ResponseCache(path))
+    other.set_analysis(results, [{'drug_name': 'Paracetamol'}])
+    other.generate_response('Is paracetamol duplicated in my prescription?')
+    assert len(backend.calls) == 2
+
+    # the same prescription context is still served from the cache
+    same = RxLensChatbot(backend=backend, cache=ResponseCache(path))
+    same.set_analysis(results, [{'drug_name': 'Paracetamol'}])
+    same.generate_response('Is paracetamol duplicated in my prescription?')
+    assert len(backend.calls) == 2
+
+
+def test_prefetched_explanation_answers_first_question(tmp_path):
+    backend = StubBackend(reply='explanation: {prompt}')
+    bot = RxLensChatbot(backend=backend, cache=ResponseCache(str(tmp_path / 'chat.sqlite3')))
+    bot.set_ingredients(['Paracetamol', 'Metformin'])
+    for future in bot.prefetch_explanations():
+        future.result()
+    assert len(backend.calls) == 2
+    assert bot.prefetch_explanations() == []  # already cached
+
+    answer = bot.generate_response('Side effects of metformin?')
+    assert 'metformin' in answer and len(backend.calls) == 2
+
+
+def test_long_conversation_payload_stays_bounded(tmp_path):
+    backend = StubBackend(reply='A fairly long answer about the medicine. ' * 20)
+    bot = RxLensChatbot(backend=backend, cache=ResponseCache(str(tmp_path / 'chat.sqlite3')), history_budget=600)
+    results = [
+        {'position': 0, 'query': 'Dolo 650', 'result': {
+            'status': 'found',
+            'original_medicine': {'name': 'Paracetamol 650mg', 'price': 30.0,
+                                  'composition': [{'drug_id': 2, 'drug_name': 'Paracetamol', 'amount': 650.0, 'unit': 'mg'}]},
+            'substitutes': [{'medicine': {'name': 'PCM 650', 'price': 12.5}}, {'medicine': {'name': 'Pyrigesic', 'price': 18.0}}],
+        }},
+        {'position': 1, 'query': 'xyz', 'result': {'status': 'not_found'}},
+    ]
+    bot.set_analysis(results, [{'drug_name': 'Paracetamol'}])
+    assert bot.digest.splitlines() == [
+        'Dolo 650 -> Paracetamol 650mg (Rs 30.00; Paracetamol 650mg); cheapest alternative PCM 650 Rs 12.50',
+        'xyz: not found',
+    ]
+
+    for i in range(40):
+        bot.generate_response(f'Follow-up question number {i}?')
+    assert max(backend.payload_tokens[10:]) - min(backend.payload_tokens[10:]) < 300
+    assert max(backend.payload_tokens) < 600 + 200 + 100
+    assert 'Follow-up question number 39?' in [m['content'] for m in bot.history]
+    assert 'Follow-up question number 0?' not in [m['content'] for m in bot.history]
+    assert bot.summary.startswith('- ') and estimate_tokens(bot.summary) <= 200
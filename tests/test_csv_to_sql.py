@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import sys
+
+# scripts/ingest is not a package; import the script module directly
+INGEST_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts', 'ingest'))
+if INGEST_DIR not in sys.path:
+    sys.path.insert(0, INGEST_DIR)
+from csv_to_sql import infer_column_types, load_sqlite, write_sql
+
+
+def _csv(tmp_path):
+    path = tmp_path / 'meds.csv'
+    path.write_text(
+        "medicine_id,medicine_name,unit_size,mrp\n"
+        "1,Dolo 650,15's,30.5\n"
+        "2,O'Brien Syrup,100,\n"
+        "3,Crocin,10's,12\n",
+        encoding='utf-8'
+    )
+    return path
+
+
+def test_column_types_and_batched_inserts(tmp_path):
+    path = _csv(tmp_path)
+    columns = ['medicine_id', 'medicine_name', 'unit_size', 'mrp']
+    types = infer_column_types(path, columns)
+    # '100' in unit_size stays quoted because the column holds text elsewhere
+    assert types == {'medicine_id': 'int', 'medicine_name': 'text', 'unit_size': 'text', 'mrp': 'real'}
+
+    out = tmp_path / 'meds.sql'
+    assert write_sql(path, 'meds', columns, types, out, batch_size=2) == 3
+    sql = out.read_text(encoding='utf-8')
+    assert sql.count('INSERT IGNORE INTO meds') == 2
+    assert "(2, 'O''Brien Syrup', '100', NULL)" in sql
+
+    db = tmp_path / 'meds.db'
+    assert load_sqlite(path, 'meds', columns, types, db, batch_size=2, key=['medicine_id']) == 3
+    assert load_sqlite(path, 'meds', columns, types, db, batch_size=2, key=['medicine_id']) == 0
+    rows = sqlite3.connect(str(db)).execute('SELECT medicine_id, unit_size, mrp FROM meds ORDER BY medicine_id').fetchall()
+    assert rows == [(1, "15's", 30.5), (2, '100', None), (3, "10's", 12.0)]
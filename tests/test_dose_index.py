@@ -0,0 +1,54 @@
+import os
+try:
+    from src.core.etl import load_data, load_drugs
+    from src.core.dose_index import build_dose_index, count_in_window, medicines_in_range, medicines_matching_all
+    from src.core.matching import composition_scorer, find_candidates_by_ingredients, find_substitutes
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import load_data, load_drugs
+    from src.core.dose_index import build_dose_index, count_in_window, medicines_in_range, medicines_matching_all
+    from src.core.matching import composition_scorer, find_candidates_by_ingredients, find_substitutes
+
+
+def test_count_in_window_matches_tolerance_rule():
+    doses = [90.0, 95.0, 100.0, 105.0, 110.0]
+    # |a - b| <= 5% of the larger dose: 95, 100 and 105 qualify for 100
+    assert count_in_window(doses, 100.0, 0.05) == 3
+    assert count_in_window(doses, 100.0, 0.0) == 1
+    assert count_in_window([], 100.0, 0.05) == 0
+
+
+def test_dose_range_query_and_conjunction():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, _ = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                             os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    index = build_dose_index(medicines)
+    paracetamol = drugs.canonical_id(2)
+    ids = medicines_in_range(index, paracetamol, 'mg', 450, 550)
+    assert ids
+    for mid in ids:
+        assert any(c.canonical_id == paracetamol and 450 <= c.amount <= 550 for c in medicines[mid].composition)
+    # 1: Aceclofenac 100mg + Paracetamol 325mg
+    both = medicines_matching_all(index, [([paracetamol], 'mg', 300, 350), ([drugs.canonical_id(1)], 'mg', 100, 100)])
+    assert 1 in both
+    assert all(mid in medicines_in_range(index, paracetamol, 'mg', 300, 350) for mid in both)
+
+
+def test_indexed_composition_scores_match_the_pairwise_rule():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, drug_index = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    index = build_dose_index(medicines)
+    for ref in medicines.values():
+        pairwise, indexed = composition_scorer(ref), composition_scorer(ref, index)
+        for c in find_candidates_by_ingredients(drug_index, ref.composition):
+            assert indexed(c) == pairwise(c)
+    subs = find_substitutes(22, medicines, drug_index, top_k=10, dose_index=index)
+    assert [(s.medicine.medicine_id, s.score) for s in subs] == \
+        [(s.medicine.medicine_id, s.score) for s in find_substitutes(22, medicines, drug_index, top_k=10)]
@@ -0,0 +1,53 @@
+import os
+try:
+    from src.core.engine import RxLensEngine
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.engine import RxLensEngine
+
+
+def test_streamed_and_batch_analysis_agree():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load()
+    assert engine.loaded and engine.generation == 1
+
+    lines = ['Paracetamol 500', 'zzqqxx']
+    records = list(engine.iter_analyze_prescription(lines, top_k=3))
+    assert [r['type'] for r in records] == ['line', 'line', 'summary']
+    assert records[0]['result']['status'] == 'found'
+    assert records[1]['result']['status'] == 'not_found'
+
+    batch = engine.analyze_prescription(lines, top_k=3)
+    assert batch['results'] == [{k: v for k, v in r.items() if k != 'type'} for r in records[:2]]
+    assert batch['summary'] == records[2]['summary']
+    assert batch['summary']['found_count'] == 1 and not batch['partial']
+
+
+def test_identical_lines_are_counted_twice():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load()
+    analysis = engine.analyze_prescription(['Paracetamol 650', 'Paracetamol 650'], top_k=1)
+    assert analysis['summary']['total_medicines'] == 2
+    assert analysis['summary']['duplicate_ingredient_count'] == 1
+    assert analysis['duplicate_ingredients'][0]['positions'] == [0, 1]
+    # one result per line, in the same shape as the stream
+    assert [(r['position'], r['query']) for r in analysis['results']] == [(0, 'Paracetamol 650'), (1, 'Paracetamol 650')]
+    assert [r['result']['status'] for r in analysis['results']] == ['found', 'found']
+    assert analysis['summary']['found_count'] == len(analysis['results'])
+
+
+def test_background_start_reports_readiness():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    assert not engine.readiness()['ready']
+    engine.start()
+    engine.start()  # idempotent
+    assert engine.wait_core(timeout=60)
+    engine.load()  # waits for the background load instead of loading again
+    status = engine.readiness()
+    assert status['ready'] and status['core']['medicines'] == len(engine.medicines)
+    assert status['ml']['state'] == 'unavailable' and 'catalog_ms' in status['timings_ms']
+    assert engine.generation == 1
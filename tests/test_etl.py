@@ -0,0 +1,60 @@
+import os
+from dataclasses import FrozenInstanceError
+import pytest
+try:
+    from src.core.etl import CompositionItem, Medicine, load_data, load_drugs
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import CompositionItem, Medicine, load_data, load_drugs
+
+
+def _fresh(value):
+    # an equal but distinct str, as each CSV row hands back
+    return (value + ' ')[:-1]
+
+
+def _med(mid, category, unit):
+    return Medicine(medicine_id=mid, name=f'med {mid}', price=20.0, unit_size=_fresh("10's"), group_name=_fresh('Analgesic'),
+                    category=_fresh(category), composition=[CompositionItem(2, 500.0, _fresh(unit))],
+                    pack_quantity=10.0, pack_unit=_fresh('unit'))
+
+
+def test_medicine_layout_is_slotted_and_compact():
+    med, other = _med(1, 'tablet', 'mg'), _med(2, 'tablet', 'mg')
+    assert not hasattr(med, '__dict__') and not hasattr(med.composition[0], '__dict__')
+    with pytest.raises(AttributeError):
+        med.colour = 'white'
+
+    item = med.composition[0]
+    with pytest.raises(FrozenInstanceError):
+        item.amount = 250.0
+    assert item.canonical_id == 2
+    assert isinstance(med.composition, tuple)
+
+    # categorical strings are interned: every medicine holds the same object
+    assert med.category is other.category and med.group_name is other.group_name
+    assert med.unit_size is other.unit_size and med.pack_unit is other.pack_unit
+    assert item.unit is other.composition[0].unit
+
+
+def test_price_patching_on_slotted_medicine():
+    med = _med(1, 'tablet', 'mg')
+    assert med.unit_price == 2.0
+    med.price = 35.0
+    assert med.price == 35.0 and med.unit_price == 3.5
+
+
+def test_load_data_shares_composition_items():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, _ = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                             os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    by_key = {}
+    for med in medicines.values():
+        assert isinstance(med.composition, tuple)
+        for c in med.composition:
+            assert by_key.setdefault((c.drug_id, c.amount, c.unit), c) is c
@@ -0,0 +1,36 @@
+import os
+try:
+    from src.core.engine import RxLensEngine
+    from src.core.facets import parse_facets, bitmap_from_ids, ids_from_bitmap
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.engine import RxLensEngine
+    from src.core.facets import parse_facets, bitmap_from_ids, ids_from_bitmap
+
+
+def test_bitmap_round_trip():
+    assert ids_from_bitmap(bitmap_from_ids([9, 0, 3, 64], 64)) == [0, 3, 9, 64]
+    assert ids_from_bitmap(0) == []
+
+
+def test_facet_filters_and_counts():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load_catalog()
+
+    facets = parse_facets({'category': 'Tablet', 'group_name': ['antibiotics']})
+    allowed = engine.allowed_ids(facets=facets)
+    expected = {m.medicine_id for m in engine.medicines.values()
+                if m.category == 'tablet' and m.group_name.strip().lower() == 'antibiotics'}
+    assert allowed == expected and expected
+
+    counts = engine.facet_counts(facets=parse_facets({'category': 'tablet'}))['facets']
+    assert counts['category'] == [{'value': 'tablet', 'count': len(engine.allowed_ids(facets={'category': ['tablet']}))}]
+    assert sum(v['count'] for v in counts['group_name']) == counts['category'][0]['count']
+
+    mid = next(iter(allowed))
+    subs = engine.substitutes(mid, top_k=20, facets=facets)['substitutes']
+    assert all(s['medicine']['medicine_id'] in allowed for s in subs)
@@ -0,0 +1,46 @@
+import gzip
+import os
+try:
+    from src.core.http_cache import EncodedResponseCache, choose_encoding, make_etag, encoded_etag, MIN_COMPRESS_BYTES
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.http_cache import EncodedResponseCache, choose_encoding, make_etag, encoded_etag, MIN_COMPRESS_BYTES
+
+
+def test_choose_encoding():
+    assert choose_encoding('') == 'identity'
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('gzip;q=0, deflate') == 'identity'
+
+
+def test_encoded_bodies_cached_per_generation():
+    cache = EncodedResponseCache(max_entries=4)
+    builds = []
+    big = b'{"medicines": [' + b'"x",' * MIN_COMPRESS_BYTES + b'"x"]}'
+
+    def build():
+        builds.append(1)
+        return big
+
+    etag = make_etag(1, 'medicines', 0, 100)
+    body, used = cache.get_or_build(1, etag, 'gzip', build)
+    assert used == 'gzip' and gzip.decompress(body) == big
+    assert cache.get_or_build(1, etag, 'gzip', build) == (body, used)
+    assert len(builds) == 1
+
+    # small bodies stay uncompressed
+    assert cache.get_or_build(1, make_etag(1, 'medicine', 5), 'gzip', lambda: b'{}') == (b'{}', 'identity')
+
+    # a new catalog generation drops old bytes
+    cache.get_or_build(2, make_etag(2, 'medicines', 0, 100), 'gzip', build)
+    assert len(builds) == 2 and cache.stats()['entries'] == 1
+
+
+def test_each_encoding_has_its_own_etag():
+    etag = make_etag('3f2a9c', 'medicines', 0, 50, 'p0')
+    tags = {encoded_etag(etag, e) for e in ('identity', 'gzip', 'br')}
+    assert len(tags) == 3 and encoded_etag(etag, 'identity') == etag
@@ -0,0 +1,28 @@
+import os
+try:
+    from src.core.etl import load_data, load_drugs
+    from src.core.ingredients import resolve_ingredient, canonical_ids, medicines_for_drugs
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import load_data, load_drugs
+    from src.core.ingredients import resolve_ingredient, canonical_ids, medicines_for_drugs
+
+
+def test_resolve_ingredient_to_medicines():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'))
+    medicines, drug_index = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    # exact normalized name hit comes first
+    assert resolve_ingredient(drugs, '  PARACETAMOL ')[0] == 2
+    assert drugs.name(2) == 'Paracetamol'
+    # token intersection covers the salt variants
+    diclofenac_ids = resolve_ingredient(drugs, 'diclofenac sodium')
+    assert 10 in diclofenac_ids and 12 in diclofenac_ids
+    meds = medicines_for_drugs(drug_index, canonical_ids(drugs, resolve_ingredient(drugs, 'paracetamol')))
+    assert any(m.medicine_id == 1 for m in meds)
+    assert resolve_ingredient(drugs, 'no such ingredient') == []
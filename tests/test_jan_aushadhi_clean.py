@@ -0,0 +1,55 @@
+import csv
+import os
+import sys
+
+# scripts/ingest/dataset_cleaning is not a package; import the script module directly
+CLEANING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts', 'ingest', 'dataset_cleaning'))
+if CLEANING_DIR not in sys.path:
+    sys.path.insert(0, CLEANING_DIR)
+from jan_aushadhi_clean import clean_generic_name, refine
+
+HEADER = ["Sr No", "Drug Code", "Generic Name", "Unit Size", "MRP", "Group Name"]
+
+
+def _write_raw(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows([HEADER] + rows)
+
+
+def _read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_clean_generic_name():
+    assert clean_generic_name('Aceclofenac 100mg and Paracetamol 325mg Tablets') == (
+        'tablet', [('Aceclofenac', '100', 'mg'), ('Paracetamol', '325', 'mg')]
+    )
+    assert clean_generic_name('Paracetamol Oral Suspension 125mg per 5ml') == (
+        'unknown', [('Paracetamol', '125/5', 'mg/ml')]
+    )
+
+
+def test_incremental_refine_keeps_ids_stable(tmp_path):
+    raw, out = tmp_path / 'raw.csv', tmp_path / 'refined'
+    _write_raw(raw, [
+        ['1', 'A1', 'Aceclofenac 100mg and Paracetamol 325mg Tablets', "10's", '9.38', 'Analgesic'],
+        ['2', 'A2', 'Aspirin Tablets IP 150 mg', "14's", '4.69', 'Analgesic'],
+    ])
+    stats = refine(raw, out, workers=1)
+    assert stats['cleaned'] == 2 and stats['new_drugs'] == 3
+
+    # drop the first row, reprice the second, add a new one
+    _write_raw(raw, [
+        ['2', 'A2', 'Aspirin Tablets IP 150 mg', "14's", '5.10', 'Analgesic'],
+        ['3', 'A3', 'Metformin 500mg and Paracetamol 500mg Tablets', "10's", '12', 'Antidiabetic'],
+    ])
+    stats = refine(raw, out, workers=1)
+    assert stats == {'rows': 2, 'cleaned': 1, 'reused': 1, 'new_drugs': 1}
+
+    medicines = {r['medicine_name']: r for r in _read(out / 'jan_aushadhi_medicines.csv')}
+    assert medicines['Aspirin Tablets IP 150 mg']['medicine_id'] == '2'
+    assert medicines['Aspirin Tablets IP 150 mg']['mrp'] == '5.10'
+    assert medicines['Metformin 500mg and Paracetamol 500mg Tablets']['medicine_id'] == '3'
+    drugs = {r['drug_name']: r['drug_id'] for r in _read(out / 'drugs.csv')}
+    assert drugs == {'Aceclofenac': '1', 'Paracetamol': '2', 'Aspirin IP': '3', 'Metformin': '4'}
@@ -0,0 +1,43 @@
+import os
+try:
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.prescription import ingredient_totals, duplicate_ingredients
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import CompositionItem, Medicine
+    from src.core.prescription import ingredient_totals, duplicate_ingredients
+
+
+def _med(mid, items):
+    return Medicine(medicine_id=mid, name=f'med {mid}', price=1.0, unit_size="10's", group_name='', category='tablet',
+                    composition=[CompositionItem(did, amt, 'mg', cid) for did, cid, amt in items])
+
+
+def test_duplicate_salts_across_lines():
+    resolved = {
+        (0, 'Dolo 650'): _med(1, [(2, 2, 650.0)]),
+        (1, 'Aceclo Plus'): _med(2, [(1, 1, 100.0), (2, 2, 325.0)]),
+        # Diclofenac Sodium (12) and Diclofenac (7) share canonical id 7
+        (2, 'Voveran'): _med(3, [(12, 7, 50.0)]),
+        (3, 'Dicloran'): _med(4, [(7, 7, 50.0)]),
+    }
+    totals = {(t.canonical_id, t.unit): t for t in ingredient_totals(resolved)}
+    assert totals[(2, 'mg')].total_amount == 975.0
+    assert totals[(2, 'mg')].lines == ['Dolo 650', 'Aceclo Plus']
+    assert totals[(7, 'mg')].total_amount == 100.0
+
+    dups = {t.canonical_id for t in duplicate_ingredients(list(totals.values()))}
+    assert dups == {2, 7}
+
+
+def test_same_medicine_listed_twice_is_a_duplicate():
+    dolo = _med(1, [(2, 2, 650.0)])
+    totals = ingredient_totals({(0, 'Dolo 650'): dolo, (1, 'Dolo 650'): dolo})
+    assert totals[0].total_amount == 1300.0
+    assert totals[0].lines == ['Dolo 650', 'Dolo 650']
+    assert totals[0].positions == [0, 1]
+    assert [t.canonical_id for t in duplicate_ingredients(totals)] == [2]
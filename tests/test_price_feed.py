@@ -0,0 +1,79 @@
+import os
+try:
+    from src.core.engine import RxLensEngine
+    from src.core.price_feed import parse_price_feed
+    from src.core.http_cache import EncodedResponseCache
+    from src.core.price_index import build_price_index
+    from src.core.suggest import build_suggest_index, suggest
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.engine import RxLensEngine
+    from src.core.price_feed import parse_price_feed
+    from src.core.http_cache import EncodedResponseCache
+    from src.core.price_index import build_price_index
+    from src.core.suggest import build_suggest_index, suggest
+
+
+def test_parse_price_feed():
+    updates, errors = parse_price_feed(['medicine_id,mrp', '1,10.5', '2,x', '1,11', '', '3,-1'])
+    assert updates == [(1, 11.0)]
+    assert len(errors) == 2 and errors[0].startswith('line 3')
+
+
+def test_price_updates_patch_live_catalog():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load_catalog()
+    mid = next(iter(engine.medicines))
+    old_price = engine.medicines[mid].price
+    assert engine.price_tag([mid]) == 'p0'
+
+    result = engine.apply_price_updates([(mid, old_price + 1), (10 ** 9, 1.0)])
+    assert result['updated'] == [mid] and result['unknown'] == [10 ** 9]
+    assert engine.get_medicine(mid)['medicine']['price'] == old_price + 1
+    assert engine.generation == 1 and engine.price_version([mid]) == 1
+
+    # patched prices are specific to this process; unpatched ones are described by the CSVs alone
+    restarted = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    restarted.load_catalog()
+    assert restarted.catalog_version == engine.catalog_version
+    assert restarted.price_tag([mid]) == 'p0' != engine.price_tag([mid])
+    restarted.apply_price_updates([(mid, old_price + 2)])
+    assert restarted.price_tag([mid]) != engine.price_tag([mid])
+
+    # re-sending the same price is a no-op
+    assert engine.apply_price_updates([(mid, old_price + 1)])['unchanged_count'] == 1
+    assert engine.price_version([mid]) == 1
+
+
+def test_price_updates_patch_indexes_like_a_rebuild():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load_catalog()
+    ids = list(engine.medicines)[::50]
+    # the feed repeats an id: the last price wins and the id is reported once
+    updates = [(mid, round(engine.medicines[mid].price * 0.37 + i % 7, 2)) for i, mid in enumerate(ids)]
+    updates += [(ids[0], 1.0), (ids[0], 0.5)]
+    changed = {mid for mid, mrp in dict(updates).items() if engine.medicines[mid].price != mrp}
+    result = engine.apply_price_updates(updates)
+    assert result['received'] == len(updates) and len(result['updated']) == len(changed) > 40
+    assert set(result['updated']) == changed
+    assert engine.medicines[ids[0]].price == 0.5
+
+    assert engine.price_index == build_price_index(engine.medicines)
+    rebuilt = build_suggest_index(engine.medicines, engine.drug_index, engine.drugs)
+    patched = engine.suggest_index
+    assert {p: [patched.entries[r] for r in ranks] for p, ranks in patched.top.items()} == \
+        {p: [rebuilt.entries[r] for r in ranks] for p, ranks in rebuilt.top.items()}
+    for prefix in ['tablets', 'tablets ip', 'paracetamol', 'injection ip', engine.medicines[ids[0]].name]:
+        assert suggest(patched, prefix) == suggest(rebuilt, prefix)
+
+
+def test_invalidate_tags_drops_only_tagged_entries():
+    cache = EncodedResponseCache()
+    cache.get_or_build(1, 'a', 'identity', lambda: b'a', tags=[('medicine', 1)])
+    cache.get_or_build(1, 'b', 'identity', lambda: b'b', tags=[('medicine', 2)])
+    assert cache.invalidate_tags([('medicine', 1)]) == 1
+    assert cache.stats()['entries'] == 1
@@ -0,0 +1,40 @@
+import os
+try:
+    from src.core.etl import load_data, parse_unit_size
+    from src.core.price_index import PriceFilter, build_price_index, allowed_ids
+    from src.core.matching import find_substitutes
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import load_data, parse_unit_size
+    from src.core.price_index import PriceFilter, build_price_index, allowed_ids
+    from src.core.matching import find_substitutes
+
+
+def test_parse_unit_size():
+    assert parse_unit_size("10's") == (10.0, 'unit')
+    assert parse_unit_size('100 ml Bottle') == (100.0, 'ml')
+    assert parse_unit_size("1's Tin 250g") == (250.0, 'g')
+    assert parse_unit_size('200 MDI') == (200.0, 'dose')
+    assert parse_unit_size('Pair in Mono-Pack') == (2.0, 'unit')
+    assert parse_unit_size('Citicoline Oral Drops 100mg per ml') == (None, '')
+
+
+def test_price_filters_match_a_full_scan():
+    refined = os.path.join(os.getcwd(), 'data', 'refined')
+    medicines, drug_index = load_data(os.path.join(refined, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(refined, 'jan_aushadhi_composition.csv'))
+    index = build_price_index(medicines)
+
+    f = PriceFilter.from_dict({'max_price': 20, 'pack_unit': 'unit', 'min_pack': 10, 'max_unit_price': 1.5})
+    expected = {m.medicine_id for m in medicines.values()
+                if m.price <= 20 and m.pack_unit == 'unit' and m.pack_quantity >= 10 and m.unit_price <= 1.5}
+    assert allowed_ids(index, f) == expected and expected
+    assert allowed_ids(index, None) is None
+
+    mid = next(m.medicine_id for m in medicines.values() if m.composition)
+    subs = find_substitutes(mid, medicines, drug_index, top_k=50, allowed=expected, price_basis='unit')
+    assert all(s.medicine.medicine_id in expected for s in subs)
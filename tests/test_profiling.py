@@ -0,0 +1,44 @@
+import os
+try:
+    from src.core.profiling import ProfileStore, ProfilingMiddleware
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.profiling import ProfileStore, ProfilingMiddleware
+
+
+def _app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'chunk-%d' % i for i in range(3)]
+
+
+def _call(app, headers):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/search', 'QUERY_STRING': ''}
+    environ.update(headers)
+    seen = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        seen.update(response_headers)
+    body = app(environ, start_response)
+    data = b''.join(body)
+    if hasattr(body, 'close'):
+        body.close()
+    return data, seen
+
+
+def test_profiles_only_authorised_requests_into_a_bounded_ring(tmp_path):
+    store = ProfileStore(str(tmp_path), keep=2)
+    app = ProfilingMiddleware(_app, store, allow_header=lambda environ: environ.get('HTTP_X_ADMIN_TOKEN') == 't')
+
+    data, headers = _call(app, {'HTTP_X_PROFILE': '1'})
+    assert data == b'chunk-0chunk-1chunk-2' and 'X-Profile-Id' not in headers
+    assert store.list() == []
+
+    ids = [_call(app, {'HTTP_X_PROFILE': '1', 'HTTP_X_ADMIN_TOKEN': 't'})[1]['X-Profile-Id'] for _ in range(3)]
+    assert [p['id'] for p in store.list()] == ids[:0:-1]
+    assert store.list()[0]['trigger'] == 'header' and store.list()[0]['status'] == '200 OK'
+    assert store.path(ids[0]) is None and store.path('../' + ids[-1]) is None
+    assert 'function calls' in store.summary(ids[-1])
@@ -0,0 +1,61 @@
+import os
+try:
+    from src.core.query_parser import QueryTerm, parse_query
+    from src.core.engine import RxLensEngine
+    from rapidfuzz import fuzz
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.query_parser import QueryTerm, parse_query
+    from src.core.engine import RxLensEngine
+    from rapidfuzz import fuzz
+
+
+def test_parse_query():
+    assert parse_query('Paracetamol 650') == [QueryTerm('Paracetamol', 650.0, 'mg')]
+    assert parse_query('Metformin 500 mg SR tablet') == [QueryTerm('Metformin', 500.0, 'mg')]
+    assert parse_query('Amoxicillin 500 mg + Clavulanic Acid 125 mg') == [
+        QueryTerm('Amoxicillin', 500.0, 'mg'), QueryTerm('Clavulanic Acid', 125.0, 'mg')]
+    assert parse_query('Azithromycin 1 gm') == [QueryTerm('Azithromycin', 1000.0, 'mg')]
+    assert parse_query('Paracetamol 125 mg per 5 ml syrup') == [QueryTerm('Paracetamol', 25.0, 'mg/ml')]
+    assert parse_query('Amoxicillin + Clavulanic Acid') == [QueryTerm('Amoxicillin'), QueryTerm('Clavulanic Acid')]
+
+
+def test_dosed_queries_are_matched_on_composition_first():
+    engine = RxLensEngine(data_dir=os.path.join(os.getcwd(), 'data', 'refined'), ml_model_path='')
+    engine.load_catalog()
+    def contains(med, ingredient):
+        return any(ingredient in engine.drugs.name(c.drug_id).lower() for c in med.composition)
+
+    # every candidate contains paracetamol; exact 650 mg fits come first
+    candidates = engine.query_candidates('Paracetamol 650')
+    assert candidates and len(candidates) < len(engine.medicines)
+    meds = [engine.medicines[mid] for mid in candidates]
+    assert all(contains(m, 'paracetamol') for m in meds)
+    assert [c.amount for c in meds[0].composition] == [650]
+    best, score = engine.fuzzy_best_match('Paracetamol 650')
+    assert best.medicine_id == candidates[0] and score >= 60
+
+    # a bare '5' in a combination product's name must not beat plain amlodipine 5 mg
+    best, score = engine.fuzzy_best_match('Amlodipine 5')
+    assert score >= 60 and len(best.composition) == 1
+    assert contains(best, 'amlodipine') and best.composition[0].amount == 5
+
+    # brand plus dose names no known ingredient: plain name scoring over the whole catalog, as before parsing
+    for query in ['Calpol 120mg/5ml syrup', 'Dolo 650', 'Crocin 500', 'Thyronorm 50 mcg']:
+        baseline = max(engine.medicines.values(), key=lambda m: fuzz.token_set_ratio(query.lower(), m.name.lower()))
+        best, score = engine.fuzzy_best_match(query)
+        assert best is baseline and score == fuzz.token_set_ratio(query.lower(), baseline.name.lower())
+    best, _ = engine.fuzzy_best_match('Dolo 650')
+    assert contains(best, 'paracetamol') and best.composition[0].amount == 650
+
+    # a known ingredient whose stated dose nothing has: the filter accepts nothing, so names decide
+    best, score = engine.fuzzy_best_match('Paracetamol 7 mg + Calpol')
+    assert best is not None and score > 0
+
+    # no known ingredient: the whole catalog is scored
+    assert engine.query_candidates('zzqqxx 10 mg') is None
+    assert engine.query_candidates('Paracetamol 650', allowed=set()) == []
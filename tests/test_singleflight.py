@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+try:
+    from src.core.singleflight import SingleFlight
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {'answer': 42}
+
+    results = []
+
+    def worker():
+        results.append(flight.do(('search', 'paracetamol 500', 60), slow))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{'answer': 42}] * 5
+    stats = flight.stats()
+    assert stats['endpoints']['search'] == {'executed': 1, 'coalesced': 4}
+    assert stats['in_flight'] == 0
+
+    # once finished, the next call runs again (no caching)
+    flight.do(('search', 'paracetamol 500', 60), slow)
+    assert len(calls) == 2
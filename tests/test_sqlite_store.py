@@ -0,0 +1,30 @@
+import os
+try:
+    from src.core.engine import RxLensEngine
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.engine import RxLensEngine
+
+
+def test_sqlite_storage_matches_memory(tmp_path):
+    data_dir = os.path.join(os.getcwd(), 'data', 'refined')
+    memory = RxLensEngine(data_dir=data_dir, ml_model_path='')
+    memory.load_catalog()
+    sqlite = RxLensEngine(data_dir=data_dir, ml_model_path='', storage='sqlite', sqlite_path=str(tmp_path / 'catalog.sqlite3'))
+    sqlite.load_catalog()
+
+    assert len(sqlite.medicines) == len(memory.medicines)
+    mid = next(iter(memory.medicines))
+    assert sqlite.get_medicine(mid) == memory.get_medicine(mid)
+    assert sqlite.substitutes(mid, top_k=5) == memory.substitutes(mid, top_k=5)
+    assert sqlite.list_medicines(5, 3) == memory.list_medicines(5, 3)
+
+    # name search goes through the FTS index, suggestions through FTS prefixes
+    assert sqlite.search('Paracetamol 500') == memory.search('Paracetamol 500')
+    assert sqlite.suggest('para', 5) == memory.suggest('para', 5)
+    dose = [{'name': 'paracetamol', 'min': 300, 'max': 700, 'unit': 'mg'}]
+    assert sqlite.medicines_by_dose_range(dose) == memory.medicines_by_dose_range(dose)
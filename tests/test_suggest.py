@@ -0,0 +1,47 @@
+import os
+try:
+    from src.core.etl import load_data, load_drugs
+    from src.core.suggest import build_suggest_index, suggest
+except Exception:
+    # Allow running this test file directly (not via pytest) by adding project root to sys.path
+    import sys
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from src.core.etl import load_data, load_drugs
+    from src.core.suggest import build_suggest_index, suggest
+
+
+def test_suggest_short_and_long_prefixes():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, drug_index = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    index = build_suggest_index(medicines, drug_index, drugs, limit=5)
+
+    # short prefix served from the precomputed table, best weight first
+    short = suggest(index, 'Para')
+    assert 0 < len(short) <= 5
+    assert short[0].kind == 'drug' and short[0].label == 'Paracetamol'
+    assert [s.weight for s in short] == sorted((s.weight for s in short), reverse=True)
+
+    # long multi-word prefix served from the bisect range
+    long_ = suggest(index, 'paracetamol 500', limit=3)
+    assert long_ and all('paracetamol 500' in s.label.lower() for s in long_)
+
+    assert suggest(index, 'zzzz') == []
+
+
+def test_broad_long_prefix_takes_the_best_of_its_range():
+    base = os.path.abspath(os.path.join(os.getcwd(), 'data', 'refined'))
+    drugs = load_drugs(os.path.join(base, 'drugs.csv'), os.path.join(base, 'drug_canonical.csv'))
+    medicines, drug_index = load_data(os.path.join(base, 'jan_aushadhi_medicines.csv'),
+                                      os.path.join(base, 'jan_aushadhi_composition.csv'), drugs)
+    index = build_suggest_index(medicines, drug_index, drugs, limit=10)
+
+    for prefix in ['tablets', 'tablets ip', 'injection', 'paracetamol', 'capsules ip 500']:
+        matching = {r for k, r in zip(index.keys, index.postings) if k.startswith(prefix)}
+        expected = [index.entries[r] for r in sorted(matching, key=lambda r: index.order[r])[:10]]
+        assert suggest(index, prefix) == expected
+    # 'tablets' is the tail of most medicine names, far more keys than the limit
+    assert sum(1 for k in index.keys if k.startswith('tablets')) > 500